@@ -1,30 +1,232 @@
 # conftest.py
 import pytest
+import pytest_asyncio
 import os
-import requests
 
-# Only load .env when running locally
-if os.getenv("GITHUB_ACTIONS") != "true":
-    from dotenv import load_dotenv
-    load_dotenv()
+# harness modules are also loaded as plugins; rewrite their asserts like test code
+pytest.register_assert_rewrite("harness")
 
-@pytest.fixture
-def stripe_headers():
-    api_key = os.getenv('STRIPE_API_KEY')
+from harness.aio import AsyncStripeClient
+from harness.cassette import make_adapter, make_session, make_transport
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY, EmulatorProcess, StripeEmulator
+from harness.faultproxy import FaultProxy, load_faults
+from harness.pool import CustomerPool
+from harness.resources import BACKENDS, AsyncBackend, RequestsBackend, SdkBackend, StripeApi
+from harness.retry import RetryPolicy
+from harness.schemas import schemas_for
+from harness.settings import Settings, activate, load, profile_for
+from harness.timing import recorder_for
+
+pytest_plugins = ["harness.ratelimit", "harness.load", "harness.cassette", "harness.timing", "harness.cleanup",
+                  "harness.mockspec", "harness.history", "harness.apibench", "harness.flows",
+                  "harness.resultcache", "harness.schemas", "harness.soak"]
+
+# Connection and retry stats of the session-wide clients, reported in the terminal summary
+client_stats_key = pytest.StashKey[dict]()
+retry_stats_key = pytest.StashKey[dict]()
+settings_key = pytest.StashKey[Settings]()
+fault_proxy_key = pytest.StashKey[FaultProxy]()
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe", "Stripe API client")
+    group.addoption("--stripe-pool-connections", type=int, default=4,
+                    help="Number of per-host connection pools kept by stripe_client.")
+    group.addoption("--stripe-pool-maxsize", type=int, default=16,
+                    help="Keep-alive connections kept per host by stripe_client.")
+    group.addoption("--stripe-max-retries", type=int, default=0,
+                    help="Connection-level retries for stripe_client (off by default).")
+    group.addoption("--stripe-retries", type=int, default=3,
+                    help="Times a 429, 5xx or dropped request is re-sent with jittered backoff (0 disables).")
+    group.addoption("--stripe-customer-pool", type=int, default=6,
+                    help="Customers (each with a tok_visa card) created up front for leasing to tests.")
+    group.addoption("--stripe-async-connections", type=int, default=100,
+                    help="Concurrent connections allowed per async_stripe_client.")
+    group.addoption("--stripe-emulator", action="store_true", default=False,
+                    help="Serve the local Stripe stand-in and point BASE_URL at it.")
+    group.addoption("--stripe-emulator-rate-limit", type=float, default=0,
+                    help="Answer 429 above this many req/s in the --stripe-emulator stand-in (0 disables).")
+    group.addoption("--stripe-faults", metavar="SPEC", default=None,
+                    help="Route the session through a fault-injecting proxy; SPEC is a JSON file or inline JSON "
+                         "mapping 'METHOD /v1/path' globs to Fault fields.")
+    group.addoption("--stripe-backends", default="requests",
+                    help=f"Comma-separated backends the stripe_api suites run over ({', '.join(BACKENDS)}; "
+                         "default requests, since each extra backend repeats those suites against the account).")
+    group.addoption("--stripe-generated-cases", type=int, default=None,
+                    help="Generated payloads per endpoint (default 500 under --stripe-emulator, else 50).")
+    group.addoption("--stripe-seed", type=int, default=0,
+                    help="Seed for the generated payloads; change it to explore new combinations.")
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "mutates_customer: the test changes or deletes its leased customer/card, "
+                   "so it gets an exclusive lease that is never handed out again")
+    # Runs before test modules are imported, so the settings they read at
+    # import time already carry the emulator address. xdist workers inherit
+    # the environment and share the controller's emulator.
+    profile = profile_for(config)
+    if profile == "emulator" and not hasattr(config, "workerinput"):
+        # Soaks measure this process, so there the emulator's ever-growing store lives in another one
+        server = EmulatorProcess if config.getoption("stripe_soak") else StripeEmulator
+        # Never the STRIPE_API_KEY from .env: a live secret has no business in the local stand-in
+        emulator = server(api_key=DEFAULT_API_KEY, rate_limit=config.getoption("stripe_emulator_rate_limit") or None)
+        os.environ["STRIPE_API_KEY"] = emulator.api_key
+        os.environ["BASE_URL"] = emulator.start()
+        config.add_cleanup(emulator.stop)
+    faults = config.getoption("stripe_faults")
+    if faults and not hasattr(config, "workerinput"):
+        # In front of whatever BASE_URL now points at: the live API or the emulator just started
+        proxy = FaultProxy(load(profile).base_url, load_faults(faults))
+        os.environ["BASE_URL"] = proxy.start()
+        config.add_cleanup(proxy.stop)
+        config.stash[fault_proxy_key] = proxy
+    config.stash[settings_key] = activate(load(profile))
+
+def pytest_generate_tests(metafunc):
+    if "stripe_api" in metafunc.fixturenames:
+        backends = [name.strip() for name in metafunc.config.getoption("stripe_backends").split(",") if name.strip()]
+        metafunc.parametrize("stripe_api", backends, indirect=True, scope="session")
+
+def pytest_terminal_summary(terminalreporter, config):
+    stats = config.stash.get(client_stats_key, None)
+    if stats:
+        terminalreporter.write_sep("-", "stripe_client connections")
+        terminalreporter.write_line(
+            f"{stats['requests']} requests over {stats['connections']} connections "
+            f"({stats['reused']} reused keep-alive)"
+        )
+    proxy = config.stash.get(fault_proxy_key, None)
+    if proxy is not None:
+        terminalreporter.write_sep("-", "stripe fault proxy")
+        injected = proxy.stats()
+        terminalreporter.write_line(f"{injected.pop('requests')} requests proxied; injected: "
+                                    + (", ".join(f"{n} {kind}" for kind, n in sorted(injected.items())) or "none"))
+    retry_stats = config.stash.get(retry_stats_key, None)
+    if retry_stats and retry_stats['requests']:
+        terminalreporter.write_sep("-", "stripe retries")
+        terminalreporter.write_line(
+            f"{retry_stats['retries']} retries over {retry_stats['requests']} requests "
+            f"({retry_stats['exhausted']} refused by the retry budget)"
+        )
+
+@pytest.fixture(scope="session")
+def stripe_settings(pytestconfig):
+    """The session's profile, API key and base URL, loaded once in pytest_configure."""
+    return pytestconfig.stash[settings_key]
+
+@pytest.fixture(scope="session")
+def stripe_headers(stripe_settings):
+    if not stripe_settings.api_key:
+        raise RuntimeError("Missing STRIPE_API_KEY environment variable.")
+    return stripe_settings.headers
+
+@pytest.fixture(scope="session")
+def base_url(stripe_settings):
+    return stripe_settings.base_url
+
+@pytest.fixture(scope="session")
+def stripe_retry_policy(pytestconfig):
+    """Backoff policy and retry budget shared by every client in the session."""
+    retries = pytestconfig.getoption("stripe_retries")
+    if retries <= 0:
+        yield None
+        return
+    policy = RetryPolicy(max_attempts=retries + 1)
+    yield policy
+    pytestconfig.stash[retry_stats_key] = policy.stats()
+
+@pytest.fixture(scope="session")
+def stripe_client(pytestconfig, stripe_settings, stripe_rate_limiter, stripe_retry_policy, stripe_object_tracker):
+    """Session-wide pooled client; every suite shares its keep-alive connections."""
+    api_key = stripe_settings.api_key
     if not api_key:
         raise RuntimeError("Missing STRIPE_API_KEY environment variable.")
-    return {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/x-www-form-urlencoded"
+    pool_kwargs = {
+        "pool_connections": pytestconfig.getoption("stripe_pool_connections"),
+        "pool_maxsize": pytestconfig.getoption("stripe_pool_maxsize"),
+        "max_retries": pytestconfig.getoption("stripe_max_retries"),
     }
+    client = StripeClient(
+        api_key,
+        base_url=stripe_settings.base_url,
+        throttle=stripe_rate_limiter.acquire if stripe_rate_limiter else None,
+        adapter=make_adapter(pytestconfig, api_key, **pool_kwargs),
+        retry=stripe_retry_policy,
+        recorder=recorder_for(pytestconfig),
+        tracker=stripe_object_tracker,
+        schemas=schemas_for(pytestconfig),
+        **pool_kwargs,
+    )
+    yield client
+    # Everything the run created and did not delete itself goes in one concurrent batch
+    leaked = stripe_object_tracker.delete_all(client)
+    client.close()
+    pytestconfig.stash[client_stats_key] = client.connection_stats()
+    assert not leaked, f"Failed to delete customers created by the run: {leaked}"
 
-@pytest.fixture
-def base_url():
-    return "https://api.stripe.com/v1"
+@pytest_asyncio.fixture
+async def async_stripe_client(pytestconfig, stripe_settings, stripe_rate_limiter, stripe_retry_policy,
+                              stripe_object_tracker):
+    """Pooled asyncio client for tests that run many flows concurrently."""
+    api_key = stripe_settings.api_key
+    if not api_key:
+        raise RuntimeError("Missing STRIPE_API_KEY environment variable.")
+    max_connections = pytestconfig.getoption("stripe_async_connections")
+    async with AsyncStripeClient(
+        api_key,
+        base_url=stripe_settings.base_url,
+        max_connections=max_connections,
+        throttle=stripe_rate_limiter.acquire if stripe_rate_limiter else None,
+        retry=stripe_retry_policy,
+        recorder=recorder_for(pytestconfig),
+        tracker=stripe_object_tracker,
+        schemas=schemas_for(pytestconfig),
+        transport=make_transport(pytestconfig, api_key, max_connections=max_connections),
+    ) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def stripe_api(request, pytestconfig, stripe_settings, stripe_client, stripe_rate_limiter, stripe_retry_policy,
+               stripe_object_tracker):
+    """Resource-level customers/cards/charges API over one backend, per --stripe-backends."""
+    name = getattr(request, "param", "requests")
+    throttle = stripe_rate_limiter.acquire if stripe_rate_limiter else None
+    if name == "requests":
+        backend = RequestsBackend(stripe_client)
+    elif name == "sdk":
+        backend = SdkBackend(stripe_settings.api_key, stripe_settings.base_url, tracker=stripe_object_tracker,
+                             throttle=throttle, max_retries=pytestconfig.getoption("stripe_retries"),
+                             session=make_session(pytestconfig, stripe_settings.api_key))
+    elif name == "async":
+        backend = AsyncBackend(stripe_settings.api_key, stripe_settings.base_url, throttle=throttle,
+                               retry=stripe_retry_policy, recorder=recorder_for(pytestconfig),
+                               tracker=stripe_object_tracker, schemas=schemas_for(pytestconfig),
+                               transport=make_transport(pytestconfig, stripe_settings.api_key))
+    else:
+        raise ValueError(f"Unknown backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    api = StripeApi(backend)
+    yield api
+    api.close()
 
 @pytest.fixture
-def test_customer(base_url, stripe_headers):
+def test_customer(stripe_client):
     data = {"email": "param_fixture@example.com", "name": "Fixture Param"}
-    response = requests.post(f"{base_url}/customers", headers=stripe_headers, data=data)
+    response = stripe_client.post("/customers", data=data)
     return response.json()["id"]
 
+@pytest.fixture(scope="session")
+def customer_pool(pytestconfig, stripe_client):
+    """Customers with a card, created concurrently once and leased to tests."""
+    pool = CustomerPool(stripe_client)
+    pool.fill(pytestconfig.getoption("stripe_customer_pool"))
+    yield pool
+    leaked = pool.close()
+    assert not leaked, f"Failed to delete pooled customers: {leaked}"
+
+@pytest.fixture
+def customer_lease(request, customer_pool):
+    """Lease a pooled customer and card; exclusive for tests marked mutates_customer."""
+    exclusive = request.node.get_closest_marker("mutates_customer") is not None
+    lease = customer_pool.lease(exclusive=exclusive, with_card=True)
+    yield lease
+    customer_pool.release(lease)
@@ -0,0 +1,4 @@
+# Shared helpers for the Stripe API test suites
+from harness.client import StripeClient
+
+__all__ = ['StripeClient']
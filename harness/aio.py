@@ -0,0 +1,148 @@
+# Asyncio HTTP client for running many Stripe flows concurrently
+import asyncio
+import time
+
+import httpx
+
+from harness.client import DEFAULT_BASE_URL, join_url
+from harness.models import fast_json
+
+
+class AsyncStripeClient:
+    """Pooled ``httpx.AsyncClient`` with the same call shape as StripeClient.
+
+    ``max_connections`` caps in-flight requests; idle sockets (up to
+    ``max_keepalive``) are kept open between calls. A blocking ``throttle``
+    such as the shared token bucket runs in a worker thread so it never stalls
+    the event loop. ``retry``, ``recorder``, ``tracker``
+    and ``schemas`` work as they do for StripeClient, and so does
+    ``headers={'Authorization': None}``. A ``transport`` (e.g. a cassette's)
+    replaces the network one, as ``adapter`` does for StripeClient.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, max_connections=100,
+                 max_keepalive=20, timeout=30.0, throttle=None, retry=None, recorder=None,
+                 tracker=None, schemas=None, transport=None):
+        self.base_url = base_url.rstrip('/')
+        self.throttle = throttle
+        self.retry = retry
+        self.recorder = recorder
+        self.tracker = tracker
+        self.schemas = schemas
+        self.client = httpx.AsyncClient(
+            headers={
+                'Authorization': f'Bearer {api_key}',
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=timeout,
+            transport=transport,
+        )
+
+    def url(self, path):
+        return join_url(self.base_url, path)
+
+    async def request(self, method, path, **kwargs):
+        url = self.url(path)
+        if self.tracker is not None:
+            self.tracker.tag(method, url, kwargs)
+        if self.retry is None:
+            response = await self._send(method, url, **kwargs)
+        else:
+            headers = kwargs.pop('headers', None)
+            response = await self.retry.call_async(
+                method, url, lambda h: self._send(method, url, headers=h, **kwargs), headers)
+        if self.tracker is not None:
+            self.tracker.track(method, url, response)
+        if self.schemas is not None:
+            self.schemas.observe(response)
+        return response
+
+    async def _send(self, method, url, **kwargs):
+        if self.throttle is not None:
+            await asyncio.to_thread(self.throttle)
+        if self.recorder is None:
+            return await self._request(method, url, **kwargs)
+        return await self.recorder.measure_async(
+            method, url, lambda trace: self._request(method, url, extensions={'trace': trace}, **kwargs))
+
+    async def _request(self, method, url, headers=None, **kwargs):
+        dropped = [name for name, value in (headers or {}).items() if value is None]
+        if not dropped:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        else:
+            # httpx merges per-call headers over the client's and has no way to remove one
+            request = self.client.build_request(
+                method, url, headers={name: value for name, value in headers.items() if value is not None}, **kwargs)
+            for name in dropped:
+                request.headers.pop(name, None)
+            response = await self.client.send(request)
+        response.json = fast_json(response) # same lazy views as StripeClient responses
+        return response
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+async def run_concurrently(factory, count, concurrency=50):
+    """Await ``factory(i)`` for ``i in range(count)``, at most ``concurrency`` at once.
+
+    Returns the results in order and the wall-clock seconds the batch took, so
+    callers can report aggregate throughput rather than single-call latency.
+    """
+    gate = asyncio.Semaphore(concurrency)
+
+    async def bounded(index):
+        async with gate:
+            return await factory(index)
+
+    start = time.perf_counter()
+    # A TaskGroup cancels the remaining chains as soon as one of them fails
+    async with asyncio.TaskGroup() as group:
+        tasks = [group.create_task(bounded(i)) for i in range(count)]
+    return [task.result() for task in tasks], time.perf_counter() - start
+
+
+async def customer_card_charge_chain(client, index):
+    """Create a customer, attach a card, charge it and delete the customer.
+
+    Returns the customer, card and charge bodies; ``index`` keeps the
+    emails and amounts of concurrent chains distinct.
+    """
+    customer_response = await client.post('/customers', data={
+        'description': f'Concurrent Test Customer {index}',
+        'email': f'concurrent.{index}@example.com',
+    })
+    assert customer_response.status_code == 200, customer_response.text
+    customer = customer_response.json()
+    try:
+        card_response = await client.post(f"/customers/{customer['id']}/sources", data={'source': 'tok_visa'})
+        assert card_response.status_code == 200, card_response.text
+        card = card_response.json()
+        charge_response = await client.post('/charges', data={
+            'amount': 500 + index,
+            'currency': 'usd',
+            'customer': customer['id'],
+            'source': card['id'],
+            'description': f"Concurrent Test Charge for {customer['id']}",
+        })
+        assert charge_response.status_code == 200, charge_response.text
+        return customer, card, charge_response.json()
+    finally:
+        delete_response = await client.delete(f"/customers/{customer['id']}")
+        assert delete_response.status_code in [200, 404], "Customer cleanup failed"
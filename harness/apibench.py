@@ -0,0 +1,95 @@
+# pytest-benchmark for API calls: warm-up until latency settles, untimed per-round teardown (pytest plugin)
+import statistics
+import time
+
+import pytest
+
+
+def steady_after(samples, window=5, tolerance=0.1):
+    """Index after which latency has settled, or ``None`` if it never did.
+
+    Latency counts as settled once the median of the last ``window`` samples
+    is within ``tolerance`` (relative) of the median of the ``window`` before.
+    """
+    for end in range(2 * window, len(samples) + 1):
+        before = statistics.median(samples[end - 2 * window:end - window])
+        after = statistics.median(samples[end - window:end])
+        if abs(after - before) <= tolerance * before:
+            return end
+    return None
+
+
+class ApiBenchmark:
+    """Wraps the ``benchmark`` fixture for calls that hit the network.
+
+    ``run()`` first calls the target untimed by pytest-benchmark until latency
+    has settled: connection setup (DNS, TLS) and lazy imports land in those
+    warm-up rounds instead of the statistics. The first ``min_warmup`` calls
+    are always spent and left out of the steadiness check, so warm-up takes
+    at least ``min_warmup + 2 * window`` calls. It then times ``rounds`` calls
+    through ``benchmark.pedantic``. ``teardown(result)`` runs after every
+    call, warm-up or measured, outside the timed region, so objects a round
+    creates can be deleted without skewing the numbers.
+    """
+
+    def __init__(self, benchmark, rounds=20, min_warmup=3, max_warmup=30, window=5, tolerance=0.1):
+        self.benchmark = benchmark
+        self.rounds = rounds
+        self.min_warmup = min_warmup
+        self.max_warmup = max_warmup
+        self.window = window
+        self.tolerance = tolerance
+
+    def warm_up(self, call, teardown=None):
+        """Call until latency settles (at most ``max_warmup`` times); return the warm-up latencies."""
+        samples = []
+        while len(samples) < self.max_warmup:
+            start = time.perf_counter()
+            result = call()
+            samples.append(time.perf_counter() - start)
+            if teardown is not None:
+                teardown(result)
+            settling = samples[self.min_warmup:]
+            if steady_after(settling[-2 * self.window:], self.window, self.tolerance) is not None:
+                break
+        return samples
+
+    def run(self, call, *args, teardown=None, **kwargs):
+        """Benchmark ``call(*args, **kwargs)`` in steady state and return the last result."""
+        target = lambda: call(*args, **kwargs)
+        if self.benchmark.disabled: # --benchmark-disable: a single plain call, still cleaned up
+            result = self.benchmark.pedantic(target)
+            if teardown is not None:
+                teardown(result)
+            return result
+        warmup = self.warm_up(target, teardown)
+        results = []
+
+        def timed(): # the append costs nanoseconds against a network round trip
+            results.append(target())
+
+        def untimed():
+            if teardown is not None:
+                teardown(results[-1])
+
+        self.benchmark.pedantic(timed, teardown=untimed, rounds=self.rounds)
+        info = self.benchmark.extra_info
+        info['warmup_rounds'] = len(warmup)
+        info['warmup_steady'] = steady_after(warmup, self.window, self.tolerance) is not None
+        info['first_call'] = warmup[0]
+        info['steady'] = steady_after(self.benchmark.stats.stats.data, self.window, self.tolerance) is not None
+        return results[-1]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-bench-rounds", type=int, default=20,
+                    help="Timed rounds per api_benchmark, after warm-up.")
+    group.addoption("--stripe-bench-max-warmup", type=int, default=30,
+                    help="Most warm-up rounds api_benchmark runs while waiting for latency to settle.")
+
+@pytest.fixture
+def api_benchmark(benchmark, pytestconfig):
+    """``benchmark`` with steady-state warm-up and per-round teardown for API calls."""
+    return ApiBenchmark(benchmark, rounds=pytestconfig.getoption("stripe_bench_rounds"),
+                        max_warmup=pytestconfig.getoption("stripe_bench_max_warmup"))
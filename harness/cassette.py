@@ -0,0 +1,287 @@
+# Record/replay of Stripe API traffic in compressed, memory-mapped cassettes (pytest plugin)
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from harness.cleanup import RUN_TAG_FIELD
+from harness.client import CountingHTTPAdapter
+from harness.models import StripeResponse
+
+MAGIC = b'STRCAS01'
+_TRAILER = struct.Struct('<QQ') # index offset, index length
+
+# Hop-by-hop or encoding headers that no longer describe the stored body
+_DROPPED_HEADERS = frozenset({'content-encoding', 'content-length', 'transfer-encoding', 'connection'})
+
+cassette_key = pytest.StashKey[object]()
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def _normalize_body(body):
+    if not body:
+        return ''
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    if body.lstrip().startswith(('{', '[')):
+        try:
+            return json.dumps(json.loads(body), sort_keys=True, separators=(',', ':'))
+        except ValueError:
+            return body
+    # The run tag differs on every run, so it is left out of the match
+    return urlencode(sorted(pair for pair in parse_qsl(body, keep_blank_values=True) if pair[0] != RUN_TAG_FIELD))
+
+
+def request_key(method, url, body=None, auth=''):
+    """Digest of the normalized method, path, query, body and auth of a request.
+
+    The host and the run tag are left out so a cassette recorded against one
+    ``BASE_URL`` replays against another in a later run; query and form fields
+    are sorted so their order is moot.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    canonical = f'{method.upper()} {parts.path}?{query}\n{auth}\n{_normalize_body(body)}'
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def _auth_of(request, api_key):
+    auth = request.headers.get('Authorization', '')
+    return auth.replace(api_key, '<api-key>') if api_key else auth
+
+
+class CassetteWriter:
+    """Appends zlib-compressed interactions to a cassette file as they happen.
+
+    Layout: ``MAGIC``, one compressed JSON record per interaction, then the
+    compressed index (key -> [[offset, length], ...] in recording order) and a
+    fixed-size trailer pointing at it, written by ``close()``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, method, url, status, headers, content):
+        record = zlib.compress(json.dumps({
+            'method': method, 'url': url, 'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS},
+            'body': content.decode('latin-1'),
+        }).encode())
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(record)
+            self._index.setdefault(key, []).append([offset, len(record)])
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            blob = zlib.compress(json.dumps(self._index).encode())
+            offset = self._file.tell()
+            self._file.write(blob)
+            self._file.write(_TRAILER.pack(offset, len(blob)))
+            self._file.close()
+
+
+class Cassette:
+    """Read side of a cassette: the index in memory, records paged in via mmap.
+
+    ``lookup()`` is a dict probe plus one decompression. Identical requests are
+    answered in the order they were recorded; once the recorded sequence runs
+    out the last answer is repeated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a cassette file')
+        offset, length = _TRAILER.unpack(self._map[-_TRAILER.size:])
+        self._index = json.loads(zlib.decompress(self._map[offset:offset + length]))
+        self._served = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._index.values())
+
+    def lookup(self, key):
+        entries = self._index.get(key)
+        if not entries:
+            return None
+        with self._lock:
+            position = min(self._served[key], len(entries) - 1)
+            self._served[key] += 1
+        offset, length = entries[position]
+        return json.loads(zlib.decompress(self._map[offset:offset + length]))
+
+    def close(self):
+        self._map.close()
+
+
+class RecordingAdapter(CountingHTTPAdapter):
+    """Pooled adapter that also writes every exchange to a cassette."""
+
+    def __init__(self, writer, api_key=None, **kwargs):
+        self.writer = writer
+        self.api_key = api_key
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        key = request_key(request.method, request.url, request.body, _auth_of(request, self.api_key))
+        self.writer.add(key, request.method, request.url, response.status_code,
+                        response.headers, response.content)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers from a cassette and never touches the network."""
+
+    def __init__(self, cassette, api_key=None):
+        super().__init__()
+        self.cassette = cassette
+        self.api_key = api_key
+        self.served = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = request_key(request.method, request.url, request.body, _auth_of(request, self.api_key))
+        record = self.cassette.lookup(key)
+        if record is None:
+            raise CassetteMiss(f'No recorded interaction for {request.method} {request.url}', request=request)
+        self.served += 1
+        response = StripeResponse()
+        response.status_code = record['status']
+        response.headers = CaseInsensitiveDict(record['headers'])
+        response._content = record['body'].encode('latin-1')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        return response
+
+    def close(self):
+        pass
+
+    def connection_stats(self):
+        return {'connections': 0, 'requests': self.served, 'reused': 0}
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that sends through a pooled ``AsyncHTTPTransport`` and writes every exchange to a cassette."""
+
+    def __init__(self, writer, api_key=None, **transport_kwargs):
+        self.writer = writer
+        self.api_key = api_key
+        self.transport = httpx.AsyncHTTPTransport(**transport_kwargs)
+
+    async def handle_async_request(self, request):
+        response = await self.transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        url = str(request.url)
+        key = request_key(request.method, url, await request.aread(), _auth_of(request, self.api_key))
+        self.writer.add(key, request.method, url, response.status_code, response.headers, content)
+        # the body is already decoded, so it goes back without the headers that described the wire format
+        return httpx.Response(response.status_code, content=content, extensions=response.extensions,
+                              headers=[(k, v) for k, v in response.headers.items()
+                                       if k.lower() not in _DROPPED_HEADERS])
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """httpx counterpart of ReplayAdapter: answers AsyncStripeClient requests from a cassette."""
+
+    def __init__(self, cassette, api_key=None):
+        self.cassette = cassette
+        self.api_key = api_key
+        self.served = 0
+
+    async def handle_async_request(self, request):
+        key = request_key(request.method, str(request.url), await request.aread(), _auth_of(request, self.api_key))
+        record = self.cassette.lookup(key)
+        if record is None:
+            raise CassetteMiss(f'No recorded interaction for {request.method} {request.url}')
+        self.served += 1
+        return httpx.Response(record['status'], headers=record['headers'], content=record['body'].encode('latin-1'))
+
+
+def make_adapter(config, api_key, **pool_kwargs):
+    """Adapter for stripe_client under --stripe-record/--stripe-replay, else None."""
+    cassette = config.stash.get(cassette_key, None)
+    if isinstance(cassette, CassetteWriter):
+        return RecordingAdapter(cassette, api_key=api_key, **pool_kwargs)
+    if isinstance(cassette, Cassette):
+        return ReplayAdapter(cassette, api_key=api_key)
+    return None
+
+
+def make_session(config, api_key):
+    """``requests.Session`` for the stripe SDK's HTTP client under --stripe-record/--stripe-replay, else None."""
+    adapter = make_adapter(config, api_key)
+    if adapter is None:
+        return None
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def make_transport(config, api_key, max_connections=100, max_keepalive=20):
+    """httpx transport for async_stripe_client under --stripe-record/--stripe-replay, else None."""
+    cassette = config.stash.get(cassette_key, None)
+    if isinstance(cassette, CassetteWriter):
+        # httpx ignores the client's limits once it is handed a transport, so the recording one gets them
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        return RecordingTransport(cassette, api_key=api_key, limits=limits)
+    if isinstance(cassette, Cassette):
+        return ReplayTransport(cassette, api_key=api_key)
+    return None
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-record", metavar="PATH", default=None,
+                    help="Record every stripe_client and async_stripe_client exchange into a cassette file.")
+    group.addoption("--stripe-replay", metavar="PATH", default=None,
+                    help="Serve stripe_client and async_stripe_client requests from a recorded cassette "
+                         "instead of the network.")
+
+def pytest_configure(config):
+    record, replay = config.getoption("stripe_record"), config.getoption("stripe_replay")
+    if record and replay:
+        raise pytest.UsageError("--stripe-record and --stripe-replay are mutually exclusive")
+    if record:
+        if hasattr(config, "workerinput") or config.getoption("numprocesses", None):
+            raise pytest.UsageError("--stripe-record cannot be combined with xdist workers")
+        writer = CassetteWriter(record)
+        config.add_cleanup(writer.close)
+        config.stash[cassette_key] = writer
+    elif replay:
+        if not os.path.exists(replay):
+            raise pytest.UsageError(f"Cassette not found: {replay}")
+        cassette = Cassette(replay)
+        config.add_cleanup(cassette.close)
+        config.stash[cassette_key] = cassette
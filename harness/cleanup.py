@@ -0,0 +1,181 @@
+# Run-tagged teardown of objects the suites create, plus a sweeper for leaked ones (pytest plugin)
+import argparse
+import re
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from harness.client import StripeClient
+from harness.pager import paginate
+from harness.settings import load
+
+# Metadata key every object created through the suite's clients is tagged with
+RUN_TAG = 'test_run_id'
+RUN_TAG_FIELD = f'metadata[{RUN_TAG}]'
+
+# POSTs that create a top-level object (and so get tagged)
+_CREATES = re.compile(r'/v1/(customers|charges)/?$')
+_CUSTOMERS = re.compile(r'/v1/customers/?$')
+_CUSTOMER = re.compile(r'/v1/customers/([^/]+)/?$')
+
+tracker_key = pytest.StashKey[object]()
+
+
+def new_run_id():
+    """A sortable, unique tag for one pytest session: ``20260101T120000-1a2b3c``."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+
+
+def delete_customers(client, customer_ids, workers=8):
+    """Delete customers concurrently; return the IDs that could not be deleted.
+
+    Deleting a customer also deletes its cards. 404s count as deleted.
+    """
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(customer_ids))) as executor:
+        responses = list(executor.map(lambda cid: client.delete(f'/customers/{cid}'), customer_ids))
+    return [cid for cid, r in zip(customer_ids, responses) if r.status_code not in (200, 404)]
+
+
+class ObjectTracker:
+    """Tags what the clients create with the run ID and remembers it for teardown.
+
+    POSTs to ``/customers`` and ``/charges`` get ``metadata[test_run_id]``
+    unless the caller set it. Created customers are recorded until a test
+    deletes them itself; ``delete_all()`` removes the rest at session end.
+    Charges cannot be deleted through the API, so they are only tagged.
+    """
+
+    def __init__(self, run_id, workers=8):
+        self.run_id = run_id
+        self.workers = workers
+        self.customers = set()
+        self.deleted = 0
+        self._lock = threading.Lock()
+
+    def tag(self, method, url, kwargs):
+        if method.upper() != 'POST' or not _CREATES.search(url.split('?')[0]):
+            return
+        data = kwargs.get('data') or {}
+        if isinstance(data, dict) and RUN_TAG_FIELD not in data:
+            kwargs['data'] = dict(data, **{RUN_TAG_FIELD: self.run_id}) # never touch the caller's dict
+
+    def track(self, method, url, response):
+        if response.status_code != 200:
+            return
+        path = url.split('?')[0]
+        if method.upper() == 'POST' and _CUSTOMERS.search(path):
+            self.add(response.json()['id'])
+        elif method.upper() == 'DELETE' and (match := _CUSTOMER.search(path)):
+            with self._lock:
+                self.customers.discard(match.group(1))
+
+    def add(self, customer_id):
+        """Record a customer created outside the tracked clients (e.g. via the SDK)."""
+        with self._lock:
+            self.customers.add(customer_id)
+
+    def discard(self, customer_id):
+        """Forget a customer deleted outside the tracked clients."""
+        with self._lock:
+            self.customers.discard(customer_id)
+
+    def delete_all(self, client):
+        """Delete every tracked customer concurrently; return the ones that failed."""
+        with self._lock:
+            customers, self.customers = sorted(self.customers), set()
+        failed = delete_customers(client, customers, self.workers)
+        self.deleted += len(customers) - len(failed)
+        return failed
+
+
+def find_leaked(client, run_id=None, older_than=None):
+    """IDs of tagged customers from ``run_id`` (any run if None) created more than ``older_than`` seconds ago."""
+    params = {}
+    cutoff = None
+    if older_than is not None:
+        cutoff = int(time.time() - older_than)
+        params['created[lt]'] = cutoff
+    leaked = []
+    for customer in paginate(client, '/customers', params):
+        tag = (customer.get('metadata') or {}).get(RUN_TAG)
+        if tag is None or (run_id is not None and tag != run_id):
+            continue
+        if cutoff is not None and customer['created'] >= cutoff:
+            continue
+        leaked.append(customer['id'])
+    return leaked
+
+
+def sweep(client, run_id=None, older_than=None, workers=8, dry_run=False):
+    """Delete leaked test customers; return ``(found, failed)`` ID lists."""
+    leaked = find_leaked(client, run_id, older_than)
+    if dry_run:
+        return leaked, []
+    return leaked, delete_customers(client, leaked, workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Delete customers leaked by earlier test runs.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--run-id', help=f'Only customers whose metadata[{RUN_TAG}] is this run ID.')
+    target.add_argument('--all-runs', action='store_true', help=f'Every customer carrying metadata[{RUN_TAG}].')
+    parser.add_argument('--older-than', type=float, default=None, metavar='HOURS',
+                        help='Skip customers created in the last HOURS (leave running suites alone).')
+    parser.add_argument('--workers', type=int, default=8, help='Deletes in flight at once.')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be deleted and stop.')
+    args = parser.parse_args(argv)
+
+    settings = load()
+    if not settings.api_key:
+        parser.error('STRIPE_API_KEY environment variable not set')
+    older_than = args.older_than * 3600 if args.older_than is not None else None
+    with StripeClient(settings.api_key, base_url=settings.base_url,
+                      pool_maxsize=args.workers) as client:
+        found, failed = sweep(client, args.run_id, older_than, args.workers, args.dry_run)
+    verb = 'would delete' if args.dry_run else 'deleted'
+    print(f'{verb} {len(found) - len(failed)} of {len(found)} tagged customers')
+    for customer_id in failed:
+        print(f'failed to delete {customer_id}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-run-id", default=None,
+                    help=f"Tag created objects with this metadata[{RUN_TAG}] (default: a fresh ID per run).")
+
+def pytest_configure(config):
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is not None:
+        run_id = workerinput["stripe_run_id"]
+    else:
+        run_id = config.getoption("stripe_run_id") or new_run_id()
+    config.stash[tracker_key] = ObjectTracker(run_id)
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    # xdist controller: every worker tags with the same run ID
+    node.workerinput["stripe_run_id"] = node.config.stash[tracker_key].run_id
+
+def pytest_terminal_summary(terminalreporter, config):
+    tracker = config.stash.get(tracker_key, None)
+    if tracker is None or not tracker.deleted:
+        return
+    terminalreporter.write_sep("-", "stripe cleanup")
+    terminalreporter.write_line(f"{tracker.deleted} customers from run {tracker.run_id} deleted at session end")
+
+@pytest.fixture(scope="session")
+def stripe_object_tracker(pytestconfig):
+    """Tags created objects with the run ID and deletes tracked customers at session end."""
+    return pytestconfig.stash[tracker_key]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
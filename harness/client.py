@@ -0,0 +1,137 @@
+# Pooled HTTP client shared by the Stripe API test suites
+import requests
+from requests.adapters import HTTPAdapter
+
+from harness import timing
+from harness.models import StripeResponse
+
+DEFAULT_BASE_URL = 'https://api.stripe.com/v1'
+
+
+def join_url(base_url, path):
+    """Resolve ``path`` against ``base_url``; absolute URLs pass through as-is."""
+    if '://' in path:
+        return path
+    return f"{base_url.rstrip('/')}/{path.lstrip('/')}"
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps connection and request tallies for its pools."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        timing.install(self.poolmanager) # phases are only taken inside PhaseRecorder.measure()
+        self._retired_connections = 0
+        self._retired_requests = 0
+        # Pools evicted from the manager (or dropped on close) report their
+        # counters here first so the totals survive the whole session.
+        self.poolmanager.pools.dispose_func = self._retire_pool
+
+    def build_response(self, req, resp):
+        response = super().build_response(req, resp)
+        response.__class__ = StripeResponse # fast json() returning lazy object views
+        return response
+
+    def _retire_pool(self, pool):
+        self._retired_connections += pool.num_connections
+        self._retired_requests += pool.num_requests
+        pool.close()
+
+    def connection_stats(self):
+        """Return opened connections, requests sent and how many reused a socket."""
+        pools = self.poolmanager.pools
+        live = [pools[key] for key in pools.keys()]
+        connections = self._retired_connections + sum(p.num_connections for p in live)
+        sent = self._retired_requests + sum(p.num_requests for p in live)
+        return {
+            'connections': connections,
+            'requests': sent,
+            'reused': max(sent - connections, 0),
+        }
+
+
+class StripeClient:
+    """One keep-alive ``requests.Session`` carrying the Stripe auth headers.
+
+    Paths are resolved against ``base_url``; absolute URLs pass through as-is.
+    Per-call ``headers`` are merged over the session headers, so a test can
+    drop auth with ``headers={'Authorization': None}``. ``throttle``, when
+    given, is called before every attempt (e.g. a shared rate limiter).
+    ``adapter`` replaces the default pooled transport (e.g. cassette replay).
+    ``retry`` is a ``RetryPolicy`` that re-sends failed requests,
+    ``recorder`` a ``PhaseRecorder`` that times the phases of every attempt,
+    ``tracker`` an ``ObjectTracker`` that run-tags and remembers created objects
+    and ``schemas`` a ``SchemaBook`` that checks every response's shape.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, pool_connections=4,
+                 pool_maxsize=16, max_retries=0, timeout=None, throttle=None, adapter=None, retry=None,
+                 recorder=None, tracker=None, schemas=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.throttle = throttle
+        self.retry = retry
+        self.recorder = recorder
+        self.tracker = tracker
+        self.schemas = schemas
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/x-www-form-urlencoded',
+        })
+        self.adapter = adapter or CountingHTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries,
+        )
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def url(self, path):
+        return join_url(self.base_url, path)
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url(path)
+        if self.tracker is not None:
+            self.tracker.tag(method, url, kwargs)
+        if self.retry is None:
+            response = self._send(method, url, **kwargs)
+        else:
+            headers = kwargs.pop('headers', None)
+            response = self.retry.call(method, url, lambda h: self._send(method, url, headers=h, **kwargs), headers)
+        if self.tracker is not None:
+            self.tracker.track(method, url, response)
+        if self.schemas is not None:
+            self.schemas.observe(response)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        if self.throttle is not None:
+            self.throttle()
+        if self.recorder is None:
+            return self.session.request(method, url, **kwargs)
+        with self.recorder.measure(method, url) as phases:
+            response = self.session.request(method, url, **kwargs)
+        return self.recorder.finish(phases, response)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def connection_stats(self):
+        return self.adapter.connection_stats()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,700 @@
+# Local in-process stand-in for the Stripe Customers, Cards and Charges API
+import argparse
+import json
+import math
+import os
+import re
+import secrets
+import string
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_API_KEY = 'sk_test_emulator'
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+# Test tokens understood by the emulator: card details plus the decline they trigger
+TEST_TOKENS = {
+    'tok_visa': {'brand': 'Visa', 'last4': '4242', 'funding': 'credit', 'decline': None},
+    'tok_visa_debit': {'brand': 'Visa', 'last4': '5556', 'funding': 'debit', 'decline': None},
+    'tok_mastercard': {'brand': 'MasterCard', 'last4': '4444', 'funding': 'credit', 'decline': None},
+    'tok_amex': {'brand': 'American Express', 'last4': '8431', 'funding': 'credit', 'decline': None},
+    'tok_chargeDeclined': {'brand': 'Visa', 'last4': '0002', 'funding': 'credit',
+                           'decline': ('generic_decline', 'Your card was declined.')},
+    'tok_chargeDeclinedInsufficientFunds': {'brand': 'Visa', 'last4': '9995', 'funding': 'credit',
+                                            'decline': ('insufficient_funds', 'Your card has insufficient funds.')},
+}
+
+SUPPORTED_CURRENCIES = frozenset({'usd', 'eur', 'gbp', 'cad', 'aud', 'jpy', 'chf', 'sek', 'nok', 'dkk'})
+
+MIN_AMOUNT = 50 # $0.50
+MAX_AMOUNT = 99999999 # $999,999.99
+
+# Parameters each create endpoint accepts; anything else is rejected like the live API does
+CUSTOMER_PARAMS = frozenset({
+    'address', 'balance', 'coupon', 'description', 'email', 'expand', 'invoice_prefix', 'invoice_settings',
+    'metadata', 'name', 'next_invoice_sequence', 'payment_method', 'phone', 'preferred_locales',
+    'promotion_code', 'shipping', 'source', 'tax', 'tax_exempt', 'tax_id_data', 'test_clock',
+})
+CARD_PARAMS = frozenset({'expand', 'metadata', 'source', 'validate'})
+CHARGE_PARAMS = frozenset({
+    'amount', 'application_fee_amount', 'capture', 'currency', 'customer', 'description', 'expand',
+    'metadata', 'on_behalf_of', 'radar_options', 'receipt_email', 'shipping', 'source', 'statement_descriptor',
+    'statement_descriptor_suffix', 'transfer_data', 'transfer_group',
+})
+REFUND_PARAMS = frozenset({
+    'amount', 'charge', 'expand', 'instructions_email', 'metadata', 'origin', 'payment_intent', 'reason',
+    'refund_application_fee', 'reverse_transfer',
+})
+REFUND_REASONS = frozenset({'duplicate', 'fraudulent', 'requested_by_customer'})
+
+MAX_METADATA_KEYS = 50
+MAX_METADATA_KEY_LENGTH = 40
+MAX_METADATA_VALUE_LENGTH = 500
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def make_id(prefix, length=24):
+    """Return a Stripe-looking object ID such as ``cus_Q3kX...``."""
+    return prefix + ''.join(secrets.choice(_ID_ALPHABET) for _ in range(length))
+
+
+class StripeError(Exception):
+    """An API error rendered as Stripe's ``{"error": {...}}`` body."""
+
+    def __init__(self, status, message, type='invalid_request_error', code=None, param=None, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {'message': message, 'type': type}
+        if code:
+            self.body['code'] = code
+            self.body['doc_url'] = f"https://stripe.com/docs/error-codes/{code.replace('_', '-')}"
+        if param:
+            self.body['param'] = param
+        self.body.update(extra)
+
+    def to_dict(self):
+        return {'error': dict(self.body)}
+
+
+def _missing(kind, object_id, status=404, param='id'):
+    return StripeError(status, f"No such {kind}: '{object_id}'", code='resource_missing', param=param)
+
+
+class Store:
+    """Insertion-ordered object store with O(1) lookup and cursor pagination.
+
+    Deleted IDs leave a tombstone in the order list until more than half of it
+    is dead, so ``starting_after`` stays a dict lookup instead of a scan.
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self._order = []
+        self._position = {}
+
+    def __contains__(self, object_id):
+        return object_id in self._objects
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __iter__(self):
+        return iter(list(self._objects.values()))
+
+    def get(self, object_id):
+        return self._objects.get(object_id)
+
+    def add(self, obj):
+        self._objects[obj['id']] = obj
+        self._position[obj['id']] = len(self._order)
+        self._order.append(obj['id'])
+        return obj
+
+    def remove(self, object_id):
+        obj = self._objects.pop(object_id, None)
+        if obj is not None and len(self._order) > 2 * len(self._objects) + 64:
+            self._order = [i for i in self._order if i in self._objects]
+            self._position = {i: n for n, i in enumerate(self._order)}
+        return obj
+
+    def page(self, limit=10, starting_after=None, predicate=None):
+        """Return ``(objects, has_more)`` newest first, like Stripe list endpoints."""
+        start = len(self._order) - 1
+        if starting_after is not None:
+            if starting_after not in self._objects:
+                raise _missing('object', starting_after, status=400, param='starting_after')
+            start = self._position[starting_after] - 1
+        found = []
+        for index in range(start, -1, -1):
+            obj = self._objects.get(self._order[index])
+            if obj is None or (predicate and not predicate(obj)):
+                continue
+            if len(found) == limit:
+                return found, True
+            found.append(obj)
+        return found, False
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to rate limit the emulator like the live API."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate / 10))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token; return 0 on success or the seconds until one is due."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+def _nest(pairs):
+    """Turn form pairs like ``metadata[key]=v`` into nested dicts."""
+    params = {}
+    for key, value in pairs:
+        if '[' in key and key.endswith(']'):
+            name, _, sub = key[:-1].partition('[')
+            target = params.setdefault(name, {})
+            if isinstance(target, dict):
+                target[sub] = value
+        else:
+            params[key] = value
+    return params
+
+
+def _check_params(params, allowed):
+    for name in params:
+        if name not in allowed:
+            raise StripeError(400, f'Received unknown parameter: {name}', code='parameter_unknown', param=name)
+    metadata = params.get('metadata')
+    if not isinstance(metadata, dict):
+        return
+    if len(metadata) > MAX_METADATA_KEYS:
+        raise StripeError(400, f'Invalid metadata: metadata can have up to {MAX_METADATA_KEYS} keys, '
+                               f'but you passed in {len(metadata)} keys.', param='metadata')
+    for key, value in metadata.items():
+        if len(key) > MAX_METADATA_KEY_LENGTH:
+            raise StripeError(400, f'Metadata keys can have up to {MAX_METADATA_KEY_LENGTH} characters, '
+                                   f'but you passed in a key with {len(key)} characters.', param='metadata')
+        if len(value) > MAX_METADATA_VALUE_LENGTH:
+            raise StripeError(400, f'Metadata values can have up to {MAX_METADATA_VALUE_LENGTH} characters, '
+                                   f'but you passed in a value with {len(value)} characters.',
+                              param=f'metadata[{key}]')
+
+
+def _parse_int(params, name):
+    raw = params.get(name)
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise StripeError(400, f'Invalid integer: {raw}', code='parameter_invalid_integer', param=name)
+
+
+class StripeEmulator:
+    """Stateful emulation of the subset of the Stripe API the suites exercise.
+
+    ``handle()`` is transport independent; ``start()`` serves it over HTTP on a
+    background thread and returns the ``BASE_URL`` to point the suites at.
+    With ``rate_limit`` (req/s) the HTTP server answers requests over the
+    token-bucket budget with 429 and a ``Retry-After`` header, as Stripe does.
+    POSTs carrying an ``Idempotency-Key`` run once; retries get the first result.
+    """
+
+    def __init__(self, api_key=DEFAULT_API_KEY, host='127.0.0.1', port=0, rate_limit=None, burst=None):
+        self.api_key = api_key
+        self.limiter = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.host = host
+        self.port = port
+        self.customers = Store()
+        self.charges = Store()
+        self.cards_by_customer = {} # customer id -> Store of that customer's cards
+        self.charges_by_customer = {} # customer id -> Store of that customer's charges
+        self.refunds = Store()
+        self.idempotency = {} # Idempotency-Key -> (request fingerprint, (status, body))
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._routes = [
+            ('GET', re.compile(r'^/v1/customers$'), self._list_customers),
+            ('POST', re.compile(r'^/v1/customers$'), self._create_customer),
+            ('GET', re.compile(r'^/v1/customers/([^/]+)$'), self._retrieve_customer),
+            ('POST', re.compile(r'^/v1/customers/([^/]+)$'), self._update_customer),
+            ('DELETE', re.compile(r'^/v1/customers/([^/]+)$'), self._delete_customer),
+            ('GET', re.compile(r'^/v1/customers/([^/]+)/sources$'), self._list_cards),
+            ('POST', re.compile(r'^/v1/customers/([^/]+)/sources$'), self._create_card),
+            ('GET', re.compile(r'^/v1/customers/([^/]+)/sources/([^/]+)$'), self._retrieve_card),
+            ('POST', re.compile(r'^/v1/customers/([^/]+)/sources/([^/]+)$'), self._update_card),
+            ('DELETE', re.compile(r'^/v1/customers/([^/]+)/sources/([^/]+)$'), self._delete_card),
+            ('GET', re.compile(r'^/v1/charges$'), self._list_charges),
+            ('POST', re.compile(r'^/v1/charges$'), self._create_charge),
+            ('GET', re.compile(r'^/v1/charges/([^/]+)$'), self._retrieve_charge),
+            ('GET', re.compile(r'^/v1/refunds$'), self._list_refunds),
+            ('POST', re.compile(r'^/v1/refunds$'), self._create_refund),
+            ('GET', re.compile(r'^/v1/refunds/([^/]+)$'), self._retrieve_refund),
+        ]
+
+    # --- Transport-independent entry point ---
+
+    def handle(self, method, path, query='', body='', headers=None):
+        """Serve one request and return ``(status, json_body)``."""
+        try:
+            self._authenticate(headers or {})
+            params = _nest(parse_qsl(query, keep_blank_values=True))
+            params.update(_nest(parse_qsl(body, keep_blank_values=True)))
+            key = next((v for k, v in (headers or {}).items() if k.lower() == 'idempotency-key'), None)
+            for route_method, pattern, view in self._routes:
+                match = pattern.match(path)
+                if match and route_method == method:
+                    with self._lock:
+                        if method != 'POST' or not key:
+                            return self._dispatch(view, params, match.groups())
+                        return self._idempotent(key, (method, path, params), view, params, match.groups())
+            raise StripeError(404, f'Unrecognized request URL ({method}: {path}).')
+        except StripeError as exc:
+            return exc.status, exc.to_dict()
+
+    def _dispatch(self, view, params, args):
+        try:
+            return 200, view(params, *args)
+        except StripeError as exc:
+            return exc.status, exc.to_dict()
+
+    def _idempotent(self, key, fingerprint, view, params, args):
+        """Run a POST once per ``Idempotency-Key``; repeats get the first result back."""
+        seen = self.idempotency.get(key)
+        if seen is None:
+            result = self._dispatch(view, params, args)
+            self.idempotency[key] = (fingerprint, result)
+            return result
+        if seen[0] != fingerprint:
+            raise StripeError(400, f'Keys for idempotent requests can only be used with the same parameters '
+                                   f'they were first used with. Try using a key other than {key!r} if you '
+                                   f'meant to execute a different request.', type='idempotency_error')
+        return seen[1]
+
+    def admit(self):
+        """Return ``None`` if a request may proceed, else a 429 ``(status, body, retry_after)``."""
+        wait = self.limiter.take() if self.limiter else 0
+        if not wait:
+            return None
+        error = StripeError(429, 'Too many requests hit the API too quickly. We recommend an exponential '
+                                 'backoff of your requests.', code='rate_limit')
+        return error.status, error.to_dict(), max(1, math.ceil(wait))
+
+    def _authenticate(self, headers):
+        auth = next((v for k, v in headers.items() if k.lower() == 'authorization'), '')
+        if not auth:
+            raise StripeError(401, 'You did not provide an API key. You need to provide your API key '
+                                   'in the Authorization header, using Bearer auth.')
+        key = auth[len('Bearer '):] if auth.startswith('Bearer ') else auth
+        if key != self.api_key:
+            raise StripeError(401, f'Invalid API Key provided: {key[:8]}****{key[-4:]}')
+
+    # --- Customers ---
+
+    def _customer(self, customer_id, status=404, param='id'):
+        customer = self.customers.get(customer_id)
+        if customer is None:
+            raise _missing('customer', customer_id, status=status, param=param)
+        return customer
+
+    def _apply_customer_params(self, customer, params):
+        email = params.get('email')
+        if email is not None and email != '' and not _EMAIL_RE.match(email):
+            raise StripeError(400, f'Invalid email address: {email}', code='parameter_invalid_string', param='email')
+        for field in ('email', 'name', 'description', 'phone'):
+            if field in params:
+                customer[field] = params[field] or None
+        if isinstance(params.get('metadata'), dict):
+            customer['metadata'].update(params['metadata'])
+
+    def _create_customer(self, params):
+        _check_params(params, CUSTOMER_PARAMS)
+        customer = {
+            'id': make_id('cus_', 14), 'object': 'customer', 'created': int(time.time()),
+            'email': None, 'name': None, 'description': None, 'phone': None,
+            'default_source': None, 'livemode': False, 'metadata': {},
+        }
+        self._apply_customer_params(customer, params)
+        self.cards_by_customer[customer['id']] = Store()
+        self.charges_by_customer[customer['id']] = Store()
+        return self.customers.add(customer)
+
+    def _retrieve_customer(self, params, customer_id):
+        return self._customer(customer_id)
+
+    def _update_customer(self, params, customer_id):
+        customer = self._customer(customer_id)
+        self._apply_customer_params(customer, params)
+        return customer
+
+    def _delete_customer(self, params, customer_id):
+        self._customer(customer_id)
+        self.customers.remove(customer_id)
+        del self.cards_by_customer[customer_id]
+        # the charges themselves stay retrievable, as on Stripe; only the per-customer index goes
+        self.charges_by_customer.pop(customer_id, None)
+        return {'id': customer_id, 'object': 'customer', 'deleted': True}
+
+    def _list_customers(self, params):
+        email = params.get('email')
+        predicate = (lambda c: c['email'] == email) if email else None
+        return self._list(self.customers, params, '/v1/customers', predicate)
+
+    def _list(self, store, params, url, predicate=None):
+        limit = _parse_int(params, 'limit') if 'limit' in params else 10
+        if not 1 <= limit <= 100:
+            raise StripeError(400, 'This value must be between 1 and 100 (it currently is %d).' % limit,
+                              code='parameter_invalid_integer', param='limit')
+        data, has_more = store.page(limit, params.get('starting_after'), predicate)
+        return {'object': 'list', 'data': data, 'has_more': has_more, 'url': url}
+
+    # --- Cards ---
+
+    def _token(self, token, param='source'):
+        details = TEST_TOKENS.get(token)
+        if details is None:
+            raise StripeError(400, f"No such token: '{token}'. The request included part of the token that is not valid.",
+                              code='resource_missing', param=param)
+        return details
+
+    def _new_card(self, details, customer_id=None):
+        return {
+            'id': make_id('card_'), 'object': 'card', 'customer': customer_id,
+            'brand': details['brand'], 'last4': details['last4'], 'funding': details['funding'],
+            'exp_month': 12, 'exp_year': time.gmtime().tm_year + 1, 'country': 'US',
+            'fingerprint': make_id('', 16), 'name': None, 'address_zip': None,
+            'cvc_check': 'pass', 'metadata': {},
+        }
+
+    def _card(self, customer_id, card_id):
+        self._customer(customer_id)
+        card = self.cards_by_customer[customer_id].get(card_id)
+        if card is None:
+            raise _missing('source', card_id)
+        return card
+
+    def _create_card(self, params, customer_id):
+        customer = self._customer(customer_id, status=400, param='customer')
+        _check_params(params, CARD_PARAMS)
+        if 'source' not in params:
+            raise StripeError(400, 'Missing required param: source.', code='parameter_missing', param='source')
+        details = self._token(params['source'])
+        if details['decline']:
+            decline_code, message = details['decline']
+            raise StripeError(402, message, type='card_error', code='card_declined', decline_code=decline_code)
+        card = self._new_card(details, customer_id)
+        if isinstance(params.get('metadata'), dict):
+            card['metadata'].update(params['metadata'])
+        self.cards_by_customer[customer_id].add(card)
+        if customer['default_source'] is None:
+            customer['default_source'] = card['id']
+        return card
+
+    def _retrieve_card(self, params, customer_id, card_id):
+        return self._card(customer_id, card_id)
+
+    def _update_card(self, params, customer_id, card_id):
+        card = self._card(customer_id, card_id)
+        for field in ('name', 'address_zip', 'exp_month', 'exp_year'):
+            if field in params:
+                card[field] = params[field]
+        if isinstance(params.get('metadata'), dict):
+            card['metadata'].update(params['metadata'])
+        return card
+
+    def _delete_card(self, params, customer_id, card_id):
+        self._card(customer_id, card_id)
+        self.cards_by_customer[customer_id].remove(card_id)
+        customer = self.customers.get(customer_id)
+        if customer['default_source'] == card_id:
+            remaining, _ = self.cards_by_customer[customer_id].page(limit=1)
+            customer['default_source'] = remaining[0]['id'] if remaining else None
+        return {'id': card_id, 'object': 'card', 'customer': customer_id, 'deleted': True}
+
+    def _list_cards(self, params, customer_id):
+        self._customer(customer_id)
+        return self._list(self.cards_by_customer[customer_id], params, f'/v1/customers/{customer_id}/sources')
+
+    # --- Charges ---
+
+    def _charge_source(self, params):
+        customer_id = params.get('customer')
+        source = params.get('source')
+        if customer_id:
+            customer = self._customer(customer_id, status=400, param='customer')
+            if source is None:
+                source = customer['default_source']
+                if source is None:
+                    raise StripeError(400, 'Cannot charge a customer that has no active card',
+                                      code='missing', param='card')
+            if source.startswith('card_'):
+                card = self.cards_by_customer[customer_id].get(source)
+                if card is None:
+                    raise _missing('source', source, status=400, param='source')
+                return customer_id, card, None
+        if source is None:
+            raise StripeError(400, 'Must provide source or customer.')
+        details = self._token(source)
+        return customer_id, self._new_card(details), details['decline']
+
+    def _create_charge(self, params):
+        _check_params(params, CHARGE_PARAMS)
+        if 'amount' not in params:
+            raise StripeError(400, 'Missing required param: amount.', code='parameter_missing', param='amount')
+        amount = _parse_int(params, 'amount')
+        if amount < 0:
+            raise StripeError(400, 'Invalid positive integer', code='parameter_invalid_integer', param='amount')
+        if amount < MIN_AMOUNT:
+            raise StripeError(400, 'Amount must be at least $0.50 usd', code='amount_too_small', param='amount')
+        if amount > MAX_AMOUNT:
+            raise StripeError(400, 'Amount must be no more than $999,999.99', code='amount_too_large', param='amount')
+        if 'currency' not in params:
+            raise StripeError(400, 'Missing required param: currency.', code='parameter_missing', param='currency')
+        currency = params['currency'].lower()
+        if currency not in SUPPORTED_CURRENCIES:
+            raise StripeError(400, f"Invalid currency: {currency}. Stripe currently supports these currencies: "
+                                   f"{', '.join(sorted(SUPPORTED_CURRENCIES))}", param='currency')
+        customer_id, card, decline = self._charge_source(params)
+        charge = {
+            'id': make_id('ch_'), 'object': 'charge', 'created': int(time.time()),
+            'amount': amount, 'amount_captured': 0 if decline else amount, 'amount_refunded': 0,
+            'currency': currency, 'customer': customer_id, 'description': params.get('description'),
+            'metadata': dict(params['metadata']) if isinstance(params.get('metadata'), dict) else {},
+            'balance_transaction': None if decline else make_id('txn_'),
+            'paid': not decline, 'captured': not decline, 'refunded': False,
+            'status': 'failed' if decline else 'succeeded',
+            'failure_code': 'card_declined' if decline else None,
+            'failure_message': decline[1] if decline else None,
+            'outcome': {
+                'network_status': 'declined_by_network' if decline else 'approved_by_network',
+                'reason': decline[0] if decline else None,
+                'risk_level': 'normal',
+                'seller_message': 'The bank did not return any further details with this decline.'
+                                  if decline else 'Payment complete.',
+                'type': 'issuer_declined' if decline else 'authorized',
+            },
+            'source': card, 'livemode': False,
+        }
+        self.charges.add(charge)
+        if customer_id:
+            self.charges_by_customer[customer_id].add(charge)
+        if decline:
+            raise StripeError(402, decline[1], type='card_error', code='card_declined',
+                              decline_code=decline[0], charge=charge['id'])
+        return charge
+
+    def _retrieve_charge(self, params, charge_id):
+        charge = self.charges.get(charge_id)
+        if charge is None:
+            raise _missing('charge', charge_id)
+        return charge
+
+    def _list_charges(self, params):
+        customer_id = params.get('customer')
+        if customer_id:
+            store = self.charges_by_customer.get(customer_id)
+            if store is None:
+                raise _missing('customer', customer_id, param='customer')
+            return self._list(store, params, '/v1/charges')
+        return self._list(self.charges, params, '/v1/charges')
+
+    # --- Refunds ---
+
+    def _create_refund(self, params):
+        _check_params(params, REFUND_PARAMS)
+        charge_id = params.get('charge')
+        if not charge_id:
+            raise StripeError(400, 'One of the following params should be provided for this request: '
+                                   'payment_intent or charge.', code='parameter_missing', param='charge')
+        charge = self.charges.get(charge_id)
+        if charge is None:
+            raise _missing('charge', charge_id, status=400, param='charge')
+        remaining = charge['amount_captured'] - charge['amount_refunded']
+        if charge['refunded'] or (charge['amount_captured'] and not remaining):
+            raise StripeError(400, f'Charge {charge_id} has already been refunded.',
+                              code='charge_already_refunded', param='charge')
+        if not charge['paid']:
+            raise StripeError(400, f'Charge {charge_id} was not paid, so it cannot be refunded.', param='charge')
+        amount = _parse_int(params, 'amount') if 'amount' in params else remaining
+        if amount <= 0:
+            raise StripeError(400, 'Invalid positive integer', code='parameter_invalid_integer', param='amount')
+        if amount > remaining:
+            raise StripeError(400, f'Refund amount ({amount}) is greater than unrefunded amount on charge '
+                                   f'({remaining})', code='amount_too_large', param='amount')
+        reason = params.get('reason')
+        if reason is not None and reason not in REFUND_REASONS:
+            raise StripeError(400, f'Invalid reason: must be one of {", ".join(sorted(REFUND_REASONS))}',
+                              param='reason')
+        refund = {
+            'id': make_id('re_'), 'object': 'refund', 'created': int(time.time()), 'amount': amount,
+            'charge': charge_id, 'currency': charge['currency'], 'reason': reason, 'status': 'succeeded',
+            'balance_transaction': make_id('txn_'),
+            'metadata': dict(params['metadata']) if isinstance(params.get('metadata'), dict) else {},
+        }
+        charge['amount_refunded'] += amount
+        charge['refunded'] = charge['amount_refunded'] == charge['amount_captured']
+        return self.refunds.add(refund)
+
+    def _retrieve_refund(self, params, refund_id):
+        refund = self.refunds.get(refund_id)
+        if refund is None:
+            raise _missing('refund', refund_id)
+        return refund
+
+    def _list_refunds(self, params):
+        charge_id = params.get('charge')
+        predicate = (lambda refund: refund['charge'] == charge_id) if charge_id else None
+        return self._list(self.refunds, params, '/v1/refunds', predicate)
+
+    # --- HTTP server ---
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}/v1'
+
+    def start(self):
+        """Serve the emulator on a daemon thread and return its base URL."""
+        emulator = self
+
+        class Handler(_EmulatorHandler):
+            app = emulator
+
+        self._server = _EmulatorServer((self.host, self.port), Handler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,),
+                                        name='stripe-emulator', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _EmulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # The default backlog of 5 resets bursts of new connections
+
+
+class _EmulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the real API
+    disable_nagle_algorithm = True # Headers and body go out in separate writes
+    app = None
+
+    def _dispatch(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        rejected = self.app.admit()
+        if rejected:
+            status, payload, retry_after = rejected
+        else:
+            status, payload = self.app.handle(self.command, parts.path, parts.query, body, dict(self.headers))
+            retry_after = None
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', make_id('req_', 14))
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_DELETE = _dispatch
+
+    def log_message(self, *args):
+        pass
+
+
+class EmulatorProcess:
+    """A StripeEmulator served from a child process, with the same ``start()``/``stop()``.
+
+    For measurements of the test process itself (soak mode): the in-process
+    server's own state would otherwise count as the client's memory.
+    """
+
+    def __init__(self, api_key=DEFAULT_API_KEY, rate_limit=None):
+        self.api_key = api_key
+        self.rate_limit = rate_limit
+        self.base_url = None
+        self._process = None
+
+    def start(self):
+        command = [sys.executable, '-m', 'harness.emulator', '--port', '0']
+        if self.rate_limit:
+            command += ['--rate-limit', str(self.rate_limit)]
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # through the environment, not argv, where any local user could read the key in ps
+        env = dict(os.environ, STRIPE_API_KEY=self.api_key)
+        self._process = subprocess.Popen(command, cwd=root, env=env, stdout=subprocess.PIPE, text=True)
+        line = self._process.stdout.readline()
+        if 'BASE_URL=' not in line:
+            self.stop()
+            raise RuntimeError(f'Emulator process failed to start: {line!r}')
+        self.base_url = line.rpartition('BASE_URL=')[2].strip()
+        return self.base_url
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait(timeout=10)
+            self._process.stdout.close()
+            self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the local Stripe stand-in server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--api-key', default=os.getenv('STRIPE_API_KEY', DEFAULT_API_KEY),
+                        help='The only key the emulator accepts (defaults to STRIPE_API_KEY).')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Requests per second before answering 429 (unlimited by default).')
+    parser.add_argument('--burst', type=float, default=None,
+                        help='Token-bucket capacity for --rate-limit (default: a tenth of a second).')
+    args = parser.parse_args(argv)
+    emulator = StripeEmulator(api_key=args.api_key, host=args.host, port=args.port,
+                              rate_limit=args.rate_limit, burst=args.burst)
+    emulator.start()
+    print(f'Stripe emulator listening; export BASE_URL={emulator.base_url}', flush=True)
+    try:
+        emulator._thread.join()
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
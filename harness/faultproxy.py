@@ -0,0 +1,307 @@
+# Fault-injecting HTTP proxy in front of the emulator or the live API
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from fnmatch import fnmatchcase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import requests
+
+from harness.emulator import make_id
+
+SLOWLORIS_CHUNKS = 20 # a slow-loris body trickles out in this many writes
+BANDWIDTH_SLICE = 0.02 # seconds of bandwidth written per write when a cap applies
+
+# Response headers never copied from upstream: hop-by-hop, or rewritten by the proxy
+_DROPPED_HEADERS = frozenset({'connection', 'keep-alive', 'transfer-encoding', 'content-length',
+                              'content-encoding', 'server', 'date'})
+
+# name -> sampler(rng, *params) in seconds
+LATENCY_DISTRIBUTIONS = {
+    'fixed': lambda rng, seconds: seconds,
+    'uniform': lambda rng, low, high: rng.uniform(low, high),
+    'normal': lambda rng, mean, sigma: max(0.0, rng.gauss(mean, sigma)),
+    'lognormal': lambda rng, median, sigma: median * math.exp(rng.gauss(0, sigma)),
+    'exponential': lambda rng, mean: rng.expovariate(1 / mean),
+}
+
+
+def latency(spec):
+    """A ``sampler(rng)`` for ``spec``: seconds, ``'name:p1,p2'`` or a callable.
+
+    ``lognormal:0.05,0.5`` has a 50ms median and a long right tail, which is
+    closer to a real WAN than any fixed delay.
+    """
+    if spec is None or callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda rng: spec
+    name, _, params = spec.partition(':')
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f'Unknown latency distribution {name!r}; expected one of {", ".join(LATENCY_DISTRIBUTIONS)}')
+    sample = LATENCY_DISTRIBUTIONS[name]
+    values = [float(value) for value in params.split(',') if value]
+    return lambda rng: sample(rng, *values)
+
+
+class Fault(NamedTuple):
+    """What to do to the requests of one route; every fault is off by default.
+
+    ``latency`` delays the request before it is forwarded and ``bandwidth``
+    (bytes/s) paces the response body. ``reset`` and ``partial`` are
+    probabilities: the connection is reset in place of the answer, or after
+    half the body. Both happen after upstream has handled the request, as when
+    an answer is lost on the way back. ``error_rate`` answers ``status``
+    at random and ``burst`` answers it for that many requests in a row out of
+    every ``burst_every``; ``retry_after`` adds the header. ``slowloris``
+    trickles the body out in small writes this many seconds apart, so no
+    single read times out while the whole response takes ages.
+    """
+
+    latency: object = None
+    bandwidth: float = None
+    reset: float = 0.0
+    partial: float = 0.0
+    status: int = 503
+    error_rate: float = 0.0
+    burst: int = 0
+    burst_every: int = 0
+    retry_after: float = None
+    slowloris: float = None
+
+
+class Rule:
+    """A ``'METHOD /path'`` glob, its fault and how many requests it has seen."""
+
+    __slots__ = ('pattern', 'fault', 'latency', 'seen')
+
+    def __init__(self, pattern, fault):
+        self.pattern = pattern if ' ' in pattern else f'* {pattern}'
+        self.fault = fault
+        self.latency = latency(fault.latency)
+        self.seen = 0
+
+    def matches(self, method, path):
+        return fnmatchcase(f'{method} {path}', self.pattern)
+
+
+def load_faults(spec):
+    """``[(pattern, Fault)]`` from a JSON file path or inline JSON ``{pattern: {field: value}}``."""
+    if os.path.exists(spec):
+        with open(spec) as f:
+            spec = f.read()
+    return [(pattern, Fault(**fields)) for pattern, fields in json.loads(spec).items()]
+
+
+def _error_body(status):
+    if status == 429:
+        return {'error': {'type': 'invalid_request_error', 'code': 'rate_limit',
+                          'message': 'Too many requests hit the API too quickly.'}}
+    return {'error': {'type': 'api_error', 'message': f'Injected {status} from the fault proxy.'}}
+
+
+class FaultProxy:
+    """Reverse proxy that forwards to ``upstream`` and injects faults per route.
+
+    ``faults`` is a list of ``(pattern, Fault)``; the first pattern matching
+    ``'METHOD /v1/path'`` applies and unmatched requests pass through
+    untouched. Random choices come from one seeded generator, so a run with a
+    single client is reproducible. ``stats()`` counts what was injected.
+    """
+
+    def __init__(self, upstream, faults=(), seed=0, host='127.0.0.1', port=0, timeout=30):
+        parts = urlsplit(upstream)
+        self.upstream = f'{parts.scheme}://{parts.netloc}'
+        self.prefix = parts.path.rstrip('/')
+        self.rules = [Rule(pattern, fault) for pattern, fault in faults]
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.requests = 0
+        self.injected = Counter()
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=64))
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=64))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def plan(self, method, path):
+        """``(fault, action, delay)`` for the next request; ``action`` is one of
+        ``'forward'``, ``'error'``, ``'reset'`` or ``'partial'``."""
+        with self._lock:
+            self.requests += 1
+            rule = next((rule for rule in self.rules if rule.matches(method, path)), None)
+            if rule is None:
+                return None, 'forward', 0.0
+            seen, rule.seen = rule.seen, rule.seen + 1
+            fault, rng = rule.fault, self._rng
+            delay = rule.latency(rng) if rule.latency else 0.0
+            if fault.burst and seen % max(fault.burst_every, fault.burst) < fault.burst:
+                action = 'error'
+            elif fault.error_rate and rng.random() < fault.error_rate:
+                action = 'error'
+            elif fault.reset and rng.random() < fault.reset:
+                action = 'reset'
+            elif fault.partial and rng.random() < fault.partial:
+                action = 'partial'
+            else:
+                action = 'forward'
+            if action != 'forward':
+                self.injected[action] += 1
+            if delay:
+                self.injected['delayed'] += 1
+            return fault, action, delay
+
+    def forward(self, method, path, headers, body):
+        """``(status, headers, body bytes)`` from upstream, or a 502 if it cannot be reached."""
+        headers = {k: v for k, v in headers.items() if k.lower() not in ('host', 'connection', 'accept-encoding')}
+        try:
+            response = self.session.request(method, self.upstream + path, headers=headers, data=body or None,
+                                            timeout=self.timeout, allow_redirects=False)
+        except requests.RequestException as exc:
+            payload = {'error': {'type': 'api_error', 'message': f'Fault proxy could not reach upstream: {exc}'}}
+            return 502, {'Content-Type': 'application/json'}, json.dumps(payload).encode()
+        kept = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+        return response.status_code, kept, response.content
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, **self.injected}
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}{self.prefix}'
+
+    def start(self):
+        """Serve the proxy on a daemon thread and return its base URL."""
+        proxy = self
+
+        class Handler(_ProxyHandler):
+            app = proxy
+
+        self._server = _ProxyServer((self.host, self.port), Handler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,),
+                                        name='stripe-fault-proxy', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.session.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _ProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-answer; under fault injection that is expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    app = None
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        fault, action, delay = self.app.plan(self.command, urlsplit(self.path).path)
+        if delay:
+            time.sleep(delay)
+        if action == 'error':
+            headers = {'Content-Type': 'application/json'}
+            if fault.retry_after is not None:
+                headers['Retry-After'] = f'{fault.retry_after:g}'
+            status, data = fault.status, json.dumps(_error_body(fault.status)).encode()
+        else:
+            status, headers, data = self.app.forward(self.command, self.path, dict(self.headers), body)
+        if action == 'reset':
+            self._reset()
+            return
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        if 'Request-Id' not in headers:
+            self.send_header('Request-Id', make_id('req_', 14))
+        self.end_headers()
+        self._write(data[:len(data) // 2] if action == 'partial' else data, fault)
+        if action == 'partial':
+            self._reset()
+
+    def _write(self, data, fault):
+        if fault is not None and fault.slowloris:
+            size = max(1, math.ceil(len(data) / SLOWLORIS_CHUNKS))
+            for start in range(0, len(data), size):
+                time.sleep(fault.slowloris)
+                self.wfile.write(data[start:start + size])
+        elif fault is not None and fault.bandwidth:
+            size = max(1, int(fault.bandwidth * BANDWIDTH_SLICE))
+            for start in range(0, len(data), size):
+                chunk = data[start:start + size]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / fault.bandwidth)
+        else:
+            self.wfile.write(data)
+
+    def _reset(self):
+        # SO_LINGER with a zero timeout makes close() send RST instead of FIN
+        self.wfile.flush()
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        self.connection.close()
+        self.close_connection = True
+
+    do_GET = do_POST = do_DELETE = _dispatch
+
+    def log_message(self, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a fault-injecting proxy in front of a Stripe API.')
+    parser.add_argument('--upstream', default=os.getenv('BASE_URL', 'https://api.stripe.com/v1'),
+                        help='Base URL requests are forwarded to (defaults to BASE_URL).')
+    parser.add_argument('--faults', default='{}',
+                        help='JSON file or inline JSON mapping "METHOD /path" globs to Fault fields.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12112)
+    args = parser.parse_args(argv)
+    proxy = FaultProxy(args.upstream, load_faults(args.faults), seed=args.seed, host=args.host, port=args.port)
+    proxy.start()
+    print(f'Fault proxy listening; export BASE_URL={proxy.base_url}')
+    try:
+        proxy._thread.join()
+    except KeyboardInterrupt:
+        proxy.stop()
+        print(proxy.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+# Multi-step API flows as a DAG: concurrent branches, IDs passed between steps, reverse-order cleanup (pytest plugin)
+import asyncio
+import time
+from typing import NamedTuple
+
+import pytest
+
+flows_key = pytest.StashKey[list]()
+
+
+class Step:
+    """One node of a flow: ``run(client, results)`` and an optional ``cleanup(client, result)``."""
+
+    __slots__ = ('name', 'run', 'after', 'cleanup')
+
+    def __init__(self, name, run, after, cleanup):
+        self.name = name
+        self.run = run
+        self.after = after
+        self.cleanup = cleanup
+
+
+class StepTiming(NamedTuple):
+    """When a step ran, in seconds since the flow started."""
+
+    start: float
+    end: float
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class FlowResult:
+    """What each step of a flow returned, when it ran, and the flow's critical path."""
+
+    def __init__(self, flow, results, timings, elapsed, cleanup_elapsed):
+        self.flow = flow
+        self.results = results
+        self.timings = timings
+        self.elapsed = elapsed # wall clock from the first step starting to the last one finishing
+        self.cleanup_elapsed = cleanup_elapsed
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    @property
+    def work(self):
+        """Seconds spent in steps, summed; what a serial script would take."""
+        return sum(timing.duration for timing in self.timings.values())
+
+    @property
+    def critical_path(self):
+        """Step names on the longest chain of dependent steps, by measured duration."""
+        finish, previous = {}, {}
+        for step in self.flow.steps.values():
+            before = max(step.after, key=finish.get, default=None)
+            finish[step.name] = self.timings[step.name].duration + (finish[before] if before else 0.0)
+            previous[step.name] = before
+        path, name = [], max(finish, key=finish.get, default=None)
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1]
+
+    @property
+    def critical_latency(self):
+        """The flow's floor: no amount of concurrency finishes it faster than this."""
+        return sum(self.timings[name].duration for name in self.critical_path)
+
+    @property
+    def parallelism(self):
+        return self.work / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (f"FlowResult({self.flow.name!r}, {len(self.timings)} steps, {self.elapsed * 1000:.1f}ms wall, "
+                f"{self.work * 1000:.1f}ms work, critical path {self.critical_latency * 1000:.1f}ms over "
+                f"{len(self.critical_path)} round trips: {' -> '.join(self.critical_path)})")
+
+
+class Flow:
+    """A named DAG of API steps.
+
+    ``step()`` adds a step that runs once every step named in ``after`` has
+    finished; steps can only depend on steps declared before them, so a flow
+    can never contain a cycle. ``run(client, results)`` gets the results of
+    every step finished so far (IDs for later calls). ``run()`` starts each
+    step as soon as it may, so independent branches overlap. When the flow
+    ends, or the first step fails, the ``cleanup`` of every completed step
+    runs in reverse dependency order: a step is cleaned up only after
+    everything that depended on it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = {}
+
+    def step(self, name, run, after=(), cleanup=None):
+        if name in self.steps:
+            raise ValueError(f'Duplicate step {name!r} in flow {self.name!r}')
+        after = (after,) if isinstance(after, str) else tuple(after)
+        unknown = [dependency for dependency in after if dependency not in self.steps]
+        if unknown:
+            raise ValueError(f'Step {name!r} depends on undeclared step(s) {", ".join(unknown)}')
+        self.steps[name] = Step(name, run, after, cleanup)
+        return self
+
+    async def run(self, client):
+        """Run every step against ``client`` and return a ``FlowResult``; re-raises the first failure."""
+        results, timings, tasks = {}, {}, {}
+        origin = time.perf_counter()
+
+        async def one(step):
+            if step.after:
+                await asyncio.gather(*(tasks[name] for name in step.after))
+            start = time.perf_counter()
+            results[step.name] = await step.run(client, results)
+            timings[step.name] = StepTiming(start - origin, time.perf_counter() - origin)
+
+        failure = None
+        try:
+            # A TaskGroup cancels the remaining steps as soon as one fails
+            async with asyncio.TaskGroup() as group:
+                for step in self.steps.values():
+                    tasks[step.name] = group.create_task(one(step))
+        except ExceptionGroup as errors:
+            failure = errors.exceptions[0]
+        elapsed = time.perf_counter() - origin
+        cleanup_start = time.perf_counter()
+        cleanup_errors = await self._cleanup(client, results)
+        if failure is not None:
+            raise failure
+        if cleanup_errors:
+            raise cleanup_errors[0]
+        return FlowResult(self, results, timings, elapsed, time.perf_counter() - cleanup_start)
+
+    async def _cleanup(self, client, results):
+        dependents = {name: [] for name in self.steps}
+        for step in self.steps.values():
+            for dependency in step.after:
+                dependents[dependency].append(step.name)
+        tasks = {}
+
+        async def undo(step):
+            await asyncio.gather(*(tasks[name] for name in dependents[step.name]), return_exceptions=True)
+            if step.cleanup is not None and step.name in results:
+                await step.cleanup(client, results[step.name])
+
+        for step in reversed(self.steps.values()):
+            tasks[step.name] = asyncio.create_task(undo(step))
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+
+
+# --- Stripe steps for AsyncStripeClient ---
+
+def _body(response):
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def create_customer(**data):
+    async def run(client, results):
+        return _body(await client.post('/customers', data=data))
+    return run
+
+
+def attach_card(customer, token='tok_visa'):
+    async def run(client, results):
+        return _body(await client.post(f"/customers/{results[customer]['id']}/sources", data={'source': token}))
+    return run
+
+
+def charge(customer, card, amount, currency='usd'):
+    async def run(client, results):
+        return _body(await client.post('/charges', data={
+            'amount': amount, 'currency': currency,
+            'customer': results[customer]['id'], 'source': results[card]['id'],
+        }))
+    return run
+
+
+def refund(charge_step, amount=None):
+    async def run(client, results):
+        data = {'charge': results[charge_step]['id']}
+        if amount is not None:
+            data['amount'] = amount
+        return _body(await client.post('/refunds', data=data))
+    return run
+
+
+async def delete_customer(client, customer):
+    response = await client.delete(f"/customers/{customer['id']}")
+    assert response.status_code in (200, 404), response.text
+
+
+def customer_flow(cards=2, charges_per_card=2, refund_amount=None, base_amount=1000, name='customer flow'):
+    """A customer with ``cards`` cards, ``charges_per_card`` charges on each and a refund of every charge.
+
+    Cards, and each card's charges, run concurrently; deleting the customer at
+    the end also deletes its cards. Steps are named ``card{i}``,
+    ``charge{i}.{j}`` and ``refund{i}.{j}``.
+    """
+    flow = Flow(name).step('customer', create_customer(email='flow@example.com', description=name),
+                           cleanup=delete_customer)
+    for i in range(cards):
+        flow.step(f'card{i}', attach_card('customer'), after='customer')
+        for j in range(charges_per_card):
+            flow.step(f'charge{i}.{j}', charge('customer', f'card{i}', base_amount + 100 * i + j), after=f'card{i}')
+            flow.step(f'refund{i}.{j}', refund(f'charge{i}.{j}', refund_amount), after=f'charge{i}.{j}')
+    return flow
+
+
+class FlowRunner:
+    """Runs flows and records their results for the terminal summary."""
+
+    def __init__(self, config, nodeid):
+        self._results = config.stash.setdefault(flows_key, [])
+        self.nodeid = nodeid
+
+    async def run(self, flow, client):
+        result = await flow.run(client)
+        self._results.append((self.nodeid, result))
+        return result
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(flows_key, None)
+    if not results:
+        return
+    terminalreporter.write_sep("-", "stripe flows (critical path vs total work)")
+    terminalreporter.write_line(
+        f"{'flow':<28} {'steps':>5} {'wall':>9} {'work':>9} {'critical':>9} {'trips':>5} {'overlap':>7}")
+    for _, result in results:
+        terminalreporter.write_line(
+            f"{result.flow.name:<28} {len(result.timings):>5} {result.elapsed * 1000:>7.1f}ms "
+            f"{result.work * 1000:>7.1f}ms {result.critical_latency * 1000:>7.1f}ms "
+            f"{len(result.critical_path):>5} {result.parallelism:>6.1f}x")
+
+@pytest.fixture
+def flow_runner(request):
+    """Run a ``Flow`` and report its critical path in the terminal summary."""
+    return FlowRunner(request.config, request.node.nodeid)
@@ -0,0 +1,265 @@
+# Benchmark and load-test history in SQLite, with regression checks against recent runs (pytest plugin)
+import math
+import os
+import sqlite3
+import subprocess
+import time
+from typing import NamedTuple
+
+import pytest
+
+from harness.cleanup import tracker_key
+from harness.load import results_key
+from harness.settings import profile_for
+
+MIN_SAMPLES = 10 # fewer on either side and no verdict is given
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    commit_sha TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    test TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    kind TEXT NOT NULL, -- 'benchmark' or 'load'
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    result_id INTEGER NOT NULL REFERENCES results(id),
+    seconds REAL NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_series ON results (test, endpoint, environment, id);
+CREATE INDEX IF NOT EXISTS samples_result ON samples (result_id);
+"""
+
+history_key = pytest.StashKey[object]()
+report_key = pytest.StashKey[list]()
+
+
+class Comparison(NamedTuple):
+    """One series of this run against its baseline; ``regressed`` only on a significant slowdown."""
+
+    test: str
+    endpoint: str
+    baseline_runs: int
+    baseline_p50: float
+    p50: float
+    p_value: float
+    regressed: bool
+
+    @property
+    def change(self):
+        return self.p50 / self.baseline_p50 - 1 if self.baseline_p50 else 0.0
+
+
+def weighted_median(samples):
+    """Median of ``(value, count)`` pairs."""
+    ordered = sorted(samples)
+    half = sum(count for _, count in ordered) / 2
+    seen = 0
+    for value, count in ordered:
+        seen += count
+        if seen >= half:
+            return value
+    return 0.0
+
+
+def mann_whitney_greater(current, baseline):
+    """One-sided Mann-Whitney U p-value that ``current`` tends to be larger than ``baseline``.
+
+    Both sides are ``(value, count)`` pairs, so histogram buckets need not be
+    expanded. Uses the normal approximation with tie correction and continuity
+    correction, which is sound from about ten samples a side.
+    """
+    counts = {}
+    for side, samples in ((0, current), (1, baseline)):
+        for value, count in samples:
+            pair = counts.setdefault(value, [0, 0])
+            pair[side] += count
+    n1 = sum(count for _, count in current)
+    n2 = sum(count for _, count in baseline)
+    total = n1 + n2
+    if not n1 or not n2:
+        return 1.0
+    rank_sum, ties, below = 0.0, 0, 0
+    for value in sorted(counts):
+        in_current, in_baseline = counts[value]
+        tied = in_current + in_baseline
+        rank_sum += in_current * (below + (tied + 1) / 2) # every tied sample gets the average rank
+        ties += tied ** 3 - tied
+        below += tied
+    u = rank_sum - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(current, baseline, alpha=0.01, threshold=0.1):
+    """``(p_value, regressed)`` for two sample sets.
+
+    A regression needs both a significant shift (``p < alpha``) and a median
+    at least ``threshold`` slower, so neither one slow outlier nor a tiny but
+    consistent drift fails the run.
+    """
+    if sum(count for _, count in current) < MIN_SAMPLES or sum(count for _, count in baseline) < MIN_SAMPLES:
+        return 1.0, False
+    p_value = mann_whitney_greater(current, baseline)
+    slower = weighted_median(current) >= weighted_median(baseline) * (1 + threshold)
+    return p_value, p_value < alpha and slower
+
+
+def histogram_samples(histogram):
+    """``(seconds, count)`` per bucket of a ``LatencyHistogram``."""
+    return [(min(histogram._highest_equivalent(index), histogram.max) / 1_000_000, count)
+            for index, count in sorted(histogram.counts.items())]
+
+
+def current_commit():
+    """The commit under test: ``GITHUB_SHA`` on CI, else ``git rev-parse HEAD``."""
+    if os.getenv('GITHUB_SHA'):
+        return os.environ['GITHUB_SHA']
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class History:
+    """Append-only store of latency samples keyed by run, commit, environment, test and endpoint.
+
+    Rows are only ever inserted, so several xdist workers can write to the same
+    file; the baseline of a series is its last ``runs`` runs in that environment.
+    """
+
+    def __init__(self, path, environment, commit=None):
+        self.path = path
+        self.environment = environment
+        self.commit = commit or current_commit()
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def record(self, run_id, test, endpoint, kind, samples, created=None):
+        """Store one result; ``samples`` are ``(seconds, count)`` pairs."""
+        with self._db:
+            cursor = self._db.execute(
+                'INSERT INTO results (run_id, commit_sha, environment, test, endpoint, kind, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (run_id, self.commit, self.environment, test, endpoint, kind, created or time.time()))
+            self._db.executemany('INSERT INTO samples (result_id, seconds, count) VALUES (?, ?, ?)',
+                                 [(cursor.lastrowid, seconds, count) for seconds, count in samples])
+
+    def _samples(self, result_ids):
+        if not result_ids:
+            return []
+        marks = ', '.join('?' * len(result_ids))
+        return self._db.execute(f'SELECT seconds, SUM(count) FROM samples WHERE result_id IN ({marks}) '
+                                'GROUP BY seconds', result_ids).fetchall()
+
+    def series(self, run_id):
+        """``(test, endpoint)`` of every result stored for ``run_id`` in this environment."""
+        return self._db.execute('SELECT DISTINCT test, endpoint FROM results WHERE run_id = ? AND environment = ? '
+                                'ORDER BY test, endpoint', (run_id, self.environment)).fetchall()
+
+    def samples(self, run_id, test, endpoint):
+        ids = [row[0] for row in self._db.execute(
+            'SELECT id FROM results WHERE run_id = ? AND environment = ? AND test = ? AND endpoint = ?',
+            (run_id, self.environment, test, endpoint))]
+        return self._samples(ids)
+
+    def baseline(self, run_id, test, endpoint, runs=5):
+        """``(run count, pooled samples)`` of the last ``runs`` other runs of a series."""
+        recent = [row[0] for row in self._db.execute(
+            'SELECT run_id FROM results WHERE environment = ? AND test = ? AND endpoint = ? AND run_id != ? '
+            'GROUP BY run_id ORDER BY MAX(id) DESC LIMIT ?', (self.environment, test, endpoint, run_id, runs))]
+        if not recent:
+            return 0, []
+        marks = ', '.join('?' * len(recent))
+        ids = [row[0] for row in self._db.execute(
+            f'SELECT id FROM results WHERE environment = ? AND test = ? AND endpoint = ? AND run_id IN ({marks})',
+            (self.environment, test, endpoint, *recent))]
+        return len(recent), self._samples(ids)
+
+    def evaluate(self, run_id, runs=5, alpha=0.01, threshold=0.1):
+        """A ``Comparison`` for every series of ``run_id`` that has a baseline."""
+        report = []
+        for test, endpoint in self.series(run_id):
+            baseline_runs, baseline = self.baseline(run_id, test, endpoint, runs)
+            if not baseline_runs:
+                continue
+            current = self.samples(run_id, test, endpoint)
+            p_value, regressed = compare(current, baseline, alpha, threshold)
+            report.append(Comparison(test, endpoint, baseline_runs, weighted_median(baseline),
+                                     weighted_median(current), p_value, regressed))
+        return report
+
+
+def _benchmarks(config):
+    """``(test, endpoint, samples)`` of every pytest-benchmark result that ran."""
+    session = getattr(config, '_benchmarksession', None)
+    for bench in getattr(session, 'benchmarks', ()):
+        data = getattr(bench.stats, 'data', None)
+        if data:
+            yield bench.fullname, bench.group or bench.name, [(seconds, 1) for seconds in data]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-history", metavar="PATH", default=None,
+                    help="Append benchmark and load results to this SQLite file and check them for regressions.")
+    group.addoption("--stripe-history-env", default=None,
+                    help="Environment the results are filed under (default: the settings profile).")
+    group.addoption("--stripe-history-runs", type=int, default=5,
+                    help="Previous runs pooled into the baseline of each endpoint.")
+    group.addoption("--stripe-regression-alpha", type=float, default=0.01,
+                    help="Mann-Whitney p-value below which a slowdown counts as significant.")
+    group.addoption("--stripe-regression-threshold", type=float, default=0.1,
+                    help="Relative median slowdown a significant shift must reach to fail the run.")
+
+def pytest_configure(config):
+    path = config.getoption("stripe_history")
+    if path:
+        config.stash[history_key] = History(path, config.getoption("stripe_history_env") or profile_for(config))
+
+def pytest_sessionfinish(session):
+    config = session.config
+    history = config.stash.get(history_key, None)
+    if history is None:
+        return
+    run_id = config.stash[tracker_key].run_id
+    for nodeid, result in config.stash.get(results_key, []):
+        history.record(run_id, nodeid, result.name, 'load', histogram_samples(result.histogram))
+    for test, endpoint, samples in _benchmarks(config):
+        history.record(run_id, test, endpoint, 'benchmark', samples)
+    # the controller judges the whole run once every worker has written its part
+    if not hasattr(config, "workerinput"):
+        report = history.evaluate(run_id, config.getoption("stripe_history_runs"),
+                                  config.getoption("stripe_regression_alpha"),
+                                  config.getoption("stripe_regression_threshold"))
+        config.stash[report_key] = report
+        if any(row.regressed for row in report) and session.exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+    history.close()
+
+def pytest_terminal_summary(terminalreporter, config):
+    report = config.stash.get(report_key, None)
+    if not report:
+        return
+    terminalreporter.write_sep("-", f"stripe benchmark history ({config.getoption('stripe_history')})")
+    terminalreporter.write_line(
+        f"{'endpoint':<44} {'runs':>4} {'base p50':>10} {'p50':>10} {'change':>8} {'p-value':>8}")
+    for row in report:
+        terminalreporter.write_line(
+            f"{row.endpoint:<44} {row.baseline_runs:>4} {row.baseline_p50 * 1000:>8.2f}ms "
+            f"{row.p50 * 1000:>8.2f}ms {row.change:>+8.1%} {row.p_value:>8.4f}"
+            + ("  REGRESSION" if row.regressed else ""))
+    regressed = [row for row in report if row.regressed]
+    if regressed:
+        terminalreporter.write_line(f"{len(regressed)} significant slowdown(s): "
+                                    + ", ".join(f"{row.test} [{row.endpoint}]" for row in regressed), red=True)
@@ -0,0 +1,211 @@
+# Load generation with HDR-style latency histograms (pytest plugin)
+import asyncio
+import math
+from collections import Counter
+
+import pytest
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+results_key = pytest.StashKey[list]()
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram in the style of HdrHistogram.
+
+    Values are recorded in whole microseconds. Below ``2**bits`` every value has
+    its own bucket; above it each power of two is split into ``2**(bits-1)``
+    buckets, so the relative error stays under ``2**-(bits-1)`` (0.4% for the
+    default 9 bits) while memory grows only with the number of distinct buckets.
+    """
+
+    def __init__(self, bits=9):
+        self.bits = bits
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.bits)
+        return (shift << self.bits) + (value >> shift)
+
+    def _highest_equivalent(self, index):
+        shift, mantissa = index >> self.bits, index & ((1 << self.bits) - 1)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1_000_000))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Latency in seconds at or below which ``percent`` of samples fall."""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    @property
+    def mean(self):
+        return self.total / self.count / 1_000_000 if self.count else 0.0
+
+
+class LoadResult:
+    """Outcome of one load run: latency histogram, status counts and throughput."""
+
+    def __init__(self, name, mode, concurrency, rate, histogram, statuses, errors, elapsed):
+        self.name = name
+        self.mode = mode
+        self.concurrency = concurrency
+        self.rate = rate
+        self.histogram = histogram
+        self.statuses = statuses
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def requests(self):
+        return self.histogram.count
+
+    @property
+    def rps(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0.0
+
+    def percentile(self, percent):
+        return self.histogram.percentile(percent)
+
+    def summary(self):
+        row = {
+            'name': self.name, 'mode': self.mode, 'concurrency': self.concurrency,
+            'requests': self.requests, 'rps': self.rps, 'error_rate': self.error_rate,
+        }
+        row.update({f'p{p:g}': self.percentile(p) for p in PERCENTILES})
+        return row
+
+    def __repr__(self):
+        return (f"LoadResult({self.name!r}, {self.requests} requests, {self.rps:.1f} req/s, "
+                f"p50={self.percentile(50) * 1000:.1f}ms, p99={self.percentile(99) * 1000:.1f}ms, "
+                f"errors={self.error_rate:.1%})")
+
+
+async def run_load(send, duration, concurrency=10, rate=None, ok=lambda status: status < 400, name=''):
+    """Drive ``send()`` (a coroutine factory returning a response) for ``duration`` seconds.
+
+    Closed loop (``rate=None``): ``concurrency`` workers each send the next
+    request as soon as the previous one answers. Open loop: requests are due at
+    a fixed ``rate`` per second whatever the server does, with at most
+    ``concurrency`` in flight; latency is measured from when a request was due,
+    not when it was sent, so queueing behind a slow server is not hidden.
+    """
+    loop = asyncio.get_running_loop()
+    histogram = LatencyHistogram()
+    statuses = Counter()
+    errors = 0
+
+    async def one(due):
+        nonlocal errors
+        try:
+            response = await send()
+        except Exception as exc:
+            statuses[type(exc).__name__] += 1
+            errors += 1
+        else:
+            statuses[response.status_code] += 1
+            errors += not ok(response.status_code)
+        histogram.record(loop.time() - due)
+
+    start = loop.time()
+    deadline = start + duration
+    if rate is None:
+        async def worker():
+            while loop.time() < deadline:
+                await one(loop.time())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    else:
+        gate = asyncio.Semaphore(concurrency)
+
+        async def gated(due):
+            async with gate:
+                await one(due)
+
+        tasks = []
+        for tick in range(int(duration * rate)):
+            due = start + tick / rate
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(gated(due)))
+        await asyncio.gather(*tasks)
+    return LoadResult(name, 'closed' if rate is None else 'open', concurrency, rate,
+                      histogram, statuses, errors, loop.time() - start)
+
+
+class LoadRunner:
+    """Runs loads with the --load-* settings and records them for the summary."""
+
+    def __init__(self, config, nodeid):
+        self.duration = config.getoption("load_duration")
+        self.concurrency = config.getoption("load_concurrency")
+        self.rate = config.getoption("load_rate") or None
+        self._results = config.stash.setdefault(results_key, [])
+        self.nodeid = nodeid
+
+    async def run(self, name, send, **overrides):
+        settings = {'duration': self.duration, 'concurrency': self.concurrency, 'rate': self.rate}
+        settings.update(overrides)
+        result = await run_load(send, name=name, **settings)
+        self._results.append((self.nodeid, result))
+        print(f"\n{result!r}")
+        return result
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--load-duration", type=float, default=3.0,
+                    help="Seconds each load test drives its endpoint.")
+    group.addoption("--load-concurrency", type=int, default=4,
+                    help="Requests in flight at once during a load test.")
+    group.addoption("--load-rate", type=float, default=0,
+                    help="Open-loop arrival rate in req/s (0 runs closed-loop).")
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(results_key, None)
+    if not results:
+        return
+    terminalreporter.write_sep("-", "load test results")
+    terminalreporter.write_line(
+        f"{'endpoint':<24} {'mode':<6} {'conc':>4} {'reqs':>6} {'rps':>8} {'err':>6} "
+        + " ".join(f"{'p%g' % p:>8}" for p in PERCENTILES))
+    for _, result in results:
+        terminalreporter.write_line(
+            f"{result.name:<24} {result.mode:<6} {result.concurrency:>4} {result.requests:>6} "
+            f"{result.rps:>8.1f} {result.error_rate:>6.1%} "
+            + " ".join(f"{result.percentile(p) * 1000:>6.1f}ms" for p in PERCENTILES))
+
+@pytest.fixture
+def load_runner(request):
+    """Drive an endpoint under load; see --load-duration/--load-concurrency/--load-rate."""
+    return LoadRunner(request.config, request.node.nodeid)
@@ -0,0 +1,235 @@
+# Declarative Customers/Cards/Charges spec compiled into a requests_mock matcher (pytest plugin)
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+import requests_mock
+
+from harness.client import DEFAULT_BASE_URL, join_url
+
+MOCK_BASE_URL = DEFAULT_BASE_URL # mocked requests never leave the process, whatever BASE_URL says
+
+# Object bodies. A string value '{name}' is filled from the path parameter of that name.
+OBJECTS = {
+    'customer': {
+        'id': '{customer}', 'object': 'customer', 'created': 1700000000, 'livemode': False,
+        'email': None, 'name': None, 'description': None, 'default_source': None, 'metadata': {},
+    },
+    'card': {
+        'id': '{card}', 'object': 'card', 'customer': '{customer}', 'brand': 'Visa', 'last4': '4242',
+        'exp_month': 12, 'exp_year': 2030, 'funding': 'credit', 'country': 'US', 'name': None,
+        'address_zip': None, 'cvc_check': 'pass', 'metadata': {},
+    },
+    'charge': {
+        'id': '{charge}', 'object': 'charge', 'created': 1700000000, 'livemode': False, 'amount': 1000,
+        'currency': 'usd', 'customer': None, 'description': None, 'paid': True, 'captured': True,
+        'status': 'succeeded', 'failure_code': None, 'failure_message': None, 'metadata': {},
+    },
+}
+
+# IDs used when the path does not name the object (creates and lists)
+DEFAULT_IDS = {'customer': 'cus_mock_test_123', 'card': 'card_mock_visa_1234', 'charge': 'ch_mock_test_123'}
+
+# route name -> (method, path, object, kind); kind is 'object', 'list' or 'deleted'
+ROUTES = {
+    'customers.create': ('POST', '/customers', 'customer', 'object'),
+    'customers.list': ('GET', '/customers', 'customer', 'list'),
+    'customers.retrieve': ('GET', '/customers/{customer}', 'customer', 'object'),
+    'customers.update': ('POST', '/customers/{customer}', 'customer', 'object'),
+    'customers.delete': ('DELETE', '/customers/{customer}', 'customer', 'deleted'),
+    'cards.create': ('POST', '/customers/{customer}/sources', 'card', 'object'),
+    'cards.list': ('GET', '/customers/{customer}/sources', 'card', 'list'),
+    'cards.retrieve': ('GET', '/customers/{customer}/sources/{card}', 'card', 'object'),
+    'cards.update': ('POST', '/customers/{customer}/sources/{card}', 'card', 'object'),
+    'cards.delete': ('DELETE', '/customers/{customer}/sources/{card}', 'card', 'deleted'),
+    'charges.create': ('POST', '/charges', 'charge', 'object'),
+    'charges.list': ('GET', '/charges', 'charge', 'list'),
+    'charges.retrieve': ('GET', '/charges/{charge}', 'charge', 'object'),
+}
+
+# error variant -> (status, error body); '{id}' is the object the request names
+ERRORS = {
+    'resource_missing': (404, {'type': 'invalid_request_error', 'code': 'resource_missing', 'param': 'id',
+                               'message': 'No such {object}: {id}'}),
+    'parameter_invalid_string': (400, {'type': 'invalid_request_error', 'code': 'parameter_invalid_string',
+                                       'param': 'email', 'message': 'Invalid email address.'}),
+    'parameter_invalid_integer': (400, {'type': 'invalid_request_error', 'code': 'parameter_invalid_integer',
+                                        'param': 'amount', 'message': 'Invalid integer: {amount}'}),
+    'token_invalid': (400, {'type': 'invalid_request_error', 'code': 'resource_missing', 'param': 'source',
+                            'message': 'No such token: {source}'}),
+    'card_declined': (402, {'type': 'card_error', 'code': 'card_declined', 'decline_code': 'generic_decline',
+                            'message': 'Your card was declined.'}),
+    'expired_card': (402, {'type': 'card_error', 'code': 'expired_card', 'param': 'exp_month',
+                           'message': 'Your card has expired.'}),
+    'incorrect_cvc': (402, {'type': 'card_error', 'code': 'incorrect_cvc', 'param': 'cvc',
+                            'message': "Your card's security code is incorrect."}),
+    'authentication_required': (401, {'type': 'invalid_request_error',
+                                      'message': 'Invalid API Key provided: {api_key}'}),
+    'rate_limit': (429, {'type': 'invalid_request_error', 'code': 'rate_limit',
+                         'message': 'Too many requests hit the API too quickly.'}),
+    'api_error': (500, {'type': 'api_error', 'message': 'An unknown error occurred.'}),
+}
+
+_KEEP = object() # placeholder for "use the route's default response"
+
+
+class _Fields(dict):
+    """Format mapping that leaves unknown ``{names}`` in place."""
+
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+class Route:
+    """One compiled spec route: its path segments, body template and filled fields."""
+
+    __slots__ = ('name', 'method', 'segments', 'object', 'kind', 'template', 'placeholders', 'echo')
+
+    def __init__(self, name, method, path, obj, kind):
+        self.name = name
+        self.method = method
+        self.segments = tuple(path.strip('/').split('/'))
+        self.object = obj
+        self.kind = kind
+        self.template = OBJECTS[obj]
+        self.placeholders = tuple((field, value[1:-1]) for field, value in self.template.items()
+                                  if isinstance(value, str) and value.startswith('{') and value.endswith('}'))
+        # Scalar form fields a create/update sends back, as Stripe does
+        filled = {'id', 'object'} | {field for field, _ in self.placeholders}
+        self.echo = frozenset(field for field, value in self.template.items()
+                              if field not in filled and type(value) in (str, int, type(None)))
+
+    def match(self, segments):
+        """Path parameters if ``segments`` fit this route, else ``None``."""
+        params = {}
+        for expected, actual in zip(self.segments, segments):
+            if expected[0] == '{':
+                params[expected[1:-1]] = actual
+            elif expected != actual:
+                return None
+        return params
+
+    def render(self, params, form=None, overrides=None):
+        body = dict(self.template)
+        for field, name in self.placeholders:
+            body[field] = params.get(name) or DEFAULT_IDS.get(name)
+        if self.kind == 'deleted':
+            return {'id': body['id'], 'object': self.object, 'deleted': True}
+        if form:
+            for field, value in form:
+                if field in self.echo:
+                    template = self.template[field]
+                    body[field] = int(value) if type(template) is int and value.lstrip('-').isdigit() else value
+        if self.kind == 'list': # overrides apply to the list itself, e.g. {'data': [...]}
+            path = '/v1/' + '/'.join(params.get(s[1:-1], s) if s[0] == '{' else s for s in self.segments)
+            body = {'object': 'list', 'data': [body], 'has_more': False, 'url': path}
+        if overrides:
+            body.update(overrides)
+        return body
+
+
+class RouteTable:
+    """Spec routes compiled once, looked up by method and segment count."""
+
+    def __init__(self, base_url=MOCK_BASE_URL, routes=ROUTES):
+        parts = urlsplit(base_url)
+        self.base_url = base_url.rstrip('/')
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/') + '/'
+        self.routes = {name: Route(name, *spec) for name, spec in routes.items()}
+        self._index = {}
+        for route in self.routes.values():
+            self._index.setdefault((route.method, len(route.segments)), []).append(route)
+
+    def lookup(self, method, url):
+        """``(route, params)`` for a request, or ``(None, None)`` if no route matches."""
+        parts = urlsplit(url)
+        if parts.netloc != self.netloc or not parts.path.startswith(self.prefix):
+            return None, None
+        segments = parts.path[len(self.prefix):].strip('/').split('/')
+        for route in self._index.get((method, len(segments)), ()):
+            params = route.match(segments)
+            if params is not None:
+                return route, params
+        return None, None
+
+    def url(self, name, **params):
+        """The full URL of route ``name`` with its path parameters filled in."""
+        route = self.routes[name]
+        path = '/'.join(str(params[s[1:-1]]) if s[0] == '{' else s for s in route.segments)
+        return join_url(self.base_url, path)
+
+
+class StripeMock:
+    """requests_mock matcher serving every spec route, with per-test stubs.
+
+    Unstubbed routes answer 200 with the object the path names (form fields of
+    creates and updates echoed back). ``stub()`` swaps in a status, body
+    fields, an error variant or an exception for one route; passing several
+    responses serves them in turn and then repeats the last. Registering a
+    stub is a dict assignment, so parametrized scenarios cost next to nothing.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.calls = {}
+        self._stubs = {}
+
+    def stub(self, name, *responses, status=None, body=None, error=None, exc=None, headers=None):
+        if name not in self.table.routes:
+            raise KeyError(f'Unknown route {name!r}')
+        if not responses:
+            responses = ({'status': status, 'body': body, 'error': error, 'exc': exc, 'headers': headers},)
+        for response in responses:
+            if response.get('error') is not None and response['error'] not in ERRORS:
+                raise KeyError(f"Unknown error variant {response['error']!r}")
+        self._stubs[name] = [list(responses), 0]
+
+    def url(self, name, **params):
+        return self.table.url(name, **params)
+
+    def reset(self):
+        """Drop every stub and call count."""
+        self.calls.clear()
+        self._stubs.clear()
+
+    def __call__(self, request):
+        route, params = self.table.lookup(request.method, request.url)
+        if route is None:
+            return None
+        self.calls[route.name] = self.calls.get(route.name, 0) + 1
+        stub = self._stubs.get(route.name)
+        response = _KEEP
+        if stub is not None:
+            responses, served = stub
+            response = responses[min(served, len(responses) - 1)]
+            stub[1] = served + 1
+        form = parse_qsl(request.text) if request.method == 'POST' and request.text else None
+        if response is _KEEP:
+            return requests_mock.create_response(request, status_code=200, json=route.render(params, form))
+        if response.get('exc') is not None:
+            raise response['exc']
+        status = response.get('status')
+        if response.get('error') is not None:
+            default_status, error = ERRORS[response['error']]
+            fields = _Fields(form or (), object=route.object, id=params.get(route.object, ''),
+                             api_key=request.headers.get('Authorization', '').removeprefix('Bearer '))
+            body = {'error': {**error, 'message': error['message'].format_map(fields)}}
+            if response.get('body'):
+                body['error'].update(response['body'])
+        else:
+            default_status, body = 200, route.render(params, form, response.get('body'))
+        return requests_mock.create_response(request, status_code=status or default_status, json=body,
+                                             headers=response.get('headers') or {})
+
+
+@pytest.fixture(scope="session")
+def stripe_mock_routes():
+    """The spec compiled into a route table once per session."""
+    return RouteTable()
+
+@pytest.fixture
+def stripe_mock(requests_mock, stripe_mock_routes):
+    """A spec-driven Stripe mock for this test, on top of the ``requests_mock`` fixture."""
+    mock = StripeMock(stripe_mock_routes)
+    requests_mock.add_matcher(mock)
+    return mock
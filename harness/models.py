@@ -0,0 +1,194 @@
+# Fast JSON decoding and lazy, read-only views over Stripe API objects
+import json
+from collections.abc import Mapping, Sequence
+
+import requests
+
+try:
+    import orjson
+except ImportError: # optional speed-up; the stdlib decoder gives the same values
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def loads(content):
+    """Decode a JSON body (``bytes`` or ``str``) with the fastest available backend."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class StripeObject(Mapping):
+    """Read-only view over one decoded Stripe object.
+
+    Reads like the dict it wraps (``body['id']``, ``body.get('email')``,
+    ``'data' in body``, ``body == {...}``) and also by attribute
+    (``charge.source.last4``). Nested objects and lists are wrapped only when
+    first read, and each view holds just the dict and a small cache.
+    """
+
+    __slots__ = ('_data', '_cache')
+
+    _children = {} # key -> view class for nested dicts that carry no ``object`` field
+
+    def __init__(self, data):
+        self._data = data
+        self._cache = None
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if not isinstance(value, (dict, list)):
+            return value
+        if self._cache is not None and key in self._cache:
+            return self._cache[key]
+        wrapped = _wrap(value, self._children.get(key))
+        if wrapped is not value:
+            if self._cache is None:
+                self._cache = {}
+            self._cache[key] = wrapped
+        return wrapped
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(f'{type(self).__name__} has no field {name!r}') from None
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, (StripeObject, LazyList)):
+            other = other._data
+        return self._data == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._data!r})'
+
+    def to_dict(self):
+        """The decoded dict this view wraps (not a copy)."""
+        return self._data
+
+
+class Customer(StripeObject):
+    __slots__ = ()
+
+
+class Card(StripeObject):
+    __slots__ = ()
+
+
+class Charge(StripeObject):
+    __slots__ = ()
+
+    @property
+    def succeeded(self):
+        return self._data.get('status') == 'succeeded'
+
+
+class ListObject(StripeObject):
+    __slots__ = ()
+
+
+class Error(StripeObject):
+    """The ``error`` member of a failed response (``code``, ``type``, ``message``, ...)."""
+
+    __slots__ = ()
+
+
+class ErrorResponse(StripeObject):
+    __slots__ = ()
+
+    _children = {'error': Error}
+
+
+OBJECT_TYPES = {'customer': Customer, 'card': Card, 'charge': Charge, 'list': ListObject}
+
+
+class LazyList(Sequence):
+    """List whose Stripe objects are wrapped in views on first access."""
+
+    __slots__ = ('_data', '_views')
+
+    def __init__(self, data):
+        self._data = data
+        self._views = [None] * len(data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._data)))]
+        view = self._views[index]
+        if view is None:
+            view = self._views[index] = _wrap(self._data[index])
+        return view
+
+    def __len__(self):
+        return len(self._data)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyList):
+            other = other._data
+        return self._data == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'LazyList({self._data!r})'
+
+
+def _wrap(value, cls=None):
+    if isinstance(value, list):
+        return LazyList(value)
+    if not isinstance(value, dict):
+        return value
+    if cls is None:
+        cls = OBJECT_TYPES.get(value.get('object'), StripeObject) if 'object' in value else None
+    return cls(value) if cls is not None else value # plain dicts (metadata, outcome) stay dicts
+
+
+def wrap(data):
+    """View over a decoded response body: a Stripe object, a list or an error."""
+    if isinstance(data, dict) and 'error' in data and 'object' not in data:
+        return ErrorResponse(data)
+    return _wrap(data)
+
+
+class StripeResponse(requests.Response):
+    """``requests.Response`` whose ``json()`` decodes fast and returns lazy views.
+
+    Bodies the fast path cannot decode (and calls with decoder ``kwargs``) go
+    through ``requests`` itself, so errors are raised exactly as before.
+    """
+
+    def json(self, **kwargs):
+        if kwargs:
+            return super().json(**kwargs)
+        try:
+            return wrap(loads(self.content))
+        except ValueError:
+            return super().json()
+
+
+def fast_json(response):
+    """A ``json()`` replacement for an ``httpx.Response`` with the same fast path."""
+    decode = response.json
+
+    def json(**kwargs):
+        if kwargs:
+            return decode(**kwargs)
+        try:
+            return wrap(loads(response.content))
+        except ValueError:
+            return decode()
+    return json
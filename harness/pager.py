@@ -0,0 +1,75 @@
+# Lazy auto-pagination over Stripe list endpoints, with the next page prefetched
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_PAGE_SIZE = 100 # the largest ``limit`` Stripe list endpoints accept
+
+
+def _fetch(client, path, params, kwargs):
+    response = client.get(path, params=params, **kwargs)
+    assert response.status_code == 200, f"Failed to list {path} ({params}): {response.text}"
+    return response.json()
+
+
+def _next_params(params, body):
+    if not body['has_more'] or not body['data']:
+        return None
+    return dict(params, starting_after=body['data'][-1]['id'])
+
+
+def pages(client, path, params=None, page_size=MAX_PAGE_SIZE, prefetch=True, **kwargs):
+    """Yield each page (the ``data`` list) of ``path``, following ``has_more``.
+
+    With ``prefetch`` the request for the next page is in flight on a worker
+    thread while the caller works through the current one, so at most two
+    pages are held at once whatever the size of the list. Extra ``kwargs``
+    (e.g. ``headers``) go to every ``client.get``.
+    """
+    params = dict(params or {}, limit=page_size)
+    if not prefetch:
+        while params is not None:
+            body = _fetch(client, path, params, kwargs)
+            yield body['data']
+            params = _next_params(params, body)
+        return
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(_fetch, client, path, params, kwargs)
+        try:
+            while pending is not None:
+                body = pending.result()
+                params = _next_params(params, body)
+                pending = executor.submit(_fetch, client, path, params, kwargs) if params else None
+                yield body['data']
+        finally:
+            if pending is not None:
+                pending.cancel() # the caller stopped early; drop the unread page
+
+
+def paginate(client, path, params=None, page_size=MAX_PAGE_SIZE, prefetch=True, **kwargs):
+    """Yield every object of a list endpoint in order, fetching pages lazily."""
+    for page in pages(client, path, params, page_size, prefetch, **kwargs):
+        yield from page
+
+
+async def apaginate(client, path, params=None, page_size=MAX_PAGE_SIZE, prefetch=True, **kwargs):
+    """``paginate()`` for AsyncStripeClient; the next page is fetched as a task."""
+
+    async def fetch(page_params):
+        response = await client.get(path, params=page_params, **kwargs)
+        assert response.status_code == 200, f"Failed to list {path} ({page_params}): {response.text}"
+        return response.json()
+
+    params = dict(params or {}, limit=page_size)
+    pending = asyncio.ensure_future(fetch(params))
+    try:
+        while pending is not None:
+            body = await pending
+            params = _next_params(params, body)
+            pending = asyncio.ensure_future(fetch(params)) if params is not None and prefetch else None
+            for obj in body['data']:
+                yield obj
+            if params is not None and pending is None:
+                pending = asyncio.ensure_future(fetch(params))
+    finally:
+        if pending is not None:
+            pending.cancel()
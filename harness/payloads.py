@@ -0,0 +1,263 @@
+# Generated customer, card and charge payloads, the answers the API owes them, and shrinking
+import random
+from collections.abc import Mapping
+from typing import NamedTuple
+
+from harness.aio import run_concurrently
+from harness.emulator import (
+    CARD_PARAMS, CHARGE_PARAMS, CUSTOMER_PARAMS, MAX_AMOUNT, MAX_METADATA_KEY_LENGTH, MAX_METADATA_KEYS,
+    MAX_METADATA_VALUE_LENGTH, MIN_AMOUNT, TEST_TOKENS,
+)
+
+CARD_TOKENS = tuple(token for token, details in TEST_TOKENS.items() if not details['decline'])
+DECLINE_TOKENS = tuple(token for token, details in TEST_TOKENS.items() if details['decline'])
+# Currencies whose minimum and maximum charge match MIN_AMOUNT/MAX_AMOUNT on the live API too
+CURRENCIES = ('usd', 'eur', 'cad', 'aud')
+INVALID_CURRENCIES = ('xyz', 'us', '')
+INVALID_EMAILS = ('invalid-email-format', 'missing-at.example.com')
+UNKNOWN_PARAMS = ('amount_cents', 'colour', 'card_number', 'customer_email')
+# Metadata sizes; none sits at the key limit, so the run tag the clients add never changes the outcome
+METADATA_SIZES = (0, 0, 0, 1, 5, 20, MAX_METADATA_KEYS - 2, MAX_METADATA_KEYS + 2, 64)
+TEXT = ('Generated', 'Zoë Ünïcode', 'quote " and & ampersand', 'x' * 200)
+
+
+class Expectation(NamedTuple):
+    """What the API must answer: a status and, for a 400, the params it may blame."""
+
+    status: int
+    faults: frozenset = frozenset()
+
+
+class Failure(NamedTuple):
+    payload: dict
+    problem: str
+
+
+def _metadata(rng, payload):
+    size = rng.choice(METADATA_SIZES)
+    for i in range(size):
+        payload[f'metadata[k{i}]'] = f'v{i}'
+    roll = rng.random()
+    if roll < 0.05:
+        payload[f"metadata[{'k' * (MAX_METADATA_KEY_LENGTH + 1)}]"] = 'v'
+    elif roll < 0.1:
+        payload['metadata[long]'] = 'v' * (MAX_METADATA_VALUE_LENGTH + 1)
+
+
+def _extra(rng, payload):
+    if rng.random() < 0.1:
+        payload[rng.choice(UNKNOWN_PARAMS)] = 'x'
+    if rng.random() < 0.3:
+        payload['description'] = rng.choice(TEXT)
+
+
+def charge_payload(rng):
+    currency = rng.choice(CURRENCIES)
+    if currency == 'usd' and rng.random() < 0.4: # limits and malformed amounts
+        amount = rng.choice([MIN_AMOUNT, MIN_AMOUNT - 1, 0, -1, MAX_AMOUNT, MAX_AMOUNT + 1, 'ten', '10.5', ''])
+    else:
+        amount = rng.randint(100, 100_000)
+    payload = {'amount': str(amount), 'currency': currency, 'source': rng.choice(CARD_TOKENS)}
+    roll = rng.random()
+    if roll < 0.1:
+        payload['currency'] = rng.choice(INVALID_CURRENCIES)
+    elif roll < 0.25:
+        payload['source'] = rng.choice(DECLINE_TOKENS)
+    elif roll < 0.3:
+        payload['source'] = f'tok_bogus{rng.randint(0, 999)}'
+    for name in ('amount', 'currency', 'source'):
+        if rng.random() < 0.05:
+            del payload[name]
+    _metadata(rng, payload)
+    _extra(rng, payload)
+    return payload
+
+
+def customer_payload(rng):
+    payload = {}
+    roll = rng.random()
+    if roll < 0.6:
+        payload['email'] = f'gen{rng.randint(0, 10**6)}@example.com'
+    elif roll < 0.75:
+        payload['email'] = rng.choice(INVALID_EMAILS)
+    if rng.random() < 0.5:
+        payload['name'] = rng.choice(TEXT)
+    if rng.random() < 0.2:
+        payload['phone'] = '+15555550100'
+    _metadata(rng, payload)
+    _extra(rng, payload)
+    return payload
+
+
+def card_payload(rng):
+    payload = {'source': rng.choice(CARD_TOKENS)}
+    roll = rng.random()
+    if roll < 0.1:
+        payload['source'] = f'tok_bogus{rng.randint(0, 999)}'
+    elif roll < 0.15:
+        del payload['source']
+    _metadata(rng, payload)
+    if rng.random() < 0.1:
+        payload[rng.choice(UNKNOWN_PARAMS)] = 'x'
+    return payload
+
+
+def _param_faults(payload, allowed):
+    faults = set()
+    metadata = [key[len('metadata['):-1] for key in payload if key.startswith('metadata[')]
+    for key in payload:
+        if not key.startswith('metadata[') and key not in allowed:
+            faults.add(key)
+    if len(metadata) > MAX_METADATA_KEYS - 1 or any(len(key) > MAX_METADATA_KEY_LENGTH for key in metadata) \
+            or any(len(payload[f'metadata[{key}]']) > MAX_METADATA_VALUE_LENGTH for key in metadata):
+        faults.add('metadata')
+    return faults
+
+
+def expect_charge(payload):
+    faults = _param_faults(payload, CHARGE_PARAMS)
+    try:
+        amount = int(payload['amount'])
+        if not MIN_AMOUNT <= amount <= MAX_AMOUNT:
+            faults.add('amount')
+    except (KeyError, ValueError):
+        faults.add('amount')
+    if payload.get('currency') not in CURRENCIES:
+        faults.add('currency')
+    if payload.get('source') not in TEST_TOKENS:
+        faults.add('source')
+    if faults:
+        return Expectation(400, frozenset(faults))
+    return Expectation(402 if payload['source'] in DECLINE_TOKENS else 200)
+
+
+def expect_customer(payload):
+    faults = _param_faults(payload, CUSTOMER_PARAMS)
+    if payload.get('email') in INVALID_EMAILS:
+        faults.add('email')
+    return Expectation(400, frozenset(faults)) if faults else Expectation(200)
+
+
+def expect_card(payload):
+    faults = _param_faults(payload, CARD_PARAMS)
+    if payload.get('source') not in CARD_TOKENS:
+        faults.add('source')
+    return Expectation(400, frozenset(faults)) if faults else Expectation(200)
+
+
+class Space(NamedTuple):
+    """One create endpoint: where it lives, how to draw a payload and what it must answer."""
+
+    path: str
+    draw: object
+    expect: object
+    echoed: tuple # fields a success returns unchanged
+
+
+SPACES = {
+    'charge': Space('/charges', charge_payload, expect_charge, ('currency', 'description')),
+    'customer': Space('/customers', customer_payload, expect_customer, ('email', 'name', 'description', 'phone')),
+    'card': Space('/customers/{customer}/sources', card_payload, expect_card, ()),
+}
+
+
+def generate(kind, count, seed=0):
+    """``count`` distinct payloads for ``kind``, the same for the same ``seed``."""
+    rng = random.Random(seed)
+    draw = SPACES[kind].draw
+    seen, payloads = set(), []
+    for _ in range(count * 10):
+        payload = draw(rng)
+        key = tuple(sorted(payload.items()))
+        if key not in seen:
+            seen.add(key)
+            payloads.append(payload)
+            if len(payloads) == count:
+                break
+    return payloads
+
+
+def check(kind, payload, status, body):
+    """Why the answer to ``payload`` breaks the rules, or ``None`` if it is right."""
+    expected = SPACES[kind].expect(payload)
+    error = (body.get('error') or {}) if isinstance(body, Mapping) else {}
+    if status != expected.status:
+        return f"expected {expected.status}, got {status}: {error.get('message', '')}"
+    if status == 400:
+        param, message = error.get('param') or '', error.get('message', '')
+        if not any(param.startswith(fault) or fault in message for fault in expected.faults):
+            return f"400 blames {param or message!r}, not one of {sorted(expected.faults)}"
+    elif status == 402 and error.get('code') != 'card_declined':
+        return f"402 with code {error.get('code')!r}, not 'card_declined'"
+    elif status == 200:
+        for field in SPACES[kind].echoed:
+            if field in payload and body.get(field) != payload[field]:
+                return f"{field} came back as {body.get(field)!r}, not {payload[field]!r}"
+        if kind == 'charge' and body.get('amount') != int(payload['amount']):
+            return f"amount came back as {body.get('amount')!r}, not {payload['amount']}"
+    return None
+
+
+async def run_batched(client, kind, payloads, path=None, batch_size=250, concurrency=50):
+    """POST every payload through an async client, ``batch_size`` at a time.
+
+    Each batch runs ``concurrency`` requests at once; the client's throttle
+    paces them against the live API. Returns the payloads answered wrongly.
+    """
+    path = path or SPACES[kind].path
+    failures = []
+    for start in range(0, len(payloads), batch_size):
+        batch = payloads[start:start + batch_size]
+        responses, _ = await run_concurrently(lambda i: client.post(path, data=batch[i]), len(batch), concurrency)
+        for payload, response in zip(batch, responses):
+            problem = check(kind, payload, response.status_code, response.json())
+            if problem:
+                failures.append(Failure(payload, problem))
+    return failures
+
+
+def _simplifications(payload):
+    """Smaller variants of ``payload``, the biggest cuts first."""
+    metadata = [key for key in payload if key.startswith('metadata[')]
+    if len(metadata) > 1:
+        half = set(metadata[len(metadata) // 2:])
+        yield {k: v for k, v in payload.items() if k not in half}
+    for key in payload:
+        yield {k: v for k, v in payload.items() if k != key}
+    for key, value in payload.items():
+        if key == 'amount' and value != '1000':
+            yield dict(payload, amount='1000')
+        elif len(value) > 1 and key not in ('currency', 'source', 'email'):
+            yield dict(payload, **{key: value[:len(value) // 2]})
+
+
+def shrink(payload, fails, max_attempts=500):
+    """The smallest variant of ``payload`` that still ``fails``, found greedily."""
+    attempts = 0
+    improved = True
+    while improved and attempts < max_attempts:
+        improved = False
+        for candidate in _simplifications(payload):
+            attempts += 1
+            if fails(candidate):
+                payload, improved = candidate, True
+                break
+            if attempts >= max_attempts:
+                break
+    return payload
+
+
+def still_fails(client, kind, path=None, like=None):
+    """Predicate for ``shrink``: re-send a payload with a sync client and re-check it.
+
+    With ``like`` (a ``Failure.problem``), only the same kind of failure counts,
+    so shrinking cannot slip from one bug to another.
+    """
+    path = path or SPACES[kind].path
+    signature = like.split(':')[0] if like else None
+
+    def fails(payload):
+        response = client.post(path, data=payload)
+        problem = check(kind, payload, response.status_code, response.json())
+        return problem is not None and (signature is None or problem.split(':')[0] == signature)
+    return fails
@@ -0,0 +1,87 @@
+# Pre-provisioned customer/card pool shared by the live suites
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from harness.cleanup import delete_customers
+
+
+class Lease:
+    """A customer (and optionally one of its cards) handed to a single test."""
+
+    __slots__ = ('customer_id', 'card_id', 'exclusive')
+
+    def __init__(self, customer_id, card_id=None, exclusive=False):
+        self.customer_id = customer_id
+        self.card_id = card_id
+        self.exclusive = exclusive
+
+    def __repr__(self):
+        return f'Lease({self.customer_id!r}, card_id={self.card_id!r}, exclusive={self.exclusive})'
+
+
+class CustomerPool:
+    """Customers created up front, leased to tests and bulk-deleted at the end.
+
+    Shared leases go back to the idle queue on release, so read-only tests reuse
+    the same customer and card. Exclusive leases are for tests that mutate or
+    delete what they are given: the customer is never handed out again and is
+    only deleted with the rest of the pool in ``close()``.
+    """
+
+    def __init__(self, client, workers=8, description='Pooled test customer'):
+        self.client = client
+        self.workers = workers
+        self.description = description
+        self._idle = deque()
+        self._created = []
+        self._lock = threading.Lock()
+
+    def _create(self, with_card):
+        response = self.client.post('/customers', data={'description': self.description})
+        assert response.status_code == 200, f"Failed to create pooled customer: {response.text}"
+        customer_id = response.json()['id']
+        with self._lock:
+            self._created.append(customer_id)
+        card_id = self._attach_card(customer_id) if with_card else None
+        return Lease(customer_id, card_id)
+
+    def _attach_card(self, customer_id):
+        response = self.client.post(f'/customers/{customer_id}/sources', data={'source': 'tok_visa'})
+        assert response.status_code == 200, f"Failed to attach card to {customer_id}: {response.text}"
+        return response.json()['id']
+
+    def fill(self, count, with_card=True):
+        """Create ``count`` customers concurrently and add them to the idle queue."""
+        if count <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.workers, count)) as executor:
+            leases = list(executor.map(lambda _: self._create(with_card), range(count)))
+        # Completion order is random; a stable order keeps lease hand-out reproducible
+        leases.sort(key=lambda lease: lease.customer_id)
+        with self._lock:
+            self._idle.extend(leases)
+
+    def lease(self, exclusive=False, with_card=False):
+        """Hand out an idle customer, creating one only when the pool is dry."""
+        with self._lock:
+            entry = self._idle.popleft() if self._idle else None
+        if entry is None:
+            entry = self._create(with_card)
+        elif with_card and entry.card_id is None:
+            entry.card_id = self._attach_card(entry.customer_id)
+        entry.exclusive = exclusive
+        return entry
+
+    def release(self, lease):
+        if lease.exclusive:
+            return # Spent: deleted with the rest of the pool in close()
+        with self._lock:
+            self._idle.append(lease)
+
+    def close(self):
+        """Delete every customer the pool created, concurrently."""
+        with self._lock:
+            created, self._created = self._created, []
+            self._idle.clear()
+        return delete_customers(self.client, created, self.workers)
@@ -0,0 +1,109 @@
+# Rate-limit characterization: ramp request rate until 429s appear
+import asyncio
+import json
+import os
+import time
+
+from harness.load import run_load
+
+
+class RampResult:
+    """Knee point, Retry-After values and recovery time for one endpoint."""
+
+    def __init__(self, endpoint, steps, knee, retry_after, recovery):
+        self.endpoint = endpoint
+        self.steps = steps # [{'rate', 'requests', 'throttled', 'p99'}] in ramp order
+        self.knee = knee # first offered rate whose 429 share crossed the threshold
+        self.retry_after = retry_after # distinct Retry-After values seen, in seconds
+        self.recovery = recovery # seconds from the end of saturation to the first success
+
+    @property
+    def last_clean_rate(self):
+        clean = [step['rate'] for step in self.steps if step['rate'] != self.knee]
+        return clean[-1] if clean else None
+
+    def to_dict(self):
+        return {
+            'endpoint': self.endpoint, 'knee': self.knee, 'last_clean_rate': self.last_clean_rate,
+            'retry_after': self.retry_after, 'recovery': self.recovery, 'steps': self.steps,
+        }
+
+
+async def characterize(send, endpoint, rates, step_duration=0.5, threshold=0.01, min_throttled=3,
+                       concurrency=50, settle=0.1, poll_interval=0.002, recovery_limit=5):
+    """Ramp ``send()`` through ``rates`` (open loop) and find where throttling starts.
+
+    Each step runs for ``step_duration`` seconds and ``settle`` seconds are left
+    between steps for the limiter to refill. An unrecorded warm-up step at the
+    first rate opens the connections first, so their setup (and the burst of
+    requests queued behind it) can't throttle the ramp. The ramp stops at the
+    first rate whose share of 429s exceeds ``threshold`` with at least
+    ``min_throttled`` of them, so one stray 429 in a short step is not a knee;
+    the server is then held at twice that rate and polled until it answers
+    again to time the recovery. A server still throttling ``recovery_limit``
+    times the longest Retry-After later has not recovered (``recovery`` None).
+
+    A client stall (a collection pause, a busy host) sends the requests due
+    meanwhile at once; steps long enough and a bucket deep enough to absorb
+    that keep such bursts from passing for the knee.
+    """
+    retry_after = set()
+
+    async def probe():
+        response = await send()
+        if response.status_code == 429 and 'Retry-After' in response.headers:
+            retry_after.add(float(response.headers['Retry-After']))
+        return response
+
+    await run_load(send, step_duration, concurrency=concurrency, rate=rates[0])
+    await asyncio.sleep(settle)
+    steps, knee = [], None
+    for rate in rates:
+        result = await run_load(probe, step_duration, concurrency=concurrency, rate=rate,
+                                ok=lambda status: status != 429)
+        throttled = result.statuses.get(429, 0)
+        steps.append({'rate': rate, 'requests': result.requests, 'throttled': throttled,
+                      'p99': result.percentile(99)})
+        if throttled >= min_throttled and throttled / result.requests > threshold:
+            knee = rate
+            break
+        await asyncio.sleep(settle)
+
+    recovery = None
+    if knee is not None:
+        await run_load(probe, step_duration, concurrency=concurrency, rate=knee * 2,
+                       ok=lambda status: status != 429)
+        stopped = time.perf_counter()
+        deadline = stopped + max(retry_after, default=1.0) * recovery_limit
+        while (await probe()).status_code == 429:
+            if time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(poll_interval)
+        else:
+            recovery = time.perf_counter() - stopped
+    return RampResult(endpoint, steps, knee, sorted(retry_after), recovery)
+
+
+class RateLimitHistory:
+    """Append-only JSON log of characterization runs, keyed by endpoint."""
+
+    def __init__(self, path):
+        self.path = path
+        self.runs = []
+        if os.path.exists(path):
+            with open(path) as f:
+                self.runs = json.load(f)
+
+    def previous(self, endpoint):
+        for run in reversed(self.runs):
+            if run['endpoint'] == endpoint:
+                return run
+        return None
+
+    def append(self, result, **context):
+        entry = dict(result.to_dict(), recorded_at=time.time(), **context)
+        self.runs.append(entry)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(self.runs, f, indent=1)
+        return entry
@@ -0,0 +1,143 @@
+# Cross-process request budget for the live-API suites (pytest plugin)
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# tokens, last refill, requests granted, seconds spent waiting, first grant, last grant
+_STATE = struct.Struct('6d')
+
+bucket_key = pytest.StashKey["FileTokenBucket"]()
+
+
+class FileTokenBucket:
+    """Token bucket whose state lives in a small file shared by every worker.
+
+    Each ``acquire()`` takes an exclusive lock on the file, refills by the
+    wall-clock time elapsed since the last grant and either takes a token or
+    sleeps (outside the lock) until one is due. ``capacity`` bounds the burst;
+    the default of one token spaces requests evenly so throughput over any
+    window stays at or under ``rate`` per second.
+    """
+
+    def __init__(self, path, rate, capacity=None):
+        self.path = path
+        self.rate = float(rate)
+        self.capacity = float(capacity or 1)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # flock() does not exclude threads sharing this descriptor
+        self._thread_lock = threading.Lock()
+        with self._locked() as state:
+            if state is None:
+                self._write((self.capacity, time.time(), 0, 0.0, 0.0, 0.0))
+
+    @contextmanager
+    def _locked(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        try:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            raw = os.read(self._fd, _STATE.size)
+            yield _STATE.unpack(raw) if len(raw) == _STATE.size else None
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            self._thread_lock.release()
+
+    def _write(self, state):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, _STATE.pack(*state))
+
+    def acquire(self):
+        """Block until a request may be sent; return the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._locked() as (tokens, last, granted, total_wait, first, _):
+                now = time.time()
+                tokens = min(self.capacity, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._write((tokens - 1, now, granted + 1, total_wait + waited, first or now, now))
+                    return waited
+                self._write((tokens, now, granted, total_wait, first, _))
+                delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def usage(self):
+        """Return granted requests, achieved rate and waiting time so far."""
+        with self._locked() as (_, _, granted, waited, first, last):
+            elapsed = last - first
+        return {
+            'requests': int(granted),
+            'elapsed': elapsed,
+            'rate': (granted - 1) / elapsed if elapsed > 0 else 0.0,
+            'waited': waited,
+        }
+
+    def close(self):
+        os.close(self._fd)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-max-rps", type=float, default=0,
+                    help="Ceiling on API requests per second shared by all xdist workers (0 disables).")
+    group.addoption("--stripe-burst", type=float, default=None,
+                    help="Requests allowed back-to-back before throttling (default 1).")
+
+def pytest_configure(config):
+    rate = config.getoption("stripe_max_rps")
+    if not rate:
+        return
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is not None:
+        path = workerinput["stripe_bucket"]
+    else:
+        fd, path = tempfile.mkstemp(prefix="stripe-bucket-")
+        os.close(fd)
+        os.truncate(path, 0)
+        config.add_cleanup(lambda: os.path.exists(path) and os.unlink(path))
+    bucket = FileTokenBucket(path, rate, config.getoption("stripe_burst"))
+    config.add_cleanup(bucket.close)
+    config.stash[bucket_key] = bucket
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    # xdist controller: hand every worker the same bucket file
+    bucket = node.config.stash.get(bucket_key, None)
+    if bucket is not None:
+        node.workerinput["stripe_bucket"] = bucket.path
+
+def pytest_terminal_summary(terminalreporter, config):
+    bucket = config.stash.get(bucket_key, None)
+    if bucket is None or hasattr(config, "workerinput"):
+        return
+    usage = bucket.usage()
+    terminalreporter.write_sep("-", "stripe rate budget")
+    terminalreporter.write_line(
+        f"{usage['requests']} requests in {usage['elapsed']:.1f}s = {usage['rate']:.1f} req/s "
+        f"({usage['rate'] / bucket.rate:.0%} of the {bucket.rate:g} req/s ceiling), "
+        f"{usage['waited']:.1f}s spent throttled"
+    )
+
+@pytest.fixture(scope="session")
+def stripe_rate_limiter(pytestconfig):
+    """The shared token bucket, or None when --stripe-max-rps is not set."""
+    return pytestconfig.stash.get(bucket_key, None)
@@ -0,0 +1,206 @@
+# One Customers/Cards/Charges API over interchangeable backends: requests, the stripe SDK or httpx async
+import asyncio
+
+import stripe
+
+from harness.aio import AsyncStripeClient
+from harness.cleanup import RUN_TAG
+from harness.mockspec import ROUTES
+
+BACKENDS = ('requests', 'sdk', 'async')
+
+
+class ApiError(Exception):
+    """An error answer from any backend: its HTTP status and Stripe's ``error`` object."""
+
+    def __init__(self, status, error):
+        super().__init__(f"{status} {error.get('code') or error.get('type')}: {error.get('message')}")
+        self.status = status
+        self.error = error
+
+    @property
+    def code(self):
+        return self.error.get('code')
+
+    @property
+    def param(self):
+        return self.error.get('param')
+
+    @property
+    def message(self):
+        return self.error.get('message', '')
+
+
+def encode_form(params, prefix=None):
+    """Flatten nested params into Stripe's form fields: ``{'metadata': {'k': 'v'}}`` -> ``metadata[k]``."""
+    fields = {}
+    items = params.items() if isinstance(params, dict) else enumerate(params)
+    for key, value in items:
+        name = f'{prefix}[{key}]' if prefix else key
+        if isinstance(value, (dict, list, tuple)):
+            fields.update(encode_form(value, name))
+        elif isinstance(value, bool):
+            fields[name] = 'true' if value else 'false'
+        elif value is not None:
+            fields[name] = value
+    return fields
+
+
+def _request(route, ids, params):
+    method, template = ROUTES[route][:2]
+    kwargs = {('data' if method == 'POST' else 'params'): encode_form(params)} if params else {}
+    return method, template.format(**ids), kwargs
+
+
+def _answer(response):
+    body = response.json()
+    if response.status_code >= 400:
+        raise ApiError(response.status_code, body.get('error') or {})
+    return body
+
+
+class RequestsBackend:
+    """Form-encoded calls through a ``StripeClient`` (``requests.Session``)."""
+
+    name = 'requests'
+
+    def __init__(self, client):
+        self.client = client
+
+    def call(self, route, ids, params):
+        method, path, kwargs = _request(route, ids, params)
+        return _answer(self.client.request(method, path, **kwargs))
+
+    def close(self):
+        pass # the client belongs to the caller
+
+
+class AsyncBackend:
+    """Calls through an ``AsyncStripeClient``, each run to completion on a private event loop.
+
+    ``acall()`` is the native coroutine; ``call()`` gives it the same blocking
+    shape as the other backends, at the cost of one loop entry per call.
+    """
+
+    name = 'async'
+
+    def __init__(self, api_key, base_url, **client_kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.client = AsyncStripeClient(api_key, base_url, **client_kwargs)
+
+    async def acall(self, route, ids, params):
+        method, path, kwargs = _request(route, ids, params)
+        return _answer(await self.client.request(method, path, **kwargs))
+
+    def call(self, route, ids, params):
+        return self.loop.run_until_complete(self.acall(route, ids, params))
+
+    def close(self):
+        self.loop.run_until_complete(self.client.aclose())
+        self.loop.close()
+
+
+class SdkBackend:
+    """Calls through ``stripe.StripeClient``; objects come back as plain dicts via ``to_dict()``.
+
+    The SDK bypasses the harness clients, so this backend run-tags creates and
+    reports created and deleted customers to ``tracker`` itself, and calls
+    ``throttle`` before every request. A ``session`` (e.g. one with a cassette
+    adapter mounted) carries the SDK's requests instead of its own.
+    """
+
+    name = 'sdk'
+
+    def __init__(self, api_key, base_url, tracker=None, throttle=None, max_retries=0, session=None):
+        self.client = stripe.StripeClient(api_key, base_addresses={'api': base_url.rstrip('/').removesuffix('/v1')},
+                                          max_network_retries=max_retries,
+                                          http_client=stripe.RequestsClient(session=session) if session else None)
+        self.tracker = tracker
+        self.throttle = throttle
+        customers, sources, charges = self.client.v1.customers, self.client.v1.customers.payment_sources, \
+            self.client.v1.charges
+        self._calls = {
+            'customers.create': lambda ids, p: customers.create(p),
+            'customers.list': lambda ids, p: customers.list(p),
+            'customers.retrieve': lambda ids, p: customers.retrieve(ids['customer'], p),
+            'customers.update': lambda ids, p: customers.update(ids['customer'], p),
+            'customers.delete': lambda ids, p: customers.delete(ids['customer'], p),
+            'cards.create': lambda ids, p: sources.create(ids['customer'], p),
+            'cards.list': lambda ids, p: sources.list(ids['customer'], p),
+            'cards.retrieve': lambda ids, p: sources.retrieve(ids['customer'], ids['card'], p),
+            'cards.update': lambda ids, p: sources.update(ids['customer'], ids['card'], p),
+            'cards.delete': lambda ids, p: sources.delete(ids['customer'], ids['card'], p),
+            'charges.create': lambda ids, p: charges.create(p),
+            'charges.list': lambda ids, p: charges.list(p),
+            'charges.retrieve': lambda ids, p: charges.retrieve(ids['charge'], p),
+        }
+
+    def call(self, route, ids, params):
+        params = dict(params or {})
+        if self.tracker is not None and route in ('customers.create', 'charges.create'):
+            params['metadata'] = {RUN_TAG: self.tracker.run_id, **params.get('metadata', {})}
+        if self.throttle is not None:
+            self.throttle()
+        try:
+            body = self._calls[route](ids, params).to_dict()
+        except stripe.StripeError as exc:
+            error = (exc.json_body or {}).get('error') or {'message': exc.user_message}
+            raise ApiError(exc.http_status, error) from None
+        if self.tracker is not None and route == 'customers.create':
+            self.tracker.add(body['id'])
+        elif self.tracker is not None and route == 'customers.delete':
+            self.tracker.discard(ids['customer'])
+        return body
+
+    def close(self):
+        pass
+
+
+class Resource:
+    """CRUD on one object type. Path IDs come first, in ``path_ids`` order; params are keywords.
+
+    ``cards.retrieve(customer_id, card_id)``, ``cards.create(customer_id, source='tok_visa')``.
+    """
+
+    def __init__(self, backend, name, path_ids):
+        self.backend = backend
+        self.name = name
+        self.path_ids = path_ids
+
+    def _call(self, op, ids, params=None):
+        return self.backend.call(f'{self.name}.{op}', dict(zip(self.path_ids, ids)), params)
+
+    def create(self, *parent_ids, **params):
+        return self._call('create', parent_ids, params)
+
+    def retrieve(self, *ids):
+        return self._call('retrieve', ids)
+
+    def update(self, *ids, **params):
+        return self._call('update', ids, params)
+
+    def delete(self, *ids):
+        return self._call('delete', ids)
+
+    def list(self, *parent_ids, **params):
+        return self._call('list', parent_ids, params)
+
+
+class StripeApi:
+    """``customers``, ``cards`` and ``charges`` over one backend; errors raise ``ApiError``."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.customers = Resource(backend, 'customers', ('customer',))
+        self.cards = Resource(backend, 'cards', ('customer', 'card'))
+        self.charges = Resource(backend, 'charges', ('charge',))
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def close(self):
+        self.backend.close()
+
+    def __repr__(self):
+        return f'StripeApi({self.name!r})'
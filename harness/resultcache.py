@@ -0,0 +1,241 @@
+# Skip live-API tests whose fingerprint already passed within a TTL (pytest plugin)
+import ast
+import hashlib
+import inspect
+import json
+import os
+import textwrap
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+
+from harness.settings import current, profile_for
+
+CACHE_VERSION = 1
+NETWORK_FIXTURE = 'stripe_settings' # every client fixture depends on it, so it marks tests that call the API
+FINGERPRINT = 'stripe_fingerprint' # user property carrying (test ID, fingerprint) to the controller under xdist
+SUPPORT_FILES = ('conftest.py', 'requirements.txt')
+ROOT = Path(__file__).resolve().parent.parent
+
+cache_key = pytest.StashKey[object]()
+reused_key = pytest.StashKey[int]()
+collected_at_key = pytest.StashKey[float]() # the one "now" every xdist worker checks TTLs against
+
+
+def digest(*parts):
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def code_digest(source):
+    """Hash of the syntax tree, so comments, blank lines and moves don't count as changes."""
+    try:
+        return digest(ast.dump(ast.parse(textwrap.dedent(source))))
+    except SyntaxError:
+        return digest(source)
+
+
+def source_of(obj):
+    obj = inspect.unwrap(obj)
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return f'{getattr(obj, "__module__", "")}.{getattr(obj, "__qualname__", repr(obj))}'
+
+
+def module_digest(source):
+    """Hash of a test module's imports, constants and helpers; its ``test*`` functions are hashed one by one."""
+    tree = ast.parse(source)
+    tree.body = [node for node in tree.body
+                 if not (isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith('test'))]
+    return digest(ast.dump(tree))
+
+
+def cache_id(item, root=ROOT):
+    """``item``'s node ID relative to ``root``; pytest's own moves with the rootdir, which paths in arguments sway."""
+    try:
+        path = item.path.resolve().relative_to(root).as_posix()
+    except ValueError:
+        return item.nodeid
+    return path + item.nodeid[item.nodeid.index('::'):] if '::' in item.nodeid else path
+
+
+def support_digest(root=ROOT):
+    """Hash of the harness package and the root conftest/requirements, which every test runs through."""
+    paths = sorted((root / 'harness').glob('*.py')) + [root / name for name in SUPPORT_FILES]
+    return digest(*(f'{path.name}:{path.read_text()}' for path in paths if path.is_file()))
+
+
+def environment_of(settings):
+    """Profile, base URL and a hash of the API key: a different account or endpoint reruns everything."""
+    return digest(settings.profile, settings.base_url, digest(settings.api_key or ''))
+
+
+def fingerprint(item, environment, support, modules=None):
+    """Hash of everything ``item``'s outcome depends on that this repo controls."""
+    modules = {} if modules is None else modules
+    path = str(item.path)
+    if path not in modules:
+        modules[path] = module_digest(item.path.read_text())
+    function = getattr(item, 'function', None)
+    definitions = getattr(item, '_fixtureinfo', None)
+    fixtures = []
+    for name in sorted(item.fixturenames):
+        for fixturedef in definitions.name2fixturedefs.get(name, ()) if definitions else ():
+            fixtures.append(f'{name}:{code_digest(source_of(fixturedef.func))}')
+    return digest(cache_id(item), code_digest(source_of(function)) if function else '', modules[path],
+                  *fixtures, environment, support)
+
+
+class CachedResult(NamedTuple):
+    """The fingerprint a test last passed with and when (epoch seconds)."""
+
+    fingerprint: str
+    passed_at: float
+
+
+class ResultCache:
+    """Last passing fingerprint per ``cache_id``, kept in a JSON file between runs."""
+
+    __slots__ = ('path', 'ttl', 'entries', 'ran', 'stored')
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.ran = 0 # fingerprinted tests that ran this session
+        self.stored = 0 # ... and passed, so are cached now
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get('version') == CACHE_VERSION:
+            self.entries = {key: CachedResult(*entry) for key, entry in data['tests'].items()}
+
+    def hit(self, key, fingerprint, now=None):
+        """The cached pass of ``key`` if it had this fingerprint and is younger than the TTL, else ``None``."""
+        entry = self.entries.get(key)
+        now = time.time() if now is None else now
+        if entry is None or entry.fingerprint != fingerprint or now - entry.passed_at > self.ttl:
+            return None
+        return entry
+
+    def passed(self, key, fingerprint, now=None):
+        self.entries[key] = CachedResult(fingerprint, time.time() if now is None else now)
+        self.stored += 1
+
+    def failed(self, key):
+        self.entries.pop(key, None)
+
+    def save(self, now=None):
+        """Write entries still within the TTL; replaces the file atomically."""
+        now = time.time() if now is None else now
+        tests = {key: list(entry) for key, entry in sorted(self.entries.items())
+                 if now - entry.passed_at <= self.ttl}
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'version': CACHE_VERSION, 'tests': tests}, file, indent=1)
+        os.replace(temporary, self.path)
+
+
+class CacheRecorder:
+    """Controller-side plugin: caches tests that passed every phase, forgets ones that failed."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def pytest_runtest_logreport(self, report):
+        fingerprinted = dict(report.user_properties).get(FINGERPRINT)
+        if fingerprinted is None:
+            return
+        key, fingerprint = fingerprinted
+        if report.when == 'call':
+            self.cache.ran += 1
+        if report.failed:
+            self.cache.failed(key)
+        elif report.when == 'call' and report.passed:
+            self.cache.passed(key, fingerprint)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-cache", metavar="PATH", default=None,
+                    help="Skip live-API tests that passed within --stripe-cache-ttl with an unchanged fingerprint "
+                         "(test and fixture source, harness code, profile and account); results kept in PATH.")
+    group.addoption("--stripe-cache-ttl", type=float, default=24.0, metavar="HOURS",
+                    help="How long a cached pass is reused (default 24 hours).")
+    group.addoption("--stripe-cache-force", action="store_true", default=False,
+                    help="Run every test despite --stripe-cache, and refresh the cache with the results.")
+
+def pytest_configure(config):
+    path = config.getoption("stripe_cache")
+    # the emulator and replay profiles are local and cheap; only live runs are worth caching
+    if not path or profile_for(config) != "live":
+        return
+    cache = ResultCache(path, config.getoption("stripe_cache_ttl") * 3600)
+    config.stash[cache_key] = cache
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is not None:
+        config.stash[collected_at_key] = workerinput["stripe_cache_now"]
+    else:
+        config.stash[collected_at_key] = time.time()
+        config.pluginmanager.register(CacheRecorder(cache), "stripe-result-cache")
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    # xdist controller: an entry expiring between two workers' collections would make them collect different tests
+    collected_at = node.config.stash.get(collected_at_key, None)
+    if collected_at is not None:
+        node.workerinput["stripe_cache_now"] = collected_at
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    cache = config.stash.get(cache_key, None)
+    if cache is None:
+        return
+    environment, support, modules = environment_of(current()), support_digest(), {}
+    force = config.getoption("stripe_cache_force")
+    selected, reused = [], []
+    for item in items:
+        if NETWORK_FIXTURE not in getattr(item, "fixturenames", ()):
+            selected.append(item)
+            continue
+        key, item_fingerprint = cache_id(item), fingerprint(item, environment, support, modules)
+        item.user_properties.append((FINGERPRINT, (key, item_fingerprint)))
+        if not force and cache.hit(key, item_fingerprint, now=config.stash[collected_at_key]):
+            reused.append(item)
+        else:
+            selected.append(item)
+    config.stash[reused_key] = len(reused)
+    if reused:
+        config.hook.pytest_deselected(items=reused)
+        items[:] = selected
+
+def pytest_sessionfinish(session):
+    config = session.config
+    cache = config.stash.get(cache_key, None)
+    if cache is None:
+        return
+    workeroutput = getattr(config, "workeroutput", None)
+    if workeroutput is not None:
+        workeroutput["stripe_cache_reused"] = config.stash.get(reused_key, 0)
+    else:
+        cache.save()
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    # xdist controller: every worker deselects the same tests, so any one count will do
+    reused = getattr(node, "workeroutput", {}).get("stripe_cache_reused", 0)
+    node.config.stash[reused_key] = max(node.config.stash.get(reused_key, 0), reused)
+
+def pytest_terminal_summary(terminalreporter, config):
+    cache = config.stash.get(cache_key, None)
+    if cache is None or hasattr(config, "workerinput"):
+        return
+    forced = " (forced full run)" if config.getoption("stripe_cache_force") else ""
+    terminalreporter.write_sep("-", f"stripe result cache ({cache.path}){forced}")
+    terminalreporter.write_line(
+        f"{config.stash.get(reused_key, 0)} live tests reused a cached pass; "
+        f"{cache.ran} ran, {cache.stored} passed and were cached for {cache.ttl / 3600:g}h")
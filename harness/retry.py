@@ -0,0 +1,163 @@
+# Retry with decorrelated-jitter backoff, a retry budget and idempotency keys
+import asyncio
+import random
+import re
+import threading
+import time
+import uuid
+
+import httpx
+import requests
+
+# Statuses worth another attempt: rate limited, lock conflicts and server-side failures
+RETRY_STATUSES = frozenset({409, 429, 500, 502, 503, 504})
+
+# Transport failures worth another attempt, for both clients; a body cut short is one too
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, httpx.TransportError)
+
+# Creates that get an Idempotency-Key so a retried POST never runs twice
+IDEMPOTENT_CREATES = re.compile(r'/(charges|customers|refunds)/?$')
+
+
+class RetryBudget:
+    """Caps retries at a fraction of first attempts so a failing API isn't hammered.
+
+    Every first attempt deposits ``ratio`` tokens and every retry withdraws one.
+    The balance starts at, and never exceeds, ``reserve``, so a burst of
+    failures can spend at most ``reserve`` retries before the ratio applies.
+    """
+
+    def __init__(self, ratio=0.2, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.tokens + self.ratio, self.reserve)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """Decides whether, and after how long, a Stripe request is sent again.
+
+    Backoff uses decorrelated jitter (each sleep is uniform between ``base_delay``
+    and three times the previous one, capped at ``max_delay``) so clients that
+    collided once do not collide again. A ``Retry-After`` header replaces the
+    backoff (plus up to ``base_delay`` of jitter) and a ``Stripe-Should-Retry``
+    header overrides the status check. POSTs to ``/charges``, ``/customers`` and ``/refunds``
+    get an ``Idempotency-Key`` that every attempt reuses; other POSTs are
+    retried only on 429, which Stripe never processed.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.25, max_delay=8.0, budget=None,
+                 statuses=RETRY_STATUSES, sleep=time.sleep, async_sleep=asyncio.sleep):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget if budget is not None else RetryBudget()
+        self.statuses = statuses
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0 # retries refused by the budget
+        self._lock = threading.Lock()
+
+    def prepare(self, method, path, headers=None):
+        """Return ``headers`` with an Idempotency-Key added to retry-safe creates."""
+        headers = dict(headers or {})
+        if (method.upper() == 'POST' and IDEMPOTENT_CREATES.search(path.split('?')[0])
+                and not any(k.lower() == 'idempotency-key' for k in headers)):
+            headers['Idempotency-Key'] = str(uuid.uuid4())
+        return headers
+
+    def _retryable(self, method, headers, response, exc):
+        idempotent = method.upper() != 'POST' or any(k.lower() == 'idempotency-key' for k in headers)
+        if exc is not None:
+            return idempotent and isinstance(exc, RETRY_EXCEPTIONS)
+        should_retry = response.headers.get('Stripe-Should-Retry')
+        if should_retry is not None:
+            return should_retry == 'true' and (idempotent or response.status_code == 429)
+        if response.status_code == 429:
+            return True
+        return idempotent and response.status_code in self.statuses
+
+    def next_delay(self, attempt, previous, method, headers, response=None, exc=None):
+        """Seconds to wait before attempt ``attempt + 1``, or ``None`` to give up."""
+        if attempt >= self.max_attempts or not self._retryable(method, headers, response, exc):
+            return None
+        retry_after = _retry_after(response)
+        if retry_after is not None and retry_after > self.max_delay:
+            return None
+        if not self.budget.withdraw():
+            with self._lock:
+                self.exhausted += 1
+            return None
+        with self._lock:
+            self.retries += 1
+        if retry_after is not None:
+            # Spread clients told the same Retry-After so they do not return in lockstep
+            return retry_after + random.uniform(0, self.base_delay)
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+
+    def _start(self):
+        self.budget.deposit()
+        with self._lock:
+            self.requests += 1
+
+    def call(self, method, path, send, headers=None):
+        """Run ``send(headers)`` until it succeeds or retrying stops paying off."""
+        headers = self.prepare(method, path, headers)
+        self._start()
+        attempt, delay = 1, self.base_delay
+        while True:
+            try:
+                response, exc = send(headers), None
+            except RETRY_EXCEPTIONS as error:
+                response, exc = None, error
+            delay = self.next_delay(attempt, delay, method, headers, response, exc)
+            if delay is None:
+                if exc is not None:
+                    raise exc
+                return response
+            self.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, method, path, send, headers=None):
+        """``call()`` for a coroutine ``send(headers)``."""
+        headers = self.prepare(method, path, headers)
+        self._start()
+        attempt, delay = 1, self.base_delay
+        while True:
+            try:
+                response, exc = await send(headers), None
+            except RETRY_EXCEPTIONS as error:
+                response, exc = None, error
+            delay = self.next_delay(attempt, delay, method, headers, response, exc)
+            if delay is None:
+                if exc is not None:
+                    raise exc
+                return response
+            await self.async_sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        return {'requests': self.requests, 'retries': self.retries, 'exhausted': self.exhausted}
+
+
+def _retry_after(response):
+    if response is None:
+        return None
+    try:
+        return max(0.0, float(response.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
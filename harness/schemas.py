@@ -0,0 +1,341 @@
+# Normalized response-shape snapshots, checked against a stored baseline for API drift (pytest plugin)
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import NamedTuple
+
+import pytest
+
+from harness.models import loads
+from harness.settings import profile_for
+from harness.timing import endpoint_of
+
+SNAPSHOT_VERSION = 1
+
+# Values that change on every call are reduced to what they are, not what they say
+ID_VALUE = re.compile(r'^([a-z]+)_[A-Za-z0-9]{6,}$')
+TIMESTAMP_FIELD = re.compile(r'^(created|.+_at)$')
+OPAQUE_FIELDS = frozenset({'metadata'}) # keys are whatever the caller chose
+LITERAL_FIELDS = frozenset({'object'})
+
+schemas_key = pytest.StashKey[object]()
+
+
+class Drift(NamedTuple):
+    """One way a response differed from the baseline shape of its object type."""
+
+    name: str
+    kind: str # 'added', 'removed' or 'changed'
+    path: str
+    detail: str
+    test: str | None
+
+
+def schema_name(body):
+    """What a JSON object is snapshotted as: ``customer``, ``customer.deleted``, ``list /v1/...``, ``error:...``."""
+    error = body.get('error')
+    if isinstance(error, dict):
+        code = error.get('code')
+        return f"error:{error.get('type')}" + (f':{code}' if code else '')
+    kind = body.get('object')
+    if not isinstance(kind, str):
+        return None
+    if kind == 'list':
+        return f"list {endpoint_of(body.get('url') or '')}"
+    return f'{kind}.deleted' if body.get('deleted') is True else kind
+
+
+def tag(key, value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'timestamp' if TIMESTAMP_FIELD.match(key) else 'integer'
+    if isinstance(value, float):
+        return 'number'
+    if key in LITERAL_FIELDS:
+        return f'"{value}"'
+    match = ID_VALUE.match(value) if isinstance(value, str) else None
+    return f'id<{match.group(1)}>' if match else 'string'
+
+
+def shapes(body):
+    """``[(name, fields)]`` for a response body and every Stripe object nested in it.
+
+    ``fields`` maps a path (``address.city``, ``data[]``) to the set of tags
+    seen there. Nested objects with an ``object`` field become ``ref<name>``
+    and get a shape of their own, so a list of a hundred customers is a
+    hundred ``customer`` shapes and one small list shape.
+    """
+    found = []
+
+    def add(fields, path, value_tag):
+        fields.setdefault(path, set()).add(value_tag)
+
+    def value(fields, path, key, item):
+        if isinstance(item, dict):
+            if key in OPAQUE_FIELDS:
+                add(fields, path, 'map')
+                return
+            name = schema_name(item)
+            if name is not None:
+                add(fields, path, f'ref<{name}>')
+                shape(name, item)
+                return
+            add(fields, path, 'object')
+            for child, child_value in item.items():
+                value(fields, f'{path}.{child}', child, child_value)
+        elif isinstance(item, list):
+            add(fields, path, 'array')
+            for element in item:
+                value(fields, f'{path}[]', key, element)
+        else:
+            add(fields, path, tag(key, item))
+
+    def shape(name, obj):
+        fields = {}
+        for key, item in obj.items():
+            value(fields, key, key, item)
+        found.append((name, fields))
+
+    name = schema_name(body) if isinstance(body, dict) else None
+    if name is not None:
+        shape(name, body)
+    return found
+
+
+def shape_digest(fields):
+    canonical = '\n'.join(f"{path}={'|'.join(sorted(tags))}" for path, tags in sorted(fields.items()))
+    return hashlib.blake2b(canonical.encode(), digest_size=8).hexdigest()
+
+
+def _parent(path):
+    if path.endswith('[]'):
+        return path[:-2]
+    return path.rpartition('.')[0] or None
+
+
+def compare(baseline, fields):
+    """``(drifts, learned)`` for one observed shape against the baseline fields of its name.
+
+    A field is added or removed only where the parent object was seen
+    expanded on both sides; children of a value that was only ever null or an
+    empty list are learned. A new tag is drift unless either side is null.
+    Returns ``(kind, path, detail)`` triples and the fields to merge in.
+    """
+    drifts, learned = [], {}
+    for path, tags in fields.items():
+        known = baseline.get(path)
+        if known is None:
+            parent = _parent(path)
+            if parent is None or (not path.endswith('[]') and 'object' in baseline.get(parent, ())):
+                drifts.append(('added', path, '|'.join(sorted(tags))))
+            else:
+                learned[path] = tags
+            continue
+        new = tags - known
+        if not new:
+            continue
+        if known <= {'null'} or new <= {'null'}:
+            learned[path] = new
+        else:
+            drifts.append(('changed', path, f"{'|'.join(sorted(known))} -> {'|'.join(sorted(tags))}"))
+    for path in baseline:
+        if path not in fields:
+            parent = _parent(path)
+            if parent is None or (not path.endswith('[]') and 'object' in fields.get(parent, ())):
+                drifts.append(('removed', path, '|'.join(sorted(baseline[path]))))
+    return drifts, learned
+
+
+class Snapshot:
+    """The baseline of one object type: the tags seen at each path and the digests of shapes known to match."""
+
+    __slots__ = ('fields', 'digests')
+
+    def __init__(self, fields=None, digests=()):
+        self.fields = fields or {}
+        self.digests = set(digests)
+
+    def merge(self, fields):
+        for path, tags in fields.items():
+            self.fields.setdefault(path, set()).update(tags)
+
+    def to_json(self):
+        return {'fields': {path: '|'.join(sorted(tags)) for path, tags in sorted(self.fields.items())},
+                'digests': sorted(self.digests)}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({path: set(tags.split('|')) for path, tags in data['fields'].items()}, data['digests'])
+
+
+class SchemaBook:
+    """Checks the shape of every response against per-object baselines.
+
+    A shape whose digest the baseline already knows costs one set lookup.
+    Anything else is diffed field by field: compatible differences (a null
+    field seen with a value, a list seen with items) are merged into this
+    run's copy of the baseline; anything else is drift. With ``update`` the
+    baseline is rebuilt from what this run sees, nothing counts as drift, and
+    the plugin writes it back; otherwise the file is never written.
+    """
+
+    def __init__(self, path=None, update=False):
+        self.path = path
+        self.update = update
+        self.snapshots = {}
+        self.drifts = []
+        self.new = set() # names this run saw first
+        self.observed = 0
+        self.hits = 0
+        self.test = None # node ID the current responses belong to
+        self._reported = set()
+        self._lock = threading.Lock()
+        if path and not update and os.path.exists(path):
+            with open(path) as file:
+                data = json.load(file)
+            if data.get('version') == SNAPSHOT_VERSION:
+                self.snapshots = {name: Snapshot.from_json(snapshot) for name, snapshot in data['shapes'].items()}
+
+    def observe(self, response):
+        """Check a ``requests``/``httpx`` response; bodies that aren't JSON objects are ignored."""
+        content = response.content
+        if content[:1] != b'{':
+            return
+        try:
+            body = loads(content)
+        except ValueError:
+            return
+        self.check(body)
+
+    def check(self, body):
+        for name, fields in shapes(body):
+            self.observed += 1
+            digest = shape_digest(fields)
+            snapshot = self.snapshots.get(name)
+            if snapshot is not None and digest in snapshot.digests:
+                self.hits += 1
+                continue
+            with self._lock:
+                self._check(name, fields, digest)
+
+    def _check(self, name, fields, digest):
+        snapshot = self.snapshots.get(name)
+        if snapshot is None:
+            self.snapshots[name] = Snapshot({path: set(tags) for path, tags in fields.items()}, {digest})
+            self.new.add(name)
+            return
+        drifts, learned = compare(snapshot.fields, fields)
+        if self.update:
+            snapshot.merge(fields)
+        elif drifts:
+            for kind, path, detail in drifts:
+                if (name, kind, path, detail) not in self._reported:
+                    self._reported.add((name, kind, path, detail))
+                    self.drifts.append(Drift(name, kind, path, detail, self.test))
+            return
+        else:
+            snapshot.merge(learned)
+        snapshot.digests.add(digest)
+
+    def to_json(self):
+        return {'version': SNAPSHOT_VERSION,
+                'shapes': {name: snapshot.to_json() for name, snapshot in sorted(self.snapshots.items())}}
+
+    def absorb(self, data, drifts, new, observed, hits):
+        """Merge what an xdist worker's book saw into this one."""
+        with self._lock:
+            for name, snapshot in data['shapes'].items():
+                theirs = Snapshot.from_json(snapshot)
+                mine = self.snapshots.setdefault(name, Snapshot())
+                mine.merge(theirs.fields)
+                mine.digests |= theirs.digests
+            for drift in map(Drift._make, drifts):
+                if drift[:4] not in self._reported:
+                    self._reported.add(drift[:4])
+                    self.drifts.append(drift)
+            self.new.update(new)
+            self.observed += observed
+            self.hits += hits
+
+    def save(self):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.to_json(), file, indent=1)
+            file.write('\n')
+        os.replace(temporary, self.path)
+
+
+def schemas_for(config):
+    """The session's SchemaBook under --stripe-snapshots, else None."""
+    return config.stash.get(schemas_key, None)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-snapshots", metavar="DIR", default=None,
+                    help="Check every response shape against the baseline in DIR/<profile>.json and fail on drift; "
+                         "the baseline is only read.")
+    group.addoption("--stripe-snapshot-update", action="store_true", default=False,
+                    help="Rebuild the --stripe-snapshots baseline from this run and write it instead of checking it.")
+
+def pytest_configure(config):
+    directory = config.getoption("stripe_snapshots")
+    if not directory:
+        return
+    # replayed cassettes were recorded from the live API, so they share its shapes
+    profile = "live" if profile_for(config) == "replay" else profile_for(config)
+    config.stash[schemas_key] = SchemaBook(os.path.join(directory, f"{profile}.json"),
+                                           update=config.getoption("stripe_snapshot_update"))
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item):
+    book = schemas_for(item.config)
+    if book is not None:
+        book.test = item.nodeid
+    yield
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    book = schemas_for(node.config)
+    output = getattr(node, "workeroutput", {}).get("stripe_schemas")
+    if book is not None and output:
+        book.absorb(*output)
+
+def pytest_sessionfinish(session):
+    config = session.config
+    book = schemas_for(config)
+    if book is None:
+        return
+    workeroutput = getattr(config, "workeroutput", None)
+    if workeroutput is not None:
+        workeroutput["stripe_schemas"] = (book.to_json(), [list(drift) for drift in book.drifts], sorted(book.new),
+                                          book.observed, book.hits)
+        return
+    if book.update:
+        os.makedirs(os.path.dirname(book.path) or ".", exist_ok=True)
+        book.save()
+        return
+    # A checking run never writes the baseline: new object types and learned fields wait for an --update run
+    if book.drifts and session.exitstatus == pytest.ExitCode.OK:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+def pytest_terminal_summary(terminalreporter, config):
+    book = schemas_for(config)
+    if book is None or hasattr(config, "workerinput"):
+        return
+    verb = "rebuilt" if book.update else "checked"
+    terminalreporter.write_sep("-", f"stripe schema snapshots ({book.path})")
+    terminalreporter.write_line(
+        f"{book.observed} shapes {verb}, {book.hits} matched by digest alone; "
+        f"{len(book.new)} new object types, {len(book.drifts)} drifts")
+    for drift in book.drifts:
+        terminalreporter.write_line(f"{drift.kind:>7} {drift.name} {drift.path}: {drift.detail}  ({drift.test})",
+                                    red=True)
+    if book.new and not book.update:
+        terminalreporter.write_line(f"not in the baseline (add with --stripe-snapshot-update): "
+                                    f"{', '.join(sorted(book.new))}", yellow=True)
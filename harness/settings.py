@@ -0,0 +1,83 @@
+# Session settings: API key, base URL and headers for the live, emulator and replay profiles
+import os
+from types import MappingProxyType
+from typing import NamedTuple
+
+from harness.client import DEFAULT_BASE_URL, join_url
+from harness.emulator import DEFAULT_API_KEY
+
+PROFILES = ('live', 'emulator', 'replay')
+REPLAY_API_KEY = 'sk_test_replay' # replay needs no credentials; a placeholder keeps suites from skipping
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+_dotenv_loaded = False
+_active = None
+
+
+class Settings(NamedTuple):
+    """Immutable settings for one test session, shared by every suite."""
+
+    profile: str
+    api_key: str | None
+    base_url: str
+
+    @property
+    def headers(self):
+        """Read-only ``Authorization`` and form ``Content-Type`` headers."""
+        return MappingProxyType({'Authorization': f'Bearer {self.api_key}', 'Content-Type': FORM_CONTENT_TYPE})
+
+    def url(self, path):
+        """Resolve ``path`` against ``base_url``; absolute URLs pass through as-is."""
+        return join_url(self.base_url, path)
+
+
+def load_dotenv_once():
+    """Read ``.env`` into the environment the first time only, and never on CI."""
+    global _dotenv_loaded
+    if _dotenv_loaded or os.getenv('GITHUB_ACTIONS') == 'true':
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _dotenv_loaded = True
+
+
+def load(profile='live', environ=None):
+    """Build the settings of ``profile`` from ``STRIPE_API_KEY`` and ``BASE_URL``.
+
+    ``emulator`` and ``replay`` fall back to placeholder keys, since neither
+    talks to Stripe; under ``emulator`` ``BASE_URL`` is the stand-in's address.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown profile {profile!r}; expected one of {", ".join(PROFILES)}')
+    if environ is None:
+        load_dotenv_once()
+        environ = os.environ
+    api_key = environ.get('STRIPE_API_KEY') or None
+    if api_key is None and profile == 'replay':
+        api_key = REPLAY_API_KEY
+    elif api_key is None and profile == 'emulator':
+        api_key = DEFAULT_API_KEY
+    return Settings(profile, api_key, environ.get('BASE_URL') or DEFAULT_BASE_URL)
+
+
+def profile_for(config):
+    """The profile selected by ``--stripe-replay``/``--stripe-emulator``, else ``live``."""
+    if config.getoption('stripe_replay', None):
+        return 'replay'
+    if config.getoption('stripe_emulator', False):
+        return 'emulator'
+    return 'live'
+
+
+def activate(settings):
+    """Make ``settings`` what ``current()`` returns for the rest of the process."""
+    global _active
+    _active = settings
+    return settings
+
+
+def current():
+    """The session's settings; outside pytest, the ``live`` profile from the environment."""
+    if _active is None:
+        return activate(load())
+    return _active
@@ -0,0 +1,303 @@
+# Soak mode: repeat a flow for a long time and fail if memory, descriptors or connection pools keep growing (pytest plugin)
+import gc
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import NamedTuple
+
+import pytest
+
+results_key = pytest.StashKey[list]()
+
+# metric (after any 'client.' prefix) -> growth tolerated between the first and last third of a soak
+TOLERANCES = {'rss': 16 * 2**20, 'traced': 4 * 2**20, 'fds': 2, 'pools': 1, 'idle': 2, 'connections': 2}
+DEFAULT_TOLERANCE = 1
+SITE_TOLERANCE = 64 * 2**10 # bytes an allocation site may grow by between the first and last third
+WARMUP = 0.2 # share of samples ignored while caches, pools and the allocator settle
+MIN_SAMPLES = 6 # after warm-up; fewer can't tell a plateau from a slope
+ALLOCATORS_EVERY = 5 # samples per allocator diff in --stripe-soak runs; each diff walks every live trace
+
+
+def rss_bytes():
+    """Resident set size now; peak RSS where ``/proc`` isn't available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def open_fds():
+    for directory in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(directory))
+        except OSError:
+            continue
+    return None
+
+
+def pool_probe(client, name):
+    """Connection-pool sizes of a StripeClient (pools, idle sockets) or AsyncStripeClient (connections)."""
+    def probe():
+        adapter = getattr(client, 'adapter', None)
+        if adapter is not None:
+            pools = adapter.poolmanager.pools
+            live = [pools[key] for key in pools.keys()]
+            # urllib3 pre-fills each pool's queue with None placeholders; only real connections count
+            idle = sum(connection is not None for pool in live if pool.pool for connection in list(pool.pool.queue))
+            return {f'{name}.pools': len(live), f'{name}.idle': idle}
+        pool = getattr(getattr(getattr(client, 'client', None), '_transport', None), '_pool', None)
+        return {f'{name}.connections': len(pool.connections)} if pool is not None else {}
+    return probe
+
+
+class Sample(NamedTuple):
+    elapsed: float
+    iterations: int
+    metrics: dict
+    allocators: dict | None = None # 'file:line' -> bytes grown since the start, top sites only; None if not taken
+
+
+class Leak(NamedTuple):
+    """A metric whose median rose through every third of the soak."""
+
+    metric: str
+    first: float
+    middle: float
+    last: float
+
+    def __str__(self):
+        scale, unit = (2**20, 'MiB') if self.metric.split('.')[-1] in ('rss', 'traced') else (1, '')
+        return (f'{self.metric} kept growing: {self.first / scale:g}{unit} -> {self.middle / scale:g}{unit} '
+                f'-> {self.last / scale:g}{unit}')
+
+
+def _climb(values, tolerance):
+    """Medians of the first, middle and last third if each beats the one before and the rise passes ``tolerance``."""
+    third = len(values) // 3
+    first, middle, last = (statistics.median(values[:third]), statistics.median(values[third:-third]),
+                           statistics.median(values[-third:]))
+    return (first, middle, last) if first < middle < last and last - first > tolerance else None
+
+
+def leaks(samples, warmup=WARMUP, tolerances=TOLERANCES):
+    """Metrics that grew without bound: medians of the first, middle and last third all climb.
+
+    A metric that jumps during warm-up and then holds (a filled pool, a
+    warmed cache) is not a leak; one that's still rising at the end is, once
+    the total rise passes its tolerance.
+    """
+    steady = samples[int(len(samples) * warmup):]
+    if len(steady) < MIN_SAMPLES:
+        return []
+    found = []
+    for metric in steady[0].metrics:
+        values = [sample.metrics.get(metric) for sample in steady]
+        if any(value is None for value in values):
+            continue
+        climb = _climb(values, tolerances.get(metric.split('.')[-1], DEFAULT_TOLERANCE))
+        if climb is not None:
+            found.append(Leak(metric, *climb))
+    return found
+
+
+class SiteGrowth(NamedTuple):
+    """How much one allocation site had grown by at each allocator sample after warm-up."""
+
+    site: str # 'file:line'
+    sizes: list # bytes; 0 where the site wasn't among the top
+    steady: bool # grew through every third of the soak, as a leak does, not just towards the end
+
+
+def allocator_growth(samples, warmup=WARMUP, tolerance=SITE_TOLERANCE):
+    """Every site that made a sample's top allocators, steady growers first, then by final size."""
+    taken = [sample.allocators for sample in samples[int(len(samples) * warmup):] if sample.allocators is not None]
+    growth = []
+    for site in {site for allocators in taken for site in allocators}:
+        sizes = [allocators.get(site, 0) for allocators in taken]
+        steady = len(sizes) >= MIN_SAMPLES and _climb(sizes, tolerance) is not None
+        growth.append(SiteGrowth(site, sizes, steady))
+    return sorted(growth, key=lambda site: (not site.steady, -site.sizes[-1]))
+
+
+class SoakResult(NamedTuple):
+    name: str
+    iterations: int
+    elapsed: float
+    samples: list
+    leaks: list
+    allocators: list # SiteGrowth, steady growers first
+
+
+class SoakMonitor:
+    """Samples RSS, traced memory, open descriptors and pool sizes, and the top allocation sites.
+
+    Every ``allocators_every``-th sample (and the last) also diffs a
+    tracemalloc snapshot against the one taken at the start and keeps the
+    ``top`` sites by growth, so a site that grows all along can be told from
+    one that only grew at the end. Everything is process-wide, so a server
+    under test must not share the process (see EmulatorProcess); ``probes``
+    return extra metrics by name.
+    """
+
+    def __init__(self, probes=(), top=10, allocators_every=1):
+        self.probes = list(probes)
+        self.top = top
+        self.allocators_every = allocators_every
+        self.samples = []
+        self._start = None
+        self._baseline = None
+        self._tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        gc.collect()
+        self._baseline = tracemalloc.take_snapshot()
+        self._start = time.perf_counter()
+
+    def sample(self, iterations, last=False):
+        gc.collect() # cyclic garbage (requests responses) would otherwise pass for growth until a gen-2 pass
+        metrics = {'rss': rss_bytes(), 'traced': tracemalloc.get_traced_memory()[0], 'fds': open_fds()}
+        for probe in self.probes:
+            metrics.update(probe())
+        allocators = None
+        if last or len(self.samples) % self.allocators_every == 0:
+            allocators = self._top_allocators()
+        self.samples.append(Sample(time.perf_counter() - self._start, iterations,
+                                   {name: value for name, value in metrics.items() if value is not None},
+                                   allocators))
+
+    def stop(self):
+        """Stop tracing if this monitor started it."""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def _top_allocators(self):
+        # dropping our own frames from the diff is far cheaper than Snapshot.filter_traces() on every sample
+        own = (tracemalloc.__file__, __file__)
+        growth = [stat for stat in tracemalloc.take_snapshot().compare_to(self._baseline, 'lineno')
+                  if stat.size_diff > 0 and stat.traceback[0].filename not in own]
+        return {f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}': stat.size_diff
+                for stat in growth[:self.top]}
+
+
+class _Soak:
+    """Shared loop bookkeeping of run_soak and arun_soak."""
+
+    def __init__(self, duration, interval, monitor):
+        self.duration = duration
+        self.interval = interval
+        self.monitor = monitor
+        self.iterations = 0
+        monitor.start() # a full collection and the baseline snapshot, so the clock starts after it
+        self.start = time.perf_counter()
+        self.next_sample = interval
+        monitor.sample(0)
+
+    def running(self):
+        return time.perf_counter() - self.start < self.duration
+
+    def tick(self):
+        self.iterations += 1
+        if time.perf_counter() - self.start >= self.next_sample:
+            self.monitor.sample(self.iterations)
+            # a sample slower than the interval skips the slots it overran, or the flow would stop running
+            elapsed = time.perf_counter() - self.start
+            while self.next_sample <= elapsed:
+                self.next_sample += self.interval
+
+    def finish(self, name):
+        self.monitor.sample(self.iterations, last=True)
+        self.monitor.stop()
+        samples = self.monitor.samples
+        return SoakResult(name, self.iterations, time.perf_counter() - self.start, samples,
+                          leaks(samples), allocator_growth(samples))
+
+
+def run_soak(flow, duration, interval, monitor=None, name='soak'):
+    """Call ``flow(i)`` back to back for ``duration`` seconds, sampling every ``interval`` seconds."""
+    soak = _Soak(duration, interval, monitor or SoakMonitor())
+    try:
+        while soak.running():
+            flow(soak.iterations)
+            soak.tick()
+    finally:
+        result = soak.finish(name)
+    return result
+
+
+async def arun_soak(flow, duration, interval, monitor=None, name='soak'):
+    """``run_soak`` for a coroutine ``flow(i)``."""
+    soak = _Soak(duration, interval, monitor or SoakMonitor())
+    try:
+        while soak.running():
+            await flow(soak.iterations)
+            soak.tick()
+    finally:
+        result = soak.finish(name)
+    return result
+
+
+class SoakRunner:
+    """Runs soaks with the --stripe-soak settings and records them for the summary."""
+
+    def __init__(self, config, nodeid):
+        self.duration = config.getoption("stripe_soak")
+        self.interval = config.getoption("stripe_soak_interval") or max(self.duration / 60, 1.0)
+        self._results = config.stash.setdefault(results_key, [])
+        self.nodeid = nodeid
+
+    def run(self, name, flow, probes=()):
+        monitor = SoakMonitor(probes, allocators_every=ALLOCATORS_EVERY)
+        return self._record(run_soak(flow, self.duration, self.interval, monitor, name))
+
+    async def arun(self, name, flow, probes=()):
+        monitor = SoakMonitor(probes, allocators_every=ALLOCATORS_EVERY)
+        return self._record(await arun_soak(flow, self.duration, self.interval, monitor, name))
+
+    def _record(self, result):
+        self._results.append((self.nodeid, result))
+        return result
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-soak", type=float, default=0, metavar="SECONDS",
+                    help="Run the soak tests for this long each (0 skips them).")
+    group.addoption("--stripe-soak-interval", type=float, default=0, metavar="SECONDS",
+                    help="Seconds between resource samples during a soak (default: 60 samples per soak).")
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(results_key, None)
+    if not results:
+        return
+    terminalreporter.write_sep("-", "stripe soak (first -> last sample after warm-up)")
+    for _, result in results:
+        steady = result.samples[int(len(result.samples) * WARMUP):]
+        terminalreporter.write_line(f"{result.name}: {result.iterations} iterations in {result.elapsed:.0f}s, "
+                                    f"{result.iterations / result.elapsed:.1f}/s")
+        for metric in steady[0].metrics if steady else ():
+            first, last = steady[0].metrics.get(metric), steady[-1].metrics.get(metric)
+            terminalreporter.write_line(f"  {metric:<28} {first:>14,} -> {last:>14,}")
+        for leak in result.leaks:
+            terminalreporter.write_line(f"  LEAK {leak}", red=True)
+        for site in result.allocators[:5]:
+            # five points across the soak show whether a site climbed all along or only at the end
+            points = [site.sizes[round(i * (len(site.sizes) - 1) / 4)] for i in range(5)]
+            trend = " -> ".join(f"{size / 1024:,.0f}" for size in points)
+            terminalreporter.write_line(f"  {'steady' if site.steady else '':<6} {trend} KiB at {site.site}",
+                                        red=site.steady)
+
+@pytest.fixture
+def soak_runner(request):
+    """Repeat a flow for --stripe-soak seconds while sampling memory, descriptors and pools."""
+    if not request.config.getoption("stripe_soak"):
+        pytest.skip("soak tests run only with --stripe-soak SECONDS")
+    return SoakRunner(request.config, request.node.nodeid)
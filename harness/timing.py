@@ -0,0 +1,301 @@
+# Per-request phase timings (DNS/connect/TLS/TTFB/body/JSON) for the Stripe clients (pytest plugin)
+import csv
+import glob
+import json
+import os
+import re
+import socket
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'body', 'json')
+FIELDS = ('nodeid', 'method', 'endpoint', 'status', 'reused') + PHASES + ('total',)
+
+# Path segments that are object IDs (cus_..., card_..., ch_...) collapse into {id}
+_OBJECT_ID = re.compile(r'^[a-z]+_[A-Za-z0-9]+$')
+
+recorder_key = pytest.StashKey[object]()
+
+_active = threading.local() # the RequestTiming the current thread is sending, if any
+
+
+def endpoint_of(url):
+    """``/v1/customers/cus_123/sources`` -> ``/v1/customers/{id}/sources``."""
+    path = url.split('://', 1)[-1].partition('/')[2].split('?')[0]
+    return '/' + '/'.join('{id}' if _OBJECT_ID.match(part) else part for part in path.split('/'))
+
+
+class RequestTiming:
+    """Phase durations (seconds) of one request; ``None`` where a phase doesn't apply."""
+
+    __slots__ = FIELDS + ('_sent', '_headers')
+
+    def __init__(self, nodeid, method, url):
+        self.nodeid = nodeid
+        self.method = method
+        self.endpoint = endpoint_of(url)
+        self.status = None
+        self.reused = True # until a connection is opened for this request
+        for phase in PHASES + ('total', '_sent', '_headers'):
+            setattr(self, phase, None)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    # --- httpx/httpcore trace extension ---
+
+    async def trace(self, event, info):
+        now = time.perf_counter()
+        if event == 'connection.connect_tcp.started':
+            self.reused, self._sent = False, now
+        elif event == 'connection.connect_tcp.complete':
+            self.connect = now - self._sent # httpcore resolves inside connect_tcp
+        elif event == 'connection.start_tls.started':
+            self._sent = now
+        elif event == 'connection.start_tls.complete':
+            self.tls = now - self._sent
+        elif event == 'http11.send_request_body.complete':
+            self._sent = now
+        elif event == 'http11.receive_response_headers.complete':
+            self.ttfb, self._headers = now - self._sent, now
+        elif event == 'http11.receive_response_body.complete':
+            self.body = now - self._headers
+
+
+def _timed_json(response, timing):
+    decode = response.json
+
+    def json(**kwargs):
+        start = time.perf_counter()
+        try:
+            return decode(**kwargs)
+        finally:
+            timing.json = time.perf_counter() - start
+    response.json = json
+
+
+class _TimedConnection:
+    """urllib3 connection mixin that reports phases to the active RequestTiming."""
+
+    def _new_conn(self):
+        timing = getattr(_active, 'timing', None)
+        if timing is None:
+            return super()._new_conn()
+        start = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            address = None # let urllib3 resolve and report the failure itself
+        resolved = time.perf_counter()
+        host = self._dns_host
+        try:
+            self._dns_host = address or host
+            sock = super()._new_conn()
+        except OSError:
+            if address is None:
+                raise
+            self._dns_host = host # the first address failed; let urllib3 try the rest
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        timing.dns, timing.connect, timing.reused = resolved - start, time.perf_counter() - resolved, False
+        return sock
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        timing = getattr(_active, 'timing', None)
+        if timing is not None:
+            timing._sent = time.perf_counter()
+
+    def getresponse(self):
+        response = super().getresponse()
+        timing = getattr(_active, 'timing', None)
+        if timing is not None and timing._sent is not None:
+            timing._headers = time.perf_counter()
+            timing.ttfb = timing._headers - timing._sent
+        return response
+
+
+class TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        timing = getattr(_active, 'timing', None)
+        if timing is not None and timing.connect is not None:
+            timing.tls = time.perf_counter() - start - timing.dns - timing.connect
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+def install(poolmanager):
+    """Make ``poolmanager`` open connections that report phase timings."""
+    poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+class PhaseRecorder:
+    """Collects a RequestTiming for every request the clients send.
+
+    ``nodeid`` is kept pointed at the running test by the plugin hooks, so each
+    timing is tagged with the test that caused it.
+    """
+
+    def __init__(self):
+        self.nodeid = ''
+        self.timings = []
+        self._lock = threading.Lock()
+
+    def _add(self, timing):
+        with self._lock:
+            self.timings.append(timing)
+
+    @contextmanager
+    def measure(self, method, url):
+        """Time a ``requests`` call made inside the block; returns its RequestTiming."""
+        timing = RequestTiming(self.nodeid, method, url)
+        _active.timing = timing
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            end = time.perf_counter()
+            _active.timing = None
+            timing.total = end - start
+            if timing._headers is not None:
+                timing.body = end - timing._headers # requests reads the body before returning
+            self._add(timing)
+
+    def finish(self, timing, response):
+        timing.status = response.status_code
+        _timed_json(response, timing)
+        return response
+
+    async def measure_async(self, method, url, send):
+        """Await ``send(trace)`` for an httpx request and record its phases."""
+        timing = RequestTiming(self.nodeid, method, url)
+        start = time.perf_counter()
+        try:
+            response = await send(timing.trace)
+        finally:
+            timing.total = time.perf_counter() - start
+            self._add(timing)
+        return self.finish(timing, response)
+
+    def write(self, path):
+        write_timings(path, [timing.to_dict() for timing in self.timings])
+
+
+def write_timings(path, rows):
+    """Write timing rows to ``path``: CSV for ``.csv``, JSON lines otherwise."""
+    with open(path, 'w', newline='') as f:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+
+
+def read_timings(path):
+    """Rows of a timings file written by ``PhaseRecorder.write``."""
+    with open(path, newline='') as f:
+        if not path.endswith('.csv'):
+            return [json.loads(line) for line in f if line.strip()]
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for field in PHASES + ('total',):
+            row[field] = float(row[field]) if row[field] else None
+        row['reused'] = row['reused'] == 'True'
+    return rows
+
+
+def summarize(rows):
+    """Per-endpoint request count, mean of each phase and p50/p90 of the total, in seconds."""
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(f"{row['method']} {row['endpoint']}", []).append(row)
+    summary = {}
+    for endpoint, group in sorted(grouped.items()):
+        totals = sorted(row['total'] for row in group)
+        stats = {'requests': len(group), 'new_connections': sum(not row['reused'] for row in group)}
+        for phase in PHASES:
+            values = [row[phase] for row in group if row[phase] is not None]
+            stats[phase] = statistics.fmean(values) if values else None
+        stats['p50'] = totals[(len(totals) - 1) // 2]
+        stats['p90'] = totals[min(len(totals) - 1, int(len(totals) * 0.9))]
+        summary[endpoint] = stats
+    return summary
+
+
+def recorder_for(config):
+    """The session's PhaseRecorder under --stripe-timings, else None."""
+    return config.stash.get(recorder_key, None)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("stripe")
+    group.addoption("--stripe-timings", metavar="PATH", default=None,
+                    help="Record per-request phase timings to PATH (.csv for CSV, JSON lines otherwise).")
+
+def pytest_configure(config):
+    if config.getoption("stripe_timings"):
+        config.stash[recorder_key] = PhaseRecorder()
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item):
+    recorder = recorder_for(item.config)
+    if recorder is not None:
+        recorder.nodeid = item.nodeid
+    yield
+
+def pytest_sessionfinish(session):
+    recorder = recorder_for(session.config)
+    if recorder is None:
+        return
+    path = session.config.getoption("stripe_timings")
+    workerinput = getattr(session.config, "workerinput", None)
+    # xdist workers write their own part; the controller merges them in the summary
+    if workerinput:
+        stem, ext = os.path.splitext(path)
+        path = f'{stem}.{workerinput["workerid"]}{ext}'
+    recorder.write(path)
+
+def pytest_terminal_summary(terminalreporter, config):
+    if recorder_for(config) is None or hasattr(config, "workerinput"):
+        return
+    path = config.getoption("stripe_timings")
+    stem, ext = os.path.splitext(path)
+    parts = sorted(glob.glob(f'{glob.escape(stem)}.gw*{ext}'))
+    rows = read_timings(path) if os.path.exists(path) else []
+    if parts:
+        for part in parts:
+            rows.extend(read_timings(part))
+            os.remove(part)
+        write_timings(path, rows)
+    if not rows:
+        return
+    terminalreporter.write_sep("-", f"stripe request phases (mean ms; {path})")
+    terminalreporter.write_line(
+        f"{'endpoint':<40} {'reqs':>5} {'new':>4} " + " ".join(f"{phase:>7}" for phase in PHASES)
+        + f" {'p50':>7} {'p90':>7}")
+    for endpoint, stats in summarize(rows).items():
+        cells = " ".join(f"{stats[p] * 1000:>7.2f}" if stats[p] is not None else f"{'-':>7}" for p in PHASES)
+        terminalreporter.write_line(
+            f"{endpoint:<40} {stats['requests']:>5} {stats['new_connections']:>4} {cells} "
+            f"{stats['p50'] * 1000:>7.2f} {stats['p90'] * 1000:>7.2f}")
@@ -1,69 +1,36 @@
 # Functional tests for Stripe Card objects
 import pytest
-import requests
-import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from harness.pager import pages
+from harness.settings import current
 
-# Fetch API key and base URL
-API_KEY = os.getenv('STRIPE_API_KEY')
-BASE_URL = os.getenv('BASE_URL', 'https://api.stripe.com/v1')
-
-# Headers for authenticated requests (form-encoded for creating card sources)
-HEADERS = {
-    'Authorization': f'Bearer {API_KEY}',
-    'Content-Type': 'application/x-www-form-urlencoded'
-}
+SETTINGS = current() # loaded once per session by conftest
 
 # Skip all tests in this module if API key is not set
-pytestmark = pytest.mark.skipif(not API_KEY, reason='STRIPE_API_KEY environment variable not set')
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
 
 @pytest.fixture(scope="function")
-def create_customer_fixture():
-    """Fixture to create a customer for tests and delete it afterwards."""
-    customer_url = f'{BASE_URL}/customers'
-    customer_data = {'description': 'Customer for card testing'}
-    response = requests.post(customer_url, headers=HEADERS, data=customer_data)
-    assert response.status_code == 200, f"Failed to create customer: {response.text}"
-    customer_id = response.json()['id']
-    print(f"\nCreated customer {customer_id} for test")
-    
-    yield customer_id # Provide the customer ID to the test
-    
-    # Teardown: Delete Customer
-    print(f"\nDeleting customer {customer_id} after test")
-    delete_response = requests.delete(f"{customer_url}/{customer_id}", headers=HEADERS)
-    # Allow 404 if deleted during test, otherwise expect 200
-    assert delete_response.status_code in [200, 404], f"Failed to delete customer: {delete_response.text}"
-    print(f"Deleted customer {customer_id}")
+def create_customer_fixture(customer_lease):
+    """Fixture that leases a pooled customer; the pool deletes it at session end."""
+    print(f"\nLeased customer {customer_lease.customer_id} for test")
+    yield customer_lease.customer_id
 
 @pytest.fixture(scope="function")
-def create_customer_and_card_fixture(create_customer_fixture):
-    """Fixture that creates a customer and a card, yielding their IDs."""
-    customer_id = create_customer_fixture
-    card_url = f'{BASE_URL}/customers/{customer_id}/sources'
-    card_data = {'source': 'tok_visa'} # Use a standard Stripe test token
-    
-    response = requests.post(card_url, headers=HEADERS, data=card_data)
-    assert response.status_code == 200, f"Failed to create card for customer {customer_id}: {response.text}"
-    card = response.json()
-    card_id = card['id']
-    print(f"Created card {card_id} for customer {customer_id}")
-    
-    yield customer_id, card_id
-    # Customer deletion is handled by create_customer_fixture teardown
+def create_customer_and_card_fixture(customer_lease):
+    """Fixture that leases a pooled customer and its card, yielding their IDs."""
+    print(f"\nLeased customer {customer_lease.customer_id} with card {customer_lease.card_id} for test")
+    yield customer_lease.customer_id, customer_lease.card_id
 
-def test_create_card_for_customer(create_customer_fixture):
+@pytest.mark.mutates_customer
+def test_create_card_for_customer(stripe_client, create_customer_fixture):
     """Test creating a card source for a given customer."""
     customer_id = create_customer_fixture
-    card_url = f'{BASE_URL}/customers/{customer_id}/sources'
+    card_url = f'/customers/{customer_id}/sources'
     
     # Use a standard Stripe test token
     card_data = {'source': 'tok_visa'}
     
-    response = requests.post(card_url, headers=HEADERS, data=card_data)
+    response = stripe_client.post(card_url, data=card_data)
     print(f"Create card response: {response.status_code} {response.text}")
     assert response.status_code == 200
     
@@ -74,12 +41,12 @@ def test_create_card_for_customer(create_customer_fixture):
     assert body['brand'] == 'Visa'
     print(f"Successfully created card {body['id']} for customer {customer_id}")
 
-def test_retrieve_card(create_customer_and_card_fixture):
+def test_retrieve_card(stripe_client, create_customer_and_card_fixture):
     """Test retrieving a specific card for a customer."""
     customer_id, card_id = create_customer_and_card_fixture
-    retrieve_url = f'{BASE_URL}/customers/{customer_id}/sources/{card_id}'
+    retrieve_url = f'/customers/{customer_id}/sources/{card_id}'
     
-    response = requests.get(retrieve_url, headers=HEADERS)
+    response = stripe_client.get(retrieve_url)
     print(f"Retrieve card response: {response.status_code} {response.text}")
     assert response.status_code == 200
     
@@ -89,36 +56,35 @@ def test_retrieve_card(create_customer_and_card_fixture):
     assert body['customer'] == customer_id
     assert body['last4'] == '4242'
 
-def test_list_cards_for_customer(create_customer_and_card_fixture):
+def test_list_cards_for_customer(stripe_client, create_customer_and_card_fixture):
     """Test listing all cards associated with a customer."""
     customer_id, card_id = create_customer_and_card_fixture
-    list_url = f'{BASE_URL}/customers/{customer_id}/sources'
+    list_url = f'/customers/{customer_id}/sources'
     params = {'object': 'card'} # Filter to only list cards
-    
-    response = requests.get(list_url, headers=HEADERS, params=params)
-    print(f"List cards response: {response.status_code} {response.text}")
-    assert response.status_code == 200
-    
-    body = response.json()
-    assert body['object'] == 'list'
-    assert 'data' in body
-    assert len(body['data']) >= 1
-    
+
+    # Walk every page rather than trusting the card to be on the first one
+    card_ids_in_list = []
+    for page in pages(stripe_client, list_url, params):
+        assert all(card['object'] == 'card' for card in page)
+        card_ids_in_list.extend(card['id'] for card in page)
+    print(f"Listed {len(card_ids_in_list)} cards for customer {customer_id}")
+    assert len(card_ids_in_list) >= 1
+
     # Check if the created card is in the list
-    card_ids_in_list = [card['id'] for card in body['data']]
     assert card_id in card_ids_in_list
     print(f"Found card {card_id} in list for customer {customer_id}")
 
-def test_update_card(create_customer_and_card_fixture):
+@pytest.mark.mutates_customer
+def test_update_card(stripe_client, create_customer_and_card_fixture):
     """Test updating a card's metadata (e.g., name)."""
     customer_id, card_id = create_customer_and_card_fixture
-    update_url = f'{BASE_URL}/customers/{customer_id}/sources/{card_id}'
+    update_url = f'/customers/{customer_id}/sources/{card_id}'
     update_data = {
         'name': 'Updated Test Card Name',
         'metadata[test_key]': 'test_value' # Example metadata
     }
     
-    response = requests.post(update_url, headers=HEADERS, data=update_data)
+    response = stripe_client.post(update_url, data=update_data)
     print(f"Update card response: {response.status_code} {response.text}")
     assert response.status_code == 200
     
@@ -128,12 +94,13 @@ def test_update_card(create_customer_and_card_fixture):
     assert body['metadata']['test_key'] == 'test_value'
     print(f"Successfully updated card {card_id}")
 
-def test_delete_card(create_customer_and_card_fixture):
+@pytest.mark.mutates_customer
+def test_delete_card(stripe_client, create_customer_and_card_fixture):
     """Test deleting a card from a customer."""
     customer_id, card_id = create_customer_and_card_fixture
-    delete_url = f'{BASE_URL}/customers/{customer_id}/sources/{card_id}'
+    delete_url = f'/customers/{customer_id}/sources/{card_id}'
     
-    response = requests.delete(delete_url, headers=HEADERS)
+    response = stripe_client.delete(delete_url)
     print(f"Delete card response: {response.status_code} {response.text}")
     assert response.status_code == 200
     
@@ -143,21 +110,21 @@ def test_delete_card(create_customer_and_card_fixture):
     print(f"Successfully marked card {card_id} as deleted")
     
     # Verify the card is gone (retrieve should fail)
-    retrieve_url = f'{BASE_URL}/customers/{customer_id}/sources/{card_id}'
-    get_response = requests.get(retrieve_url, headers=HEADERS)
+    retrieve_url = f'/customers/{customer_id}/sources/{card_id}'
+    get_response = stripe_client.get(retrieve_url)
     print(f"Post-delete retrieve response: {get_response.status_code} {get_response.text}")
     assert get_response.status_code == 404 # Expect Not Found
     print(f"Verified card {card_id} is no longer retrievable.")
 
 # --- Negative Functional Tests ---
 
-def test_create_card_invalid_token(create_customer_fixture):
+def test_create_card_invalid_token(stripe_client, create_customer_fixture):
     """Test creating a card with an invalid token fails correctly."""
     customer_id = create_customer_fixture
-    card_url = f'{BASE_URL}/customers/{customer_id}/sources'
+    card_url = f'/customers/{customer_id}/sources'
     card_data = {'source': 'tok_invalid'} # Invalid token
     
-    response = requests.post(card_url, headers=HEADERS, data=card_data)
+    response = stripe_client.post(card_url, data=card_data)
     print(f"Create card invalid token response: {response.status_code} {response.text}")
     assert response.status_code == 400 # Expect Bad Request or similar client error
     body = response.json()
@@ -165,13 +132,13 @@ def test_create_card_invalid_token(create_customer_fixture):
     assert body['error'].get('code') == 'resource_missing' # Stripe often says token doesn't exist
     assert body['error'].get('param') == 'source'
 
-def test_create_card_non_existent_customer():
+def test_create_card_non_existent_customer(stripe_client):
     """Test creating a card for a customer ID that does not exist."""
     customer_id = 'cus_nonexistent'
-    card_url = f'{BASE_URL}/customers/{customer_id}/sources'
+    card_url = f'/customers/{customer_id}/sources'
     card_data = {'source': 'tok_visa'}
     
-    response = requests.post(card_url, headers=HEADERS, data=card_data)
+    response = stripe_client.post(card_url, data=card_data)
     print(f"Create card non-existent customer response: {response.status_code} {response.text}")
     assert response.status_code == 400 # Stripe returns 400 for missing customer on card creation
     error_data = response.json()['error']
@@ -179,13 +146,13 @@ def test_create_card_non_existent_customer():
     assert error_data['param'] == 'customer'
     assert customer_id in error_data['message']
 
-def test_retrieve_non_existent_card(create_customer_fixture):
+def test_retrieve_non_existent_card(stripe_client, create_customer_fixture):
     """Test retrieving a card ID that does not exist for a valid customer."""
     customer_id = create_customer_fixture
     card_id = 'card_nonexistent'
-    retrieve_url = f'{BASE_URL}/customers/{customer_id}/sources/{card_id}'
+    retrieve_url = f'/customers/{customer_id}/sources/{card_id}'
     
-    response = requests.get(retrieve_url, headers=HEADERS)
+    response = stripe_client.get(retrieve_url)
     print(f"Retrieve non-existent card response: {response.status_code} {response.text}")
     assert response.status_code == 404 # Expect Not Found
     body = response.json()
@@ -193,27 +160,27 @@ def test_retrieve_non_existent_card(create_customer_fixture):
     assert body['error'].get('code') == 'resource_missing'
     assert 'No such source' in body['error'].get('message', '') # Check message for source
 
-def test_update_non_existent_card(create_customer_fixture):
+def test_update_non_existent_card(stripe_client, create_customer_fixture):
     """Test updating a card ID that does not exist for a valid customer."""
     customer_id = create_customer_fixture
     card_id = 'card_nonexistent'
-    update_url = f'{BASE_URL}/customers/{customer_id}/sources/{card_id}'
+    update_url = f'/customers/{customer_id}/sources/{card_id}'
     update_data = {'name': 'Trying to update non-existent'}
     
-    response = requests.post(update_url, headers=HEADERS, data=update_data)
+    response = stripe_client.post(update_url, data=update_data)
     print(f"Update non-existent card response: {response.status_code} {response.text}")
     assert response.status_code == 404 # Expect Not Found
     body = response.json()
     assert 'error' in body
     assert body['error'].get('code') == 'resource_missing'
 
-def test_delete_non_existent_card(create_customer_fixture):
+def test_delete_non_existent_card(stripe_client, create_customer_fixture):
     """Test deleting a card ID that does not exist for a valid customer."""
     customer_id = create_customer_fixture
     card_id = 'card_nonexistent'
-    delete_url = f'{BASE_URL}/customers/{customer_id}/sources/{card_id}'
+    delete_url = f'/customers/{customer_id}/sources/{card_id}'
     
-    response = requests.delete(delete_url, headers=HEADERS)
+    response = stripe_client.delete(delete_url)
     print(f"Delete non-existent card response: {response.status_code} {response.text}")
     assert response.status_code == 404 # Expect Not Found
     body = response.json()
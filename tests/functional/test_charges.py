@@ -1,6 +1,6 @@
-import requests
 import pytest
-import os
+
+from harness.resources import ApiError
 
 @pytest.mark.parametrize("amount,expected_status", [
     (1000, 200),  # valid
@@ -8,32 +8,29 @@ import os
     (-500, 400),  # negative
     (999999999, 400)  # too high (Stripe will likely reject it)
 ])
-def test_charge_with_varied_amounts(stripe_headers, amount, expected_status):
-    base_url = os.getenv("BASE_URL")
+def test_charge_with_varied_amounts(stripe_api, amount, expected_status):
     data = {
         "amount": amount,
         "currency": "usd",
         "source": "tok_visa",
         "description": "Charge from PyTest"
     }
-    response = requests.post(f"{base_url}/charges", headers=stripe_headers, data=data)
-    assert response.status_code == expected_status
-    body = response.json()
     if expected_status == 200:
+        body = stripe_api.charges.create(**data)
         assert body["object"] == "charge"
         assert body["amount"] == amount
         assert body["currency"] == "usd"
         assert body["status"] == "succeeded"
     else:
-        print("Failed response: ", body)
-        # Check that the response body contains an error object
-        assert "error" in body
-        assert "message" in body["error"] # Further check for a message
+        with pytest.raises(ApiError) as excinfo:
+            stripe_api.charges.create(**data)
+        print("Failed response: ", excinfo.value.error)
+        assert excinfo.value.status == expected_status
+        assert excinfo.value.message # Further check for a message
 
 @pytest.mark.parametrize("missing_param", ["amount", "currency", "source"])
-def test_charge_missing_parameters(stripe_headers, missing_param):
+def test_charge_missing_parameters(stripe_api, missing_param):
     """Test creating a charge with missing required parameters."""
-    base_url = os.getenv("BASE_URL")
     data = {
         "amount": 1000,
         "currency": "usd",
@@ -43,19 +40,18 @@ def test_charge_missing_parameters(stripe_headers, missing_param):
     # Remove the parameter being tested
     del data[missing_param]
 
-    response = requests.post(f"{base_url}/charges", headers=stripe_headers, data=data)
-    assert response.status_code == 400  # Expect Bad Request
+    with pytest.raises(ApiError) as excinfo:
+        stripe_api.charges.create(**data)
+    assert excinfo.value.status == 400  # Expect Bad Request
 
-    body = response.json()
-    assert "error" in body
-    assert "message" in body["error"]
+    error = excinfo.value
+    assert error.message
     # Check if the error message mentions the missing parameter
-    assert missing_param in body["error"].get("param", "") or missing_param in body["error"].get("message", "")
-    print(f"Validated missing parameter: {missing_param}, Error: {body['error']}")
+    assert missing_param in (error.param or "") or missing_param in error.message
+    print(f"Validated missing parameter: {missing_param}, Error: {error.error}")
 
-def test_charge_invalid_currency(stripe_headers):
+def test_charge_invalid_currency(stripe_api):
     """Test creating a charge with an invalid currency code."""
-    base_url = os.getenv("BASE_URL")
     data = {
         "amount": 1000,
         "currency": "XYZ",  # Invalid currency code
@@ -63,22 +59,19 @@ def test_charge_invalid_currency(stripe_headers):
         "description": "Charge invalid currency test"
     }
 
-    response = requests.post(f"{base_url}/charges", headers=stripe_headers, data=data)
-    assert response.status_code == 400  # Expect Bad Request
-
-    body = response.json()
-    assert "error" in body
-    assert "message" in body["error"]
-    assert body["error"].get("param") == "currency"
-    print(f"Validated invalid currency, Error: {body['error']}")
+    with pytest.raises(ApiError) as excinfo:
+        stripe_api.charges.create(**data)
+    assert excinfo.value.status == 400  # Expect Bad Request
+    assert excinfo.value.message
+    assert excinfo.value.param == "currency"
+    print(f"Validated invalid currency, Error: {excinfo.value.error}")
 
 @pytest.mark.parametrize("token, expected_error_code", [
     ("tok_chargeDeclined", "card_declined"),
     ("tok_chargeDeclinedInsufficientFunds", "card_declined") # Stripe often returns generic card_declined even for insufficient funds in test mode
 ])
-def test_charge_declined_tokens(stripe_headers, token, expected_error_code):
+def test_charge_declined_tokens(stripe_api, token, expected_error_code):
     """Test creating a charge with tokens that simulate declines."""
-    base_url = os.getenv("BASE_URL")
     data = {
         "amount": 2000, # Use a different amount to avoid identical requests
         "currency": "usd",
@@ -86,13 +79,11 @@ def test_charge_declined_tokens(stripe_headers, token, expected_error_code):
         "description": f"Charge decline test ({token})"
     }
 
-    response = requests.post(f"{base_url}/charges", headers=stripe_headers, data=data)
-    assert response.status_code == 402  # Payment Required is the typical code for declines
-
-    body = response.json()
-    assert "error" in body
-    assert "message" in body["error"]
-    assert body["error"].get("code") == expected_error_code
+    with pytest.raises(ApiError) as excinfo:
+        stripe_api.charges.create(**data)
+    assert excinfo.value.status == 402  # Payment Required is the typical code for declines
+    assert excinfo.value.message
+    assert excinfo.value.code == expected_error_code
     # Note: Stripe might sometimes return a more specific decline_code like 'insufficient_funds'
-    # assert body["error"].get("decline_code") == expected_decline_code
-    print(f"Validated declined token: {token}, Error: {body['error']}")
\ No newline at end of file
+    # assert excinfo.value.error.get("decline_code") == expected_decline_code
+    print(f"Validated declined token: {token}, Error: {excinfo.value.error}")
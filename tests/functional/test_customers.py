@@ -1,54 +1,40 @@
-import requests
 import pytest
-import os
+
+from harness.resources import ApiError
 
 @pytest.mark.parametrize("email,name", [
     ("param1@example.com", "Param One"),
     ("param2@example.com", "Param Two"),
     ("param3@example.com", "Param Three")
 ])
-def test_create_customer_param(stripe_headers, email, name):
-    base_url = os.getenv("BASE_URL")
-    data = {
-        "email": email,
-        "name": name
-    }
-    response = requests.post(f"{base_url}/customers", headers=stripe_headers, data=data)
-    assert response.status_code == 200
-    body = response.json()
+def test_create_customer_param(stripe_api, email, name):
+    body = stripe_api.customers.create(email=email, name=name)
     assert body["email"] == email
     assert body["name"] == name
 
-def test_get_non_existent_customer(stripe_headers):
+def test_get_non_existent_customer(stripe_api):
     """Test retrieving a customer ID that does not exist."""
-    base_url = os.getenv("BASE_URL")
     customer_id = "cus_invalid" # Non-existent ID
-    response = requests.get(f"{base_url}/customers/{customer_id}", headers=stripe_headers)
-    assert response.status_code == 404 # Expect Not Found
-    body = response.json()
-    assert "error" in body
-    assert body["error"].get("code") == "resource_missing"
-    print(f"Validated GET non-existent customer, Error: {body['error']}")
+    with pytest.raises(ApiError) as excinfo:
+        stripe_api.customers.retrieve(customer_id)
+    assert excinfo.value.status == 404 # Expect Not Found
+    assert excinfo.value.code == "resource_missing"
+    print(f"Validated GET non-existent customer, Error: {excinfo.value.error}")
 
-def test_update_non_existent_customer(stripe_headers):
+def test_update_non_existent_customer(stripe_api):
     """Test updating a customer ID that does not exist."""
-    base_url = os.getenv("BASE_URL")
     customer_id = "cus_invalid" # Non-existent ID
-    data = {"description": "Updated description for non-existent customer"}
-    response = requests.post(f"{base_url}/customers/{customer_id}", headers=stripe_headers, data=data)
-    assert response.status_code == 404 # Expect Not Found
-    body = response.json()
-    assert "error" in body
-    assert body["error"].get("code") == "resource_missing"
-    print(f"Validated UPDATE non-existent customer, Error: {body['error']}")
+    with pytest.raises(ApiError) as excinfo:
+        stripe_api.customers.update(customer_id, description="Updated description for non-existent customer")
+    assert excinfo.value.status == 404 # Expect Not Found
+    assert excinfo.value.code == "resource_missing"
+    print(f"Validated UPDATE non-existent customer, Error: {excinfo.value.error}")
 
-def test_delete_non_existent_customer(stripe_headers):
+def test_delete_non_existent_customer(stripe_api):
     """Test deleting a customer ID that does not exist."""
-    base_url = os.getenv("BASE_URL")
     customer_id = "cus_invalid" # Non-existent ID
-    response = requests.delete(f"{base_url}/customers/{customer_id}", headers=stripe_headers)
-    assert response.status_code == 404 # Expect Not Found
-    body = response.json()
-    assert "error" in body
-    assert body["error"].get("code") == "resource_missing"
-    print(f"Validated DELETE non-existent customer, Error: {body['error']}")
+    with pytest.raises(ApiError) as excinfo:
+        stripe_api.customers.delete(customer_id)
+    assert excinfo.value.status == 404 # Expect Not Found
+    assert excinfo.value.code == "resource_missing"
+    print(f"Validated DELETE non-existent customer, Error: {excinfo.value.error}")
@@ -0,0 +1,43 @@
+# Generated customer/card/charge payloads sent in concurrent batches and checked against the API's rules
+import pytest
+
+from harness.payloads import SPACES, generate, run_batched, shrink, still_fails
+from harness.settings import current
+
+SETTINGS = current() # loaded once per session by conftest
+
+# Skip all tests in this module if API key is not set
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
+
+EMULATOR_CASES = 500 # per endpoint
+LIVE_CASES = 50 # per endpoint; the live API is paced by --stripe-max-rps
+# The in-process stand-in shares the GIL with the client, so a few requests in flight beat fifty
+EMULATOR_CONCURRENCY = 4
+LIVE_CONCURRENCY = 50
+
+@pytest.fixture(scope="module")
+def batching(pytestconfig, stripe_settings):
+    """Cases per endpoint and requests in flight for this profile."""
+    emulated = stripe_settings.profile == 'emulator'
+    count = pytestconfig.getoption("stripe_generated_cases")
+    if count is None:
+        count = EMULATOR_CASES if emulated else LIVE_CASES
+    return count, EMULATOR_CONCURRENCY if emulated else LIVE_CONCURRENCY
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", list(SPACES))
+async def test_generated_payloads(pytestconfig, async_stripe_client, stripe_client, batching, kind):
+    """Every generated payload gets the status (and blamed param) the API's rules call for."""
+    path = SPACES[kind].path
+    if kind == 'card':
+        path = path.format(customer=stripe_client.post('/customers', data={'description': 'Generated cards'}).json()['id'])
+    count, concurrency = batching
+    payloads = generate(kind, count, seed=pytestconfig.getoption("stripe_seed"))
+
+    failures = await run_batched(async_stripe_client, kind, payloads, path=path, concurrency=concurrency)
+
+    if failures:
+        first = failures[0]
+        minimal = shrink(first.payload, still_fails(stripe_client, kind, path, like=first.problem))
+        pytest.fail(f"{len(failures)} of {len(payloads)} {kind} payloads answered wrongly; "
+                    f"first: {first.problem}\nminimal failing payload: {minimal}")
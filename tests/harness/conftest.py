@@ -0,0 +1,10 @@
+# Fixtures shared by the harness tests
+import pytest
+
+from harness.emulator import StripeEmulator
+
+@pytest.fixture
+def emulator():
+    """A fresh emulator served over HTTP on a free port; ``handle()`` works on it directly too."""
+    with StripeEmulator() as emulator:
+        yield emulator
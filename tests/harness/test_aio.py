@@ -0,0 +1,42 @@
+# Tests for the asyncio client helpers
+import asyncio
+
+import pytest
+
+from harness.aio import AsyncStripeClient, customer_card_charge_chain, run_concurrently
+from harness.emulator import StripeEmulator
+
+@pytest.mark.asyncio
+async def test_run_concurrently_caps_in_flight_work():
+    in_flight = peak = 0
+
+    async def job(index):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return index
+
+    results, elapsed = await run_concurrently(job, 20, concurrency=5)
+    assert results == list(range(20))
+    assert peak == 5
+    assert elapsed >= 0.04
+
+@pytest.mark.asyncio
+async def test_chains_run_against_emulator():
+    with StripeEmulator() as emulator:
+        async with AsyncStripeClient(emulator.api_key, base_url=emulator.base_url) as client:
+            results, _ = await run_concurrently(lambda i: customer_card_charge_chain(client, i), 10)
+    assert [charge['amount'] for _, _, charge in results] == [500 + i for i in range(10)]
+    assert len(emulator.customers) == 0
+
+@pytest.mark.asyncio
+async def test_none_header_drops_the_default_auth():
+    with StripeEmulator() as emulator:
+        async with AsyncStripeClient(emulator.api_key, base_url=emulator.base_url) as client:
+            dropped = await client.get('/customers', headers={'Authorization': None})
+            kept = await client.get('/customers', headers={'Stripe-Version': '2024-06-20'})
+    assert dropped.status_code == 401
+    assert 'did not provide an API key' in dropped.json()['error']['message']
+    assert kept.status_code == 200
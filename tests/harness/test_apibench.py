@@ -0,0 +1,46 @@
+# Tests for the steady-state API benchmark wrapper
+import itertools
+
+from harness.apibench import ApiBenchmark, steady_after
+
+def test_steady_after_skips_the_cold_start():
+    cold = [0.5, 0.2, 0.1]
+    steady = [0.010, 0.011, 0.009, 0.010, 0.012, 0.010, 0.011, 0.010, 0.009, 0.010]
+    assert steady_after(cold + steady, window=3) == len(cold) + 5 # the median shrugs off one cold sample
+    assert steady_after(steady, window=5) == 10
+    assert steady_after([0.1, 0.2, 0.4, 0.8, 1.6, 3.2], window=2) is None
+    assert steady_after([0.1], window=5) is None
+
+def test_warm_up_stops_once_latency_settles(monkeypatch):
+    clock = itertools.count()
+    latencies = iter([50, 20, 10] + [1] * 100) # ticks per call: a cold start, then steady
+    ticks = {'now': 0}
+    monkeypatch.setattr('harness.apibench.time.perf_counter', lambda: ticks['now'])
+
+    def call():
+        ticks['now'] += next(latencies)
+        return next(clock)
+
+    torn_down = []
+    bench = ApiBenchmark(None, min_warmup=3, max_warmup=30, window=3) # warm-up never touches pytest-benchmark
+    samples = bench.warm_up(call, teardown=torn_down.append)
+    assert samples[:3] == [50, 20, 10]
+    assert len(samples) == 3 + 2 * 3 # the cold calls, then two steady windows
+    assert torn_down == list(range(len(samples))) # every warm-up result torn down
+
+def test_min_warmup_is_a_lower_bound(monkeypatch):
+    monkeypatch.setattr('harness.apibench.time.perf_counter', itertools.count().__next__) # every call takes 1 tick
+    bench = ApiBenchmark(None, min_warmup=12, max_warmup=30, window=2)
+    assert len(bench.warm_up(lambda: None)) == 12 + 2 * 2
+
+def test_run_tears_down_every_round(benchmark):
+    created, deleted = [], []
+
+    def create(prefix):
+        created.append(f'{prefix}{len(created)}')
+        return created[-1]
+
+    bench = ApiBenchmark(benchmark, rounds=5, max_warmup=4, window=2)
+    result = bench.run(create, 'cus_', teardown=deleted.append)
+    assert result == created[-1]
+    assert deleted == created # warm-up and timed rounds alike, even under --benchmark-disable
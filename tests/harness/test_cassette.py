@@ -0,0 +1,83 @@
+# Tests for cassette recording and replay
+import pytest
+import requests
+
+from harness.aio import AsyncStripeClient
+from harness.cassette import (
+    Cassette, CassetteMiss, CassetteWriter, RecordingAdapter, RecordingTransport, ReplayAdapter, ReplayTransport,
+    request_key,
+)
+from harness.client import StripeClient
+from harness.emulator import StripeEmulator
+from harness.resources import ApiError, SdkBackend, StripeApi
+
+def session_with(adapter):
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def test_request_key_ignores_host_and_field_order():
+    first = request_key('POST', 'https://api.stripe.com/v1/charges', 'amount=500&currency=usd')
+    second = request_key('post', 'http://127.0.0.1:1234/v1/charges', b'currency=usd&amount=500')
+    assert first == second
+    assert first != request_key('POST', 'https://api.stripe.com/v1/charges', 'amount=501&currency=usd')
+
+def test_cassette_round_trip_replays_in_recorded_order(tmp_path):
+    path = str(tmp_path / 'flow.cassette')
+    with StripeEmulator() as emulator:
+        writer = CassetteWriter(path)
+        adapter = RecordingAdapter(writer, api_key=emulator.api_key)
+        with StripeClient(emulator.api_key, base_url=emulator.base_url, adapter=adapter) as client:
+            recorded = [client.post('/customers', data={'description': 'same body'}).json()['id'] for _ in range(3)]
+            missing = client.get('/customers/cus_missing')
+        writer.close()
+
+    cassette = Cassette(path)
+    assert len(cassette) == 4
+    with StripeClient('sk_test_other', adapter=ReplayAdapter(cassette, api_key='sk_test_other')) as client:
+        replayed = [client.post('/customers', data={'description': 'same body'}).json()['id'] for _ in range(3)]
+        assert replayed == recorded
+        response = client.get('/customers/cus_missing')
+        assert response.status_code == missing.status_code == 404
+        assert response.json()['error']['code'] == 'resource_missing'
+        with pytest.raises(CassetteMiss):
+            client.get('/charges')
+    cassette.close()
+
+@pytest.mark.asyncio
+async def test_async_client_records_and_replays_through_a_transport(tmp_path):
+    path = str(tmp_path / 'async.cassette')
+    with StripeEmulator() as emulator:
+        writer = CassetteWriter(path)
+        transport = RecordingTransport(writer, api_key=emulator.api_key)
+        async with AsyncStripeClient(emulator.api_key, base_url=emulator.base_url, transport=transport) as client:
+            created = (await client.post('/customers', data={'description': 'async'})).json()
+            missing = await client.get(f"/customers/{created['id']}/sources/card_missing")
+        writer.close()
+
+    cassette = Cassette(path)
+    async with AsyncStripeClient('sk_test_other', transport=ReplayTransport(cassette, api_key='sk_test_other')) as client:
+        assert (await client.post('/customers', data={'description': 'async'})).json() == created
+        response = await client.get(f"/customers/{created['id']}/sources/card_missing")
+        assert response.status_code == missing.status_code == 404
+        with pytest.raises(CassetteMiss):
+            await client.get('/charges')
+    cassette.close()
+
+def test_sdk_backend_records_and_replays_through_its_session(tmp_path):
+    path = str(tmp_path / 'sdk.cassette')
+    with StripeEmulator() as emulator:
+        writer = CassetteWriter(path)
+        session = session_with(RecordingAdapter(writer, api_key=emulator.api_key))
+        api = StripeApi(SdkBackend(emulator.api_key, emulator.base_url, session=session))
+        created = api.customers.create(email='sdk@example.com')
+        writer.close()
+
+    cassette = Cassette(path)
+    session = session_with(ReplayAdapter(cassette, api_key='sk_test_other'))
+    api = StripeApi(SdkBackend('sk_test_other', 'https://api.stripe.com/v1', session=session))
+    assert api.customers.create(email='sdk@example.com') == created
+    with pytest.raises(ApiError, match='CassetteMiss'): # the SDK reports it as a network error
+        api.customers.list()
+    cassette.close()
@@ -0,0 +1,62 @@
+# Tests for run tagging, session-end deletion and the orphan sweeper
+import pytest
+
+from harness.cleanup import RUN_TAG, RUN_TAG_FIELD, ObjectTracker, main, sweep
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY
+
+@pytest.fixture
+def client(emulator):
+    with StripeClient(DEFAULT_API_KEY, emulator.base_url) as client:
+        yield client
+
+def test_tracker_tags_creates_without_touching_caller_data():
+    tracker = ObjectTracker('run-1')
+    data = {'email': 'a@example.com'}
+    kwargs = {'data': data}
+    tracker.tag('POST', 'https://api.stripe.com/v1/customers', kwargs)
+    assert kwargs['data'] == {'email': 'a@example.com', RUN_TAG_FIELD: 'run-1'}
+    assert data == {'email': 'a@example.com'}
+
+    kwargs = {'data': {RUN_TAG_FIELD: 'mine'}}
+    tracker.tag('POST', 'https://api.stripe.com/v1/charges', kwargs)
+    assert kwargs['data'] == {RUN_TAG_FIELD: 'mine'}
+    kwargs = {'data': {'source': 'tok_visa'}}
+    tracker.tag('POST', 'https://api.stripe.com/v1/customers/cus_1/sources', kwargs)
+    assert kwargs['data'] == {'source': 'tok_visa'}
+
+def test_tracked_client_deletes_leftovers(emulator):
+    tracker = ObjectTracker('run-2')
+    with StripeClient(DEFAULT_API_KEY, emulator.base_url, tracker=tracker) as client:
+        kept = [client.post('/customers', data={'name': f'c{i}'}).json() for i in range(3)]
+        assert all(customer['metadata'][RUN_TAG] == 'run-2' for customer in kept)
+        assert client.delete(f"/customers/{kept[0]['id']}").status_code == 200
+        assert tracker.customers == {kept[1]['id'], kept[2]['id']}
+
+        assert tracker.delete_all(client) == []
+    assert tracker.deleted == 2
+    assert len(emulator.customers) == 0
+
+def test_sweep_deletes_only_tagged_customers(client, emulator):
+    untagged = client.post('/customers').json()['id']
+    mine = [client.post('/customers', data={RUN_TAG_FIELD: 'old-run'}).json()['id'] for _ in range(5)]
+    other = client.post('/customers', data={RUN_TAG_FIELD: 'other-run'}).json()['id']
+
+    found, failed = sweep(client, run_id='old-run', dry_run=True)
+    assert sorted(found) == sorted(mine) and failed == []
+    assert len(emulator.customers) == 7
+
+    found, failed = sweep(client, run_id='old-run', workers=3)
+    assert sorted(found) == sorted(mine) and failed == []
+    assert set(emulator.customers._objects) == {untagged, other}
+
+    assert sweep(client, older_than=3600) == ([], []) # nothing old enough
+    assert sweep(client)[0] == [other]
+
+def test_sweeper_cli(client, emulator, monkeypatch, capsys):
+    client.post('/customers', data={RUN_TAG_FIELD: 'cli-run'})
+    monkeypatch.setenv('STRIPE_API_KEY', DEFAULT_API_KEY)
+    monkeypatch.setenv('BASE_URL', emulator.base_url)
+    assert main(['--all-runs', '--workers', '2']) == 0
+    assert 'deleted 1 of 1 tagged customers' in capsys.readouterr().out
+    assert len(emulator.customers) == 0
@@ -0,0 +1,49 @@
+# Tests for the pooled StripeClient
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from harness.client import StripeClient
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive so the client can reuse sockets
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = self.headers.get('Authorization', '').encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def echo_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+    server.server_close()
+
+def test_client_resolves_paths_against_base_url():
+    client = StripeClient('sk_test_x', base_url='https://api.stripe.com/v1/')
+    assert client.url('/customers') == 'https://api.stripe.com/v1/customers'
+    assert client.url('charges') == 'https://api.stripe.com/v1/charges'
+    assert client.url('mock://api.stripe.com/v1/charges') == 'mock://api.stripe.com/v1/charges'
+
+def test_client_reuses_keep_alive_connection(echo_server):
+    with StripeClient('sk_test_x', base_url=echo_server) as client:
+        for _ in range(5):
+            response = client.get('/customers')
+            assert response.text == 'Bearer sk_test_x'
+        stats = client.connection_stats()
+    assert stats == {'connections': 1, 'requests': 5, 'reused': 4}
+
+def test_client_header_override_drops_auth(echo_server):
+    with StripeClient('sk_test_x', base_url=echo_server) as client:
+        assert client.get('/customers', headers={'Authorization': None}).text == ''
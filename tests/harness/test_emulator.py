@@ -0,0 +1,132 @@
+# Tests for the local Stripe emulator
+import time
+
+import pytest
+
+from harness.client import StripeClient
+from harness.emulator import EmulatorProcess, Store, StripeEmulator, TokenBucket
+
+AUTH = {'Authorization': 'Bearer sk_test_emulator'}
+
+def test_emulator_rejects_missing_and_invalid_keys(emulator):
+    assert emulator.handle('GET', '/v1/customers')[0] == 401
+    status, body = emulator.handle('GET', '/v1/customers', headers={'Authorization': 'Bearer sk_test_invalidkey'})
+    assert status == 401
+    assert body['error']['type'] == 'invalid_request_error'
+
+def test_emulator_customer_card_charge_flow(emulator):
+    status, customer = emulator.handle('POST', '/v1/customers', body='email=a%40example.com', headers=AUTH)
+    assert status == 200
+    assert customer['id'].startswith('cus_')
+    status, card = emulator.handle('POST', f"/v1/customers/{customer['id']}/sources", body='source=tok_visa', headers=AUTH)
+    assert status == 200
+    assert (card['id'][:5], card['last4'], card['brand']) == ('card_', '4242', 'Visa')
+    status, charge = emulator.handle('POST', '/v1/charges', headers=AUTH,
+                                     body=f"amount=500&currency=usd&customer={customer['id']}")
+    assert status == 200
+    assert charge['id'].startswith('ch_')
+    assert charge['source']['id'] == card['id']
+
+@pytest.mark.parametrize("body,status,code", [
+    ('amount=1000&currency=usd&source=tok_chargeDeclined', 402, 'card_declined'),
+    ('amount=1000&currency=usd&source=tok_invalid', 400, 'resource_missing'),
+    ('amount=10&currency=usd&source=tok_visa', 400, 'amount_too_small'),
+])
+def test_emulator_charge_errors(emulator, body, status, code):
+    response_status, response = emulator.handle('POST', '/v1/charges', body=body, headers=AUTH)
+    assert response_status == status
+    assert response['error']['code'] == code
+
+@pytest.mark.parametrize("path,body,param", [
+    ('/v1/charges', 'amount=1000&currency=usd&source=tok_visa&colour=red', 'colour'),
+    ('/v1/customers', 'card_number=4242', 'card_number'),
+    ('/v1/customers', '&'.join(f'metadata[k{i}]=v' for i in range(51)), 'metadata'),
+    ('/v1/customers', f"metadata[{'k' * 41}]=v", 'metadata'),
+    ('/v1/customers', f"metadata[note]={'v' * 501}", 'metadata[note]'),
+])
+def test_emulator_rejects_unknown_params_and_oversized_metadata(emulator, path, body, param):
+    status, response = emulator.handle('POST', path, body=body, headers=AUTH)
+    assert status == 400
+    assert response['error']['param'] == param
+
+def test_emulator_invalid_email_shape(emulator):
+    status, body = emulator.handle('POST', '/v1/customers', body='email=invalid-email', headers=AUTH)
+    assert status == 400
+    assert body['error']['code'] == 'parameter_invalid_string'
+    assert body['error']['param'] == 'email'
+
+def test_store_pages_newest_first_across_deletions():
+    store = Store()
+    for n in range(200):
+        store.add({'id': f'obj_{n}'})
+    for n in range(0, 150):
+        store.remove(f'obj_{n}')
+    page, has_more = store.page(limit=20)
+    assert [o['id'] for o in page] == [f'obj_{n}' for n in range(199, 179, -1)]
+    assert has_more
+    page, has_more = store.page(limit=50, starting_after='obj_180')
+    assert [o['id'] for o in page] == [f'obj_{n}' for n in range(179, 149, -1)]
+    assert not has_more
+
+def test_token_bucket_refuses_past_burst_and_refills():
+    bucket = TokenBucket(rate=1000, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = bucket.take()
+    assert 0 < wait <= 0.001
+    time.sleep(0.005)
+    assert bucket.take() == 0.0
+
+def test_emulator_admit_answers_429_with_retry_after():
+    emulator = StripeEmulator(rate_limit=1, burst=1)
+    assert emulator.admit() is None
+    status, body, retry_after = emulator.admit()
+    assert status == 429
+    assert body['error']['code'] == 'rate_limit'
+    assert retry_after == 1
+    assert StripeEmulator().admit() is None
+
+def test_emulator_idempotency_key_runs_post_once(emulator):
+    headers = dict(AUTH, **{'Idempotency-Key': 'key-1'})
+    body = 'amount=700&currency=usd&source=tok_visa'
+    first = emulator.handle('POST', '/v1/charges', body=body, headers=headers)
+    assert emulator.handle('POST', '/v1/charges', body=body, headers=headers) == first
+    assert len(emulator.handle('GET', '/v1/charges', headers=AUTH)[1]['data']) == 1
+    status, error = emulator.handle('POST', '/v1/charges', body='amount=800&currency=usd&source=tok_visa', headers=headers)
+    assert status == 400
+    assert error['error']['type'] == 'idempotency_error'
+
+def test_emulator_refunds_never_exceed_the_charge(emulator):
+    charge = emulator.handle('POST', '/v1/charges', body='amount=1000&currency=usd&source=tok_visa', headers=AUTH)[1]
+    status, partial = emulator.handle('POST', '/v1/refunds', body=f"charge={charge['id']}&amount=400", headers=AUTH)
+    assert (status, partial['amount'], partial['status']) == (200, 400, 'succeeded')
+    status, error = emulator.handle('POST', '/v1/refunds', body=f"charge={charge['id']}&amount=700", headers=AUTH)
+    assert (status, error['error']['code']) == (400, 'amount_too_large')
+    rest = emulator.handle('POST', '/v1/refunds', body=f"charge={charge['id']}", headers=AUTH)[1]
+    assert rest['amount'] == 600
+    refunded = emulator.handle('GET', f"/v1/charges/{charge['id']}", headers=AUTH)[1]
+    assert (refunded['amount_refunded'], refunded['refunded']) == (1000, True)
+    status, error = emulator.handle('POST', '/v1/refunds', body=f"charge={charge['id']}", headers=AUTH)
+    assert (status, error['error']['code']) == (400, 'charge_already_refunded')
+    listed = emulator.handle('GET', '/v1/refunds', query=f"charge={charge['id']}", headers=AUTH)[1]
+    assert [refund['id'] for refund in listed['data']] == [rest['id'], partial['id']]
+
+def test_emulator_deleting_a_customer_drops_its_charge_index(emulator):
+    customer = emulator.handle('POST', '/v1/customers', body='email=gone@example.com', headers=AUTH)[1]
+    card = emulator.handle('POST', f"/v1/customers/{customer['id']}/sources", body='source=tok_visa', headers=AUTH)[1]
+    charge = emulator.handle('POST', '/v1/charges', headers=AUTH,
+                             body=f"amount=900&currency=usd&customer={customer['id']}&source={card['id']}")[1]
+    emulator.handle('DELETE', f"/v1/customers/{customer['id']}", headers=AUTH)
+    assert customer['id'] not in emulator.charges_by_customer
+    status, error = emulator.handle('GET', '/v1/charges', f"customer={customer['id']}", headers=AUTH)
+    assert (status, error['error']['code'], error['error']['param']) == (404, 'resource_missing', 'customer')
+    assert emulator.handle('GET', f"/v1/charges/{charge['id']}", headers=AUTH)[0] == 200
+
+def test_emulator_process_serves_over_http_from_a_child_process():
+    with EmulatorProcess(api_key='sk_test_child') as emulator, \
+            StripeClient(emulator.api_key, emulator.base_url) as client:
+        assert 'sk_test_child' not in emulator._process.args # handed over in the environment, not visible in ps
+        created = client.post('/customers', data={'email': 'child@example.com'})
+        assert created.status_code == 200
+        assert client.get(f"/customers/{created.json()['id']}").json()['email'] == 'child@example.com'
+        assert client.get('/customers', headers={'Authorization': 'Bearer sk_test_other'}).status_code == 401
+    assert emulator._process is None
@@ -0,0 +1,61 @@
+# Tests for the fault-injecting proxy
+import random
+import time
+
+import pytest
+import requests
+
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY
+from harness.faultproxy import Fault, FaultProxy, latency, load_faults
+from harness.retry import RetryPolicy
+
+def test_latency_specs():
+    rng = random.Random(1)
+    assert latency(0.05)(rng) == 0.05
+    assert 0.01 <= latency('uniform:0.01,0.02')(rng) <= 0.02
+    samples = sorted(latency('lognormal:0.05,0.5')(rng) for _ in range(2001))
+    assert samples[1000] == pytest.approx(0.05, rel=0.1)
+    with pytest.raises(ValueError, match='Unknown latency distribution'):
+        latency('gamma:1,2')
+
+def test_first_matching_rule_applies_and_bursts_repeat():
+    proxy = FaultProxy('http://127.0.0.1:1/v1', load_faults(
+        '{"POST /v1/charges": {"status": 429, "burst": 2, "burst_every": 5}, "/v1/customers*": {"reset": 1.0}}'))
+    actions = [proxy.plan('POST', '/v1/charges')[1] for _ in range(10)]
+    assert actions == ['error', 'error', 'forward', 'forward', 'forward'] * 2
+    assert proxy.plan('GET', '/v1/customers/cus_1')[1] == 'reset' # no method in the pattern: any method
+    assert proxy.plan('GET', '/v1/charges') == (None, 'forward', 0.0)
+    assert proxy.stats() == {'requests': 12, 'error': 4, 'reset': 1}
+
+def test_injected_errors_look_like_stripe(emulator):
+    faults = [('GET /v1/customers', Fault(status=429, error_rate=1.0, retry_after=1))]
+    with FaultProxy(emulator.base_url, faults) as proxy, StripeClient(DEFAULT_API_KEY, proxy.base_url) as client:
+        throttled = client.get('/customers')
+        created = client.post('/customers', data={'email': 'proxied@example.com'})
+    assert throttled.status_code == 429
+    assert throttled.headers['Retry-After'] == '1'
+    assert throttled.json()['error']['code'] == 'rate_limit'
+    assert created.status_code == 200 # unmatched routes pass through
+    assert emulator.customers.get(created.json()['id']) is not None
+
+@pytest.mark.parametrize('fault', [Fault(reset=0.5), Fault(partial=0.5)])
+def test_dropped_answers_are_retried(emulator, fault):
+    with FaultProxy(emulator.base_url, [('GET /v1/customers', fault)], seed=3) as proxy:
+        with StripeClient(DEFAULT_API_KEY, proxy.base_url) as client:
+            with pytest.raises(requests.RequestException):
+                for _ in range(20):
+                    client.get('/customers')
+        retry = RetryPolicy(max_attempts=10, sleep=lambda seconds: None)
+        with StripeClient(DEFAULT_API_KEY, proxy.base_url, retry=retry) as client:
+            assert all(client.get('/customers').status_code == 200 for _ in range(20))
+    assert retry.stats()['retries'] > 0
+
+def test_slowloris_outlasts_the_read_timeout(emulator):
+    with FaultProxy(emulator.base_url, [('GET /v1/customers', Fault(slowloris=0.02))]) as proxy:
+        with StripeClient(DEFAULT_API_KEY, proxy.base_url, timeout=0.1) as client:
+            start = time.perf_counter()
+            response = client.get('/customers')
+    # No single read waits 0.1s, yet the response takes several times that
+    assert response.status_code == 200
+    assert time.perf_counter() - start > 0.1
@@ -0,0 +1,78 @@
+# Tests for the flow DAG executor
+import asyncio
+
+import pytest
+
+from harness.flows import Flow
+
+def sleeper(seconds, value=None, log=None):
+    async def run(client, results):
+        await asyncio.sleep(seconds)
+        if log is not None:
+            log.append(value)
+        return value
+    return run
+
+def undo(log):
+    async def cleanup(client, result):
+        await asyncio.sleep(0.001)
+        log.append(result)
+    return cleanup
+
+@pytest.mark.asyncio
+async def test_branches_overlap_and_the_longer_one_is_critical():
+    flow = (Flow('diamond')
+            .step('root', sleeper(0.01, 'root'))
+            .step('short', sleeper(0.02, 'short'), after='root')
+            .step('long', sleeper(0.08, 'long'), after='root')
+            .step('join', sleeper(0.01, 'join'), after=('short', 'long')))
+    result = await flow.run(client=None)
+    assert result.critical_path == ['root', 'long', 'join']
+    assert result.critical_latency == pytest.approx(0.10, abs=0.03)
+    assert result.work == pytest.approx(0.12, abs=0.03)
+    assert result.elapsed < result.work # short ran alongside long
+    assert result['join'] == 'join'
+
+@pytest.mark.asyncio
+async def test_steps_see_their_dependencies_results():
+    async def double(client, results):
+        return results['seed'] * 2
+
+    flow = Flow('ids').step('seed', sleeper(0, 21)).step('double', double, after='seed')
+    assert (await flow.run(client=None))['double'] == 42
+
+@pytest.mark.asyncio
+async def test_cleanup_runs_in_reverse_dependency_order():
+    cleaned = []
+    flow = (Flow('cleanup')
+            .step('customer', sleeper(0, 'customer'), cleanup=undo(cleaned))
+            .step('card', sleeper(0, 'card'), after='customer', cleanup=undo(cleaned))
+            .step('charge', sleeper(0, 'charge'), after='card', cleanup=undo(cleaned))
+            .step('other', sleeper(0, 'other'), after='customer', cleanup=undo(cleaned)))
+    await flow.run(client=None)
+    assert cleaned.index('customer') == 3 # last: everything depended on it
+    assert cleaned.index('charge') < cleaned.index('card')
+
+@pytest.mark.asyncio
+async def test_failure_cancels_the_rest_and_cleans_up_what_ran():
+    cleaned, ran = [], []
+
+    async def boom(client, results):
+        raise RuntimeError('card declined')
+
+    flow = (Flow('failing')
+            .step('customer', sleeper(0, 'customer', ran), cleanup=undo(cleaned))
+            .step('bad', boom, after='customer', cleanup=undo(cleaned))
+            .step('slow', sleeper(0.5, 'slow', ran), after='customer', cleanup=undo(cleaned))
+            .step('after_bad', sleeper(0, 'after_bad', ran), after='bad'))
+    with pytest.raises(RuntimeError, match='card declined'):
+        await flow.run(client=None)
+    assert ran == ['customer']
+    assert cleaned == ['customer']
+
+def test_steps_must_depend_on_declared_steps():
+    flow = Flow('bad').step('a', sleeper(0))
+    with pytest.raises(ValueError, match='undeclared'):
+        flow.step('b', sleeper(0), after=('a', 'missing'))
+    with pytest.raises(ValueError, match='Duplicate'):
+        flow.step('a', sleeper(0))
@@ -0,0 +1,58 @@
+# Tests for the benchmark history store and regression check
+import random
+
+import pytest
+
+from harness.history import History, compare, histogram_samples, mann_whitney_greater, weighted_median
+from harness.load import LatencyHistogram
+
+def latencies(seed, scale, n=200):
+    rng = random.Random(seed)
+    return [(round(rng.lognormvariate(0, 0.2) * scale, 6), 1) for _ in range(n)]
+
+def test_mann_whitney_matches_known_values():
+    # Every current sample above every baseline sample: U is n1 * n2
+    assert mann_whitney_greater([(v, 1) for v in range(10, 20)], [(v, 1) for v in range(10)]) < 1e-3
+    assert mann_whitney_greater([(v, 1) for v in range(10)], [(v, 1) for v in range(10, 20)]) > 0.999
+    # Weights count like repeated samples
+    expanded = mann_whitney_greater([(1, 1)] * 5 + [(3, 1)] * 5, [(2, 1)] * 10)
+    assert mann_whitney_greater([(1, 5), (3, 5)], [(2, 10)]) == pytest.approx(expanded)
+    assert mann_whitney_greater([(1, 10)], [(1, 10)]) == 1.0 # all tied
+
+def test_compare_flags_real_slowdowns_only():
+    baseline = latencies(1, 0.05)
+    assert not compare(latencies(2, 0.05), baseline)[1]
+    assert compare(latencies(3, 0.07), baseline)[1]
+    # One very slow sample moves neither the ranks nor the median much
+    assert not compare(latencies(2, 0.05) + [(10.0, 1)], baseline)[1]
+    # Significant but under the threshold
+    assert not compare(latencies(4, 0.052, n=5000), latencies(5, 0.05, n=5000), threshold=0.1)[1]
+    # Too few samples for a verdict
+    assert compare([(1.0, 3)], [(0.1, 3)]) == (1.0, False)
+
+def test_histogram_samples_keep_counts_and_median():
+    histogram = LatencyHistogram()
+    for n in range(1, 1001):
+        histogram.record(n / 1000)
+    samples = histogram_samples(histogram)
+    assert sum(count for _, count in samples) == 1000
+    assert weighted_median(samples) == pytest.approx(histogram.percentile(50))
+
+def test_history_pools_recent_runs_as_baseline(tmp_path):
+    history = History(str(tmp_path / 'history.sqlite'), 'emulator', commit='abc')
+    for run in range(7):
+        history.record(f'run{run}', 'test_a', 'create_card', 'load', latencies(run, 0.05))
+    history.record('slow', 'test_a', 'create_card', 'load', latencies(99, 0.08))
+    history.record('slow', 'test_b', 'list_cards', 'load', latencies(98, 0.05)) # no baseline yet
+    runs, pooled = history.baseline('slow', 'test_a', 'create_card', runs=5)
+    assert runs == 5
+    assert sum(count for _, count in pooled) == 1000
+    [row] = history.evaluate('slow', runs=5)
+    assert (row.test, row.endpoint, row.regressed) == ('test_a', 'create_card', True)
+    assert row.change > 0.3
+    assert not history.evaluate('run6', runs=5)[0].regressed
+    history.close()
+    # Other environments keep their own baselines
+    other = History(str(tmp_path / 'history.sqlite'), 'live', commit='abc')
+    assert other.baseline('slow', 'test_a', 'create_card') == (0, [])
+    other.close()
@@ -0,0 +1,52 @@
+# Tests for the load engine and latency histogram
+import random
+
+import pytest
+
+from harness.load import LatencyHistogram, run_load
+
+def test_histogram_percentiles_stay_within_precision():
+    histogram = LatencyHistogram()
+    samples = sorted(random.Random(7).expovariate(1 / 0.05) for _ in range(20000))
+    for sample in samples:
+        histogram.record(sample)
+    for percent in (50, 90, 99, 99.9):
+        exact = samples[int(percent / 100 * len(samples)) - 1]
+        assert histogram.percentile(percent) == pytest.approx(exact, rel=0.01, abs=2e-6)
+
+def test_histogram_merge_matches_single_histogram():
+    left, right, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for n in range(1, 1000):
+        (left if n % 2 else right).record(n / 1000)
+        both.record(n / 1000)
+    left.merge(right)
+    assert left.count == both.count
+    assert left.percentile(99) == both.percentile(99)
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+@pytest.mark.asyncio
+async def test_open_loop_holds_arrival_rate_and_counts_errors():
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        return FakeResponse(500 if calls % 4 == 0 else 200)
+
+    result = await run_load(send, duration=0.5, concurrency=5, rate=100)
+    assert result.mode == 'open'
+    assert result.requests == 50
+    assert result.error_rate == pytest.approx(0.24, abs=0.02)
+
+@pytest.mark.asyncio
+async def test_closed_loop_records_exceptions_as_errors():
+    async def send():
+        raise ConnectionError()
+
+    result = await run_load(send, duration=0.05, concurrency=2)
+    assert result.requests > 0
+    assert result.error_rate == 1.0
+    assert set(result.statuses) == {'ConnectionError'}
@@ -0,0 +1,46 @@
+# Tests for the declarative mock spec and its route table
+import pytest
+import requests
+import requests_mock
+
+from harness.mockspec import ERRORS, ROUTES, RouteTable
+
+def test_every_route_round_trips_through_the_table():
+    table = RouteTable()
+    for name in ROUTES:
+        url = table.url(name, customer='cus_A1', card='card_B2', charge='ch_C3')
+        route, params = table.lookup(table.routes[name].method, url + '?limit=3')
+        assert route.name == name
+        assert set(params) <= {'customer', 'card', 'charge'}
+    assert table.lookup('GET', 'https://api.stripe.com/v1/refunds') == (None, None)
+    assert table.lookup('GET', 'https://example.com/v1/customers') == (None, None)
+    assert table.lookup('PATCH', table.url('customers.retrieve', customer='cus_1')) == (None, None)
+
+def test_unstubbed_routes_render_the_spec_body(stripe_mock):
+    customer = requests.post(stripe_mock.url('customers.update', customer='cus_CaseKept'),
+                             data={'email': 'a@example.com', 'metadata[k]': 'v', 'id': 'cus_forged'}).json()
+    assert (customer['id'], customer['email'], customer['metadata']) == ('cus_CaseKept', 'a@example.com', {})
+
+    charge = requests.post(stripe_mock.url('charges.create'), data={'amount': '2500', 'currency': 'eur'}).json()
+    assert (charge['amount'], charge['currency'], charge['status']) == (2500, 'eur', 'succeeded')
+    assert requests.get(stripe_mock.url('charges.list')).json()['data'][0]['object'] == 'charge'
+    assert stripe_mock.calls == {'customers.update': 1, 'charges.create': 1, 'charges.list': 1}
+
+def test_stub_sequences_repeat_their_last_response(stripe_mock):
+    stripe_mock.stub('customers.retrieve', {'error': 'api_error'}, {'status': 200, 'body': {'name': 'Back'}})
+    url = stripe_mock.url('customers.retrieve', customer='cus_1')
+    assert [requests.get(url).status_code for _ in range(3)] == [ERRORS['api_error'][0], 200, 200]
+    assert requests.get(url).json()['name'] == 'Back'
+
+    stripe_mock.stub('customers.retrieve', error='resource_missing', status=410, body={'param': 'customer'})
+    error = requests.get(url).json()['error']
+    assert requests.get(url).status_code == 410
+    assert (error['message'], error['param']) == ('No such customer: cus_1', 'customer')
+
+def test_unknown_routes_and_variants_fail_loudly(stripe_mock):
+    with pytest.raises(KeyError, match='Unknown route'):
+        stripe_mock.stub('refunds.create')
+    with pytest.raises(KeyError, match='Unknown error variant'):
+        stripe_mock.stub('charges.create', {'error': 'nope'})
+    with pytest.raises(requests_mock.NoMockAddress):
+        requests.get('https://api.stripe.com/v1/refunds')
@@ -0,0 +1,83 @@
+# Tests for the fast JSON decoding and lazy object views
+import asyncio
+import json
+
+import pytest
+import requests
+
+from harness import models
+from harness.aio import AsyncStripeClient
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY, StripeEmulator
+from harness.models import Card, Charge, Customer, Error, LazyList, ListObject, StripeResponse, wrap
+
+CHARGE = {
+    'id': 'ch_1', 'object': 'charge', 'amount': 500, 'status': 'succeeded', 'metadata': {'k': 'v'},
+    'outcome': {'network_status': 'approved_by_network'},
+    'source': {'id': 'card_1', 'object': 'card', 'last4': '4242'},
+}
+
+@pytest.fixture
+def emulator_url():
+    with StripeEmulator() as emulator:
+        yield emulator.base_url
+
+def make_response(body, status=200):
+    response = StripeResponse()
+    response.status_code = status
+    response._content = body if isinstance(body, bytes) else json.dumps(body).encode()
+    response.encoding = 'utf-8'
+    return response
+
+def test_views_read_like_the_decoded_dicts():
+    charge = wrap(json.loads(json.dumps(CHARGE)))
+    assert isinstance(charge, Charge) and charge.succeeded
+    assert charge == CHARGE and dict(charge) == dict(CHARGE)
+    assert (charge['id'], charge.amount, charge.get('missing', 'x')) == ('ch_1', 500, 'x')
+    assert isinstance(charge['source'], Card) and charge.source.last4 == '4242'
+    assert type(charge['metadata']) is dict and charge['outcome'] == CHARGE['outcome']
+    assert 'source' in charge and 'refunds' not in charge
+    with pytest.raises(AttributeError):
+        charge.refunds
+    assert not hasattr(charge, '__dict__') # __slots__ only
+
+def test_nested_views_are_built_once_on_first_read():
+    charge = wrap(dict(CHARGE))
+    assert charge._cache is None
+    assert charge['source'] is charge['source']
+    assert list(charge._cache) == ['source']
+
+def test_lists_and_errors():
+    body = wrap({'object': 'list', 'has_more': False, 'data': [{'id': 'cus_1', 'object': 'customer'}, {'id': 'cus_2', 'object': 'customer'}]})
+    assert isinstance(body, ListObject) and isinstance(body['data'], LazyList)
+    assert body['data']._views == [None, None]
+    assert isinstance(body['data'][-1], Customer) and body['data'][-1]['id'] == 'cus_2'
+    assert [c['id'] for c in body['data']] == ['cus_1', 'cus_2'] and len(body['data']) == 2
+
+    error = wrap({'error': {'type': 'card_error', 'code': 'card_declined', 'message': 'Declined'}})
+    assert isinstance(error['error'], Error)
+    assert error['error'].get('code') == 'card_declined' and error.error.type == 'card_error'
+
+@pytest.mark.parametrize("backend", ['orjson', 'json'])
+def test_stripe_response_json_with_either_backend(monkeypatch, backend):
+    if backend == 'orjson' and models.orjson is None:
+        pytest.skip('orjson not installed')
+    if backend == 'json':
+        monkeypatch.setattr(models, 'orjson', None)
+    assert make_response(CHARGE).json() == CHARGE
+    assert make_response(CHARGE).json(parse_float=str) == CHARGE # decoder kwargs use requests' path
+    with pytest.raises(requests.exceptions.JSONDecodeError):
+        make_response(b'<html>bad gateway</html>', 502).json()
+
+def test_clients_return_views(emulator_url):
+    with StripeClient(DEFAULT_API_KEY, emulator_url) as client:
+        customer = client.post('/customers', data={'email': 'v@example.com'}).json()
+        assert isinstance(customer, Customer) and customer.email == 'v@example.com'
+        assert isinstance(client.get('/customers/cus_missing').json()['error'], Error)
+
+    async def run():
+        async with AsyncStripeClient(DEFAULT_API_KEY, emulator_url) as client:
+            return (await client.get('/customers')).json()
+
+    body = asyncio.run(run())
+    assert isinstance(body, ListObject) and body['data'][0]['id'] == customer['id']
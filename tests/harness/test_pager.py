@@ -0,0 +1,51 @@
+# Tests for the lazy list pager
+import asyncio
+
+import pytest
+
+from harness.aio import AsyncStripeClient
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY
+from harness.pager import apaginate, pages, paginate
+
+AUTH = {'Authorization': f'Bearer {DEFAULT_API_KEY}'}
+
+@pytest.fixture(autouse=True)
+def customers(emulator):
+    for i in range(25):
+        emulator.handle('POST', '/v1/customers', body=f'name=c{i}', headers=AUTH)
+
+@pytest.fixture
+def client(emulator):
+    with StripeClient(DEFAULT_API_KEY, emulator.base_url) as client:
+        yield client
+
+def newest_first(emulator):
+    return [customer['id'] for customer in reversed(list(emulator.customers))]
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_paginate_follows_has_more(client, emulator, prefetch):
+    ids = [customer['id'] for customer in paginate(client, '/customers', page_size=10, prefetch=prefetch)]
+    assert ids == newest_first(emulator)
+    assert [len(page) for page in pages(client, '/customers', page_size=10, prefetch=prefetch)] == [10, 10, 5]
+
+def test_paginate_is_lazy(client, emulator):
+    sent = []
+    client.throttle = lambda: sent.append(1)
+    first = next(paginate(client, '/customers', page_size=10, prefetch=False))
+    assert first['id'] == newest_first(emulator)[0]
+    assert len(sent) == 1
+
+def test_paginate_passes_params_and_kwargs(client, emulator):
+    emulator.handle('POST', '/v1/customers', body='email=x%40example.com', headers=AUTH)
+    found = list(paginate(client, '/customers', {'email': 'x@example.com'}, headers={'Stripe-Version': '2020-08-27'}))
+    assert [customer['email'] for customer in found] == ['x@example.com']
+    with pytest.raises(AssertionError, match='Failed to list'):
+        list(paginate(client, '/customers', headers={'Authorization': None}))
+
+def test_apaginate(emulator):
+    async def run(prefetch):
+        async with AsyncStripeClient(DEFAULT_API_KEY, emulator.base_url) as client:
+            return [c['id'] async for c in apaginate(client, '/customers', page_size=7, prefetch=prefetch)]
+
+    assert asyncio.run(run(True)) == asyncio.run(run(False)) == newest_first(emulator)
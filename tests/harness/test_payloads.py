@@ -0,0 +1,76 @@
+# Tests for the payload generator, its rules and the shrinker
+import asyncio
+
+from harness import emulator as emulator_module
+from harness.aio import AsyncStripeClient
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY, MAX_AMOUNT
+from harness.models import wrap
+from harness.payloads import (
+    SPACES, Expectation, check, expect_card, expect_charge, expect_customer, generate, run_batched, shrink,
+    still_fails,
+)
+
+def test_generation_is_seeded_distinct_and_broad():
+    payloads = generate('charge', 500, seed=7)
+    assert payloads == generate('charge', 500, seed=7) != generate('charge', 500, seed=8)
+    assert len({tuple(sorted(p.items())) for p in payloads}) == 500
+    expectations = [expect_charge(p) for p in payloads]
+    assert {e.status for e in expectations} == {200, 400, 402}
+    blamed = set().union(*(e.faults for e in expectations))
+    assert {'amount', 'currency', 'source', 'metadata'} <= blamed
+    assert any(len(e.faults) > 1 for e in expectations) # combined faults, not just one at a time
+
+def test_rules():
+    valid = {'amount': '1000', 'currency': 'usd', 'source': 'tok_visa'}
+    assert expect_charge(valid) == Expectation(200)
+    assert expect_charge(dict(valid, source='tok_chargeDeclined')) == Expectation(402)
+    assert expect_charge(dict(valid, amount=str(MAX_AMOUNT + 1), colour='x')) == \
+        Expectation(400, frozenset({'amount', 'colour'}))
+    assert expect_customer({'email': 'invalid-email-format'}).faults == {'email'}
+    assert expect_card({'source': 'tok_chargeDeclined'}).faults == {'source'} # declines only show on charges
+    assert expect_card({'source': 'tok_visa', **{f'metadata[k{i}]': 'v' for i in range(60)}}).faults == {'metadata'}
+
+def test_check_reads_views_and_plain_dicts():
+    payload = {'amount': '49', 'currency': 'usd', 'source': 'tok_visa'}
+    error = {'error': {'param': 'amount', 'message': 'Amount must be at least $0.50 usd'}}
+    assert check('charge', payload, 400, error) is None
+    assert check('charge', payload, 400, wrap(error)) is None
+    assert 'blames' in check('charge', payload, 400, {'error': {'param': 'currency', 'message': ''}})
+    assert 'expected 400, got 200' in check('charge', payload, 200, {'amount': 49})
+
+def test_shrink_keeps_only_what_the_failure_needs():
+    payload = {'amount': '777', 'currency': 'eur', 'source': 'tok_visa', 'description': 'x' * 200,
+               **{f'metadata[k{i}]': 'v' for i in range(20)}}
+    calls = []
+
+    def fails(candidate):
+        calls.append(candidate)
+        return candidate.get('currency') == 'eur'
+
+    assert shrink(payload, fails) == {'currency': 'eur'}
+    assert len(calls) < 100
+
+def test_batched_run_finds_and_shrinks_a_rule_break(emulator, monkeypatch):
+    payloads = generate('charge', 300, seed=1)
+
+    async def run():
+        async with AsyncStripeClient(DEFAULT_API_KEY, emulator.base_url) as client:
+            return await run_batched(client, 'charge', payloads, batch_size=64, concurrency=4)
+
+    assert asyncio.run(run()) == []
+
+    monkeypatch.setattr(emulator_module, 'MIN_AMOUNT', 100) # the stand-in now disagrees with the rules
+    payloads.append({'amount': '60', 'currency': 'usd', 'source': 'tok_visa', 'description': 'Generated',
+                     **{f'metadata[k{i}]': 'v' for i in range(5)}})
+    failures = asyncio.run(run())
+    assert failures[-1].payload is payloads[-1] and 'expected 200, got 400' in failures[-1].problem
+    with StripeClient(DEFAULT_API_KEY, emulator.base_url) as client:
+        minimal = shrink(failures[-1].payload, still_fails(client, 'charge', like=failures[-1].problem))
+    assert set(minimal) == {'amount', 'currency', 'source'}
+    assert int(minimal['amount']) < 100
+
+def test_every_space_has_a_path_and_rules():
+    for kind, space in SPACES.items():
+        assert space.path.startswith('/')
+        assert all(isinstance(space.expect(p), Expectation) for p in generate(kind, 50))
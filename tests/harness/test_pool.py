@@ -0,0 +1,33 @@
+# Tests for the pre-provisioned customer pool
+import pytest
+
+from harness.client import StripeClient
+from harness.pool import CustomerPool
+
+@pytest.fixture
+def pool(emulator):
+    with StripeClient(emulator.api_key, base_url=emulator.base_url) as client:
+        pool = CustomerPool(client, workers=4)
+        yield pool
+        pool.close()
+
+def test_pool_fills_concurrently_with_cards(pool, emulator):
+    pool.fill(5)
+    assert len(emulator.customers) == 5
+    lease = pool.lease(with_card=True)
+    assert lease.card_id in emulator.cards_by_customer[lease.customer_id]
+
+def test_shared_leases_are_reused_and_exclusive_ones_are_not(pool):
+    pool.fill(2)
+    shared = pool.lease()
+    pool.release(shared)
+    exclusive = pool.lease(exclusive=True)
+    pool.release(exclusive)
+    assert pool.lease().customer_id == shared.customer_id
+    assert pool.lease().customer_id != exclusive.customer_id # Dry pool creates a fresh one
+
+def test_pool_close_bulk_deletes_everything(pool, emulator):
+    pool.fill(3)
+    pool.lease(exclusive=True)
+    assert pool.close() == []
+    assert len(emulator.customers) == 0
@@ -0,0 +1,57 @@
+# Tests for the rate-limit characterization helpers
+import asyncio
+from types import SimpleNamespace
+
+from harness import ratebench
+from harness.ratebench import RampResult, RateLimitHistory, characterize
+
+def make_result(endpoint, knee):
+    steps = [{'rate': rate, 'requests': rate, 'throttled': 0, 'p99': 0.001} for rate in (80, 90)]
+    steps.append({'rate': knee, 'requests': knee, 'throttled': 5, 'p99': 0.002})
+    return RampResult(endpoint, steps, knee, [1.0], 0.01)
+
+def test_ramp_result_last_clean_rate():
+    assert make_result('/charges', 100).last_clean_rate == 90
+
+def test_history_returns_latest_run_per_endpoint(tmp_path):
+    path = tmp_path / 'history' / 'rate_limits.json'
+    history = RateLimitHistory(str(path))
+    assert history.previous('/charges') is None
+    history.append(make_result('/charges', 100), limit=100)
+    history.append(make_result('/customers', 110), limit=100)
+    history.append(make_result('/charges', 120), limit=100)
+
+    reloaded = RateLimitHistory(str(path))
+    assert len(reloaded.runs) == 3
+    assert reloaded.previous('/charges')['knee'] == 120
+    assert reloaded.previous('/customers')['limit'] == 100
+
+def test_a_stray_429_is_not_the_knee(monkeypatch):
+    state = {'sent': 0, 'rate': None}
+    run_load = ratebench.run_load
+
+    async def tracking(send, duration, **kwargs): # remembers the offered rate of the step in progress
+        state['rate'] = kwargs['rate']
+        try:
+            return await run_load(send, duration, **kwargs)
+        finally:
+            state['rate'] = None
+
+    async def send():
+        state['sent'] += 1
+        # one 429 early in the ramp (over the 1% threshold on its own), then real throttling from 60 req/s
+        throttled = state['sent'] == 12 or (state['rate'] or 0) >= 60
+        return SimpleNamespace(status_code=429 if throttled else 200, headers={'Retry-After': '1'})
+
+    monkeypatch.setattr(ratebench, 'run_load', tracking)
+    result = asyncio.run(characterize(send, '/charges', [40, 50, 60], step_duration=0.25, settle=0))
+    assert [step['throttled'] for step in result.steps] == [1, 0, 15]
+    assert result.knee == 60
+
+def test_recovery_gives_up_on_a_server_that_never_stops_throttling():
+    async def send():
+        return SimpleNamespace(status_code=429, headers={'Retry-After': '0.05'})
+
+    result = asyncio.run(characterize(send, '/charges', [100], step_duration=0.1, settle=0, recovery_limit=4))
+    assert result.knee == 100 and result.retry_after == [0.05]
+    assert result.recovery is None # gave up after 4 x 0.05s instead of polling forever
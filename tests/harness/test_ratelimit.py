@@ -0,0 +1,33 @@
+# Tests for the cross-process token bucket
+import multiprocessing
+import time
+
+from harness.ratelimit import FileTokenBucket
+
+def _drain(path, count):
+    bucket = FileTokenBucket(path, rate=200)
+    for _ in range(count):
+        bucket.acquire()
+    bucket.close()
+
+def test_bucket_spaces_requests_at_the_ceiling(tmp_path):
+    bucket = FileTokenBucket(str(tmp_path / 'bucket'), rate=100)
+    start = time.monotonic()
+    for _ in range(21):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.19
+    usage = bucket.usage()
+    assert usage['requests'] == 21
+    assert usage['rate'] <= 101
+
+def test_bucket_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'bucket')
+    bucket = FileTokenBucket(path, rate=200)
+    workers = [multiprocessing.Process(target=_drain, args=(path, 15)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    usage = bucket.usage()
+    assert usage['requests'] == 60
+    assert usage['rate'] <= 202
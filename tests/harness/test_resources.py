@@ -0,0 +1,51 @@
+# Tests for the resource-level API and its backends
+import pytest
+
+from harness.cleanup import ObjectTracker, RUN_TAG
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY
+from harness.resources import BACKENDS, ApiError, AsyncBackend, RequestsBackend, SdkBackend, StripeApi, encode_form
+
+def make_api(name, base_url, tracker=None):
+    if name == 'requests':
+        return StripeApi(RequestsBackend(StripeClient(DEFAULT_API_KEY, base_url, tracker=tracker)))
+    if name == 'sdk':
+        return StripeApi(SdkBackend(DEFAULT_API_KEY, base_url, tracker=tracker))
+    return StripeApi(AsyncBackend(DEFAULT_API_KEY, base_url, tracker=tracker))
+
+def test_encode_form_flattens_nested_params():
+    assert encode_form({'email': 'a@example.com', 'metadata': {'k': 'v'}, 'expand': ['sources'],
+                        'livemode': False, 'name': None}) == \
+        {'email': 'a@example.com', 'metadata[k]': 'v', 'expand[0]': 'sources', 'livemode': 'false'}
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_agree_on_crud(emulator, backend):
+    tracker = ObjectTracker('run_resources')
+    api = make_api(backend, emulator.base_url, tracker)
+    try:
+        customer = api.customers.create(email='crud@example.com', metadata={'k': 'v'})
+        assert customer['metadata'] == {'k': 'v', RUN_TAG: 'run_resources'}
+        assert tracker.customers == {customer['id']}
+        card = api.cards.create(customer['id'], source='tok_visa')
+        assert api.cards.retrieve(customer['id'], card['id'])['last4'] == '4242'
+        assert [c['id'] for c in api.cards.list(customer['id'])['data']] == [card['id']]
+        charge = api.charges.create(amount=1500, currency='usd', customer=customer['id'])
+        assert api.charges.retrieve(charge['id'])['amount'] == 1500
+        assert api.customers.update(customer['id'], name='Renamed')['name'] == 'Renamed'
+        assert api.customers.delete(customer['id'])['deleted'] is True
+        assert not tracker.customers
+    finally:
+        api.close()
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_raise_the_same_errors(emulator, backend):
+    api = make_api(backend, emulator.base_url)
+    try:
+        with pytest.raises(ApiError) as missing:
+            api.customers.retrieve('cus_missing')
+        with pytest.raises(ApiError) as declined:
+            api.charges.create(amount=1000, currency='usd', source='tok_chargeDeclined')
+    finally:
+        api.close()
+    assert (missing.value.status, missing.value.code) == (404, 'resource_missing')
+    assert (declined.value.status, declined.value.code) == (402, 'card_declined')
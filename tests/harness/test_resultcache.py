@@ -0,0 +1,88 @@
+# Tests for fingerprint-keyed result caching
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from harness import resultcache
+from harness.resultcache import ResultCache, code_digest, collected_at_key, environment_of, module_digest
+from harness.settings import Settings
+
+HOUR = 3600
+
+MODULE = '''
+import pytest
+
+AMOUNT = 1000
+
+def helper():
+    return AMOUNT
+
+def test_charge(stripe_client):
+    assert helper() == 1000
+'''
+
+def test_code_digest_ignores_comments_and_layout():
+    source = 'def test_x(stripe_client):\n    assert stripe_client\n'
+    assert code_digest(source) == code_digest('def test_x(stripe_client):\n\n    # note\n    assert stripe_client  \n')
+    assert code_digest('    ' + source.replace('\n    ', '\n        ')) == code_digest(source) # indented method
+    assert code_digest(source) != code_digest(source.replace('assert stripe_client', 'assert not stripe_client'))
+
+def test_module_digest_leaves_test_functions_to_their_own_fingerprint():
+    assert module_digest(MODULE) == module_digest(MODULE.replace('assert helper() == 1000', 'assert True'))
+    assert module_digest(MODULE) != module_digest(MODULE.replace('AMOUNT = 1000', 'AMOUNT = 2000'))
+    assert module_digest(MODULE) != module_digest(MODULE.replace('return AMOUNT', 'return AMOUNT + 1'))
+
+def test_environment_covers_profile_endpoint_and_account():
+    live = Settings('live', 'sk_test_a', 'https://api.stripe.com/v1')
+    assert environment_of(live) == environment_of(Settings(*live))
+    assert environment_of(live) != environment_of(live._replace(api_key='sk_test_b'))
+    assert environment_of(live) != environment_of(live._replace(base_url='http://127.0.0.1:12111/v1'))
+    assert environment_of(live) != environment_of(live._replace(profile='replay'))
+
+def test_cache_reuses_only_matching_fresh_passes(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.json'), ttl=24 * HOUR)
+    cache.passed('tests/functional/test_cards.py::test_a', 'f1', now=0)
+    assert cache.hit('tests/functional/test_cards.py::test_a', 'f1', now=23 * HOUR)
+    assert cache.hit('tests/functional/test_cards.py::test_a', 'f2', now=HOUR) is None # code or environment changed
+    assert cache.hit('tests/functional/test_cards.py::test_a', 'f1', now=25 * HOUR) is None # expired
+    cache.failed('tests/functional/test_cards.py::test_a')
+    assert cache.hit('tests/functional/test_cards.py::test_a', 'f1', now=HOUR) is None
+
+def test_cache_file_round_trips_and_drops_expired_entries(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = ResultCache(path, ttl=24 * HOUR)
+    cache.passed('old', 'f1', now=0)
+    cache.passed('new', 'f2', now=20 * HOUR)
+    cache.save(now=30 * HOUR)
+    assert ResultCache(path, ttl=24 * HOUR).entries == {'new': ('f2', 20 * HOUR)}
+
+def test_unreadable_cache_starts_empty(tmp_path):
+    path = tmp_path / 'cache.json'
+    path.write_text('{not json')
+    assert ResultCache(str(path), ttl=HOUR).entries == {}
+    assert ResultCache(str(tmp_path / 'missing.json'), ttl=HOUR).entries == {}
+
+class FakeConfig:
+    """Just enough of pytest's config for the plugin's configure hooks."""
+
+    def __init__(self, path, workerinput=None):
+        self.options = {'stripe_cache': path, 'stripe_cache_ttl': 24.0}
+        self.stash = pytest.Stash()
+        self.pluginmanager = SimpleNamespace(register=lambda plugin, name: None)
+        if workerinput is not None:
+            self.workerinput = workerinput
+
+    def getoption(self, name, default=None):
+        return self.options.get(name, default)
+
+def test_xdist_workers_check_ttls_against_the_controllers_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(resultcache.time, 'time', itertools.count(1000, HOUR).__next__) # an hour passes per call
+    controller = FakeConfig(str(tmp_path / 'cache.json'))
+    resultcache.pytest_configure(controller)
+    node = SimpleNamespace(config=controller, workerinput={})
+    resultcache.pytest_configure_node(node)
+    workers = [FakeConfig(str(tmp_path / 'cache.json'), workerinput=dict(node.workerinput)) for _ in range(2)]
+    for worker in workers:
+        resultcache.pytest_configure(worker)
+    assert {worker.stash[collected_at_key] for worker in workers} == {controller.stash[collected_at_key]} == {1000}
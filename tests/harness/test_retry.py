@@ -0,0 +1,108 @@
+# Tests for the retry policy and retry budget
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from harness.retry import RetryBudget, RetryPolicy
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def scripted(*outcomes):
+    """A send() that returns (or raises) each outcome in turn and records headers."""
+    sent = []
+
+    def send(headers):
+        sent.append(headers)
+        outcome = outcomes[len(sent) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(*outcome) if isinstance(outcome, tuple) else FakeResponse(outcome)
+    return send, sent
+
+@pytest.fixture
+def sleeps():
+    return []
+
+@pytest.fixture
+def policy(sleeps):
+    return RetryPolicy(max_attempts=4, base_delay=0.1, max_delay=2.0, sleep=sleeps.append)
+
+def test_idempotency_key_only_on_charge_and_customer_creates(policy):
+    assert 'Idempotency-Key' in policy.prepare('POST', 'http://x/v1/charges')
+    assert 'Idempotency-Key' in policy.prepare('POST', '/customers?expand[]=sources')
+    assert 'Idempotency-Key' not in policy.prepare('POST', '/customers/cus_1/sources')
+    assert 'Idempotency-Key' not in policy.prepare('GET', '/charges')
+    assert policy.prepare('POST', '/charges', {'Idempotency-Key': 'mine'}) == {'Idempotency-Key': 'mine'}
+
+def test_retries_with_jitter_until_success(policy, sleeps):
+    send, sent = scripted(503, requests.exceptions.ConnectionError(), 200)
+    assert policy.call('POST', '/charges', send).status_code == 200
+    assert len(sent) == 3
+    assert len({headers['Idempotency-Key'] for headers in sent}) == 1
+    assert len(sleeps) == 2
+    assert 0.1 <= sleeps[0] <= 0.3
+    assert 0.1 <= sleeps[1] <= 2.0
+    assert policy.stats() == {'requests': 1, 'retries': 2, 'exhausted': 0}
+
+def test_gives_up_after_max_attempts(policy):
+    send, sent = scripted(500, 500, 500, 500, 500)
+    assert policy.call('GET', '/charges', send).status_code == 500
+    assert len(sent) == 4
+    with pytest.raises(requests.exceptions.Timeout):
+        policy.call('GET', '/charges', scripted(*[requests.exceptions.Timeout()] * 4)[0])
+
+def test_honors_retry_after(policy, sleeps):
+    send, _ = scripted((429, {'Retry-After': '1'}), 200)
+    assert policy.call('GET', '/customers', send).status_code == 200
+    assert len(sleeps) == 1
+    assert 1.0 <= sleeps[0] <= 1.1
+    send, sent = scripted((429, {'Retry-After': '30'}), 200)
+    assert policy.call('GET', '/customers', send).status_code == 429
+    assert len(sent) == 1
+
+def test_non_idempotent_post_retried_only_on_429(policy):
+    send, sent = scripted(500, 200)
+    assert policy.call('POST', '/customers/cus_1/sources', send).status_code == 500
+    assert len(sent) == 1
+    with pytest.raises(requests.exceptions.ConnectionError):
+        policy.call('POST', '/customers/cus_1/sources', scripted(requests.exceptions.ConnectionError())[0])
+    send, sent = scripted(429, 200)
+    assert policy.call('POST', '/customers/cus_1/sources', send).status_code == 200
+
+def test_stripe_should_retry_header_wins(policy):
+    send, sent = scripted((500, {'Stripe-Should-Retry': 'false'}), 200)
+    assert policy.call('GET', '/charges', send).status_code == 500
+    send, sent = scripted((400, {'Stripe-Should-Retry': 'true'}), 200)
+    assert policy.call('GET', '/charges', send).status_code == 200
+
+def test_budget_caps_retries(sleeps):
+    policy = RetryPolicy(budget=RetryBudget(ratio=0.5, reserve=2), sleep=sleeps.append)
+    for _ in range(3):
+        policy.call('GET', '/charges', scripted(503, 503, 503, 503)[0])
+    # 2 from the reserve on the first request, then one per two requests
+    assert policy.stats() == {'requests': 3, 'retries': 3, 'exhausted': 3}
+
+def test_async_call_retries_transport_errors():
+    sleeps = []
+
+    async def nap(seconds):
+        sleeps.append(seconds)
+
+    policy = RetryPolicy(async_sleep=nap)
+    outcomes = [httpx.ConnectError('reset'), FakeResponse(200)]
+
+    async def send(headers):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert asyncio.run(policy.call_async('POST', '/charges', send)).status_code == 200
+    assert len(sleeps) == 1
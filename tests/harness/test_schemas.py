@@ -0,0 +1,106 @@
+# Tests for response-shape snapshots and drift detection
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from harness.client import StripeClient
+from harness.emulator import StripeEmulator
+from harness.schemas import SchemaBook, compare, pytest_sessionfinish, schemas_key, shapes
+
+CUSTOMER = {'id': 'cus_Abc123XYZ', 'object': 'customer', 'created': 1700000000, 'email': 'a@example.com',
+            'name': None, 'metadata': {'run': 'x'}, 'address': None, 'balance': 0, 'livemode': False}
+
+def customer(**changes):
+    return {**CUSTOMER, **changes}
+
+def test_shapes_mask_volatile_values_and_split_nested_objects():
+    page = {'object': 'list', 'url': '/v1/customers', 'has_more': False,
+            'data': [customer(), customer(id='cus_Other99999', email=None)]}
+    found = shapes(page)
+    assert [name for name, _ in found] == ['customer', 'customer', 'list /v1/customers']
+    assert found[2][1] == {'object': {'"list"'}, 'url': {'string'}, 'has_more': {'boolean'},
+                           'data': {'array'}, 'data[]': {'ref<customer>'}}
+    assert found[0][1] == {'id': {'id<cus>'}, 'object': {'"customer"'}, 'created': {'timestamp'},
+                           'email': {'string'}, 'name': {'null'}, 'metadata': {'map'}, 'address': {'null'},
+                           'balance': {'integer'}, 'livemode': {'boolean'}}
+
+def test_null_fields_and_first_seen_children_are_learned_not_drift():
+    baseline = dict(shapes(customer()))['customer']
+    drifts, learned = compare(baseline, dict(shapes(customer(name='Ann', address={'city': 'Oslo'})))['customer'])
+    assert drifts == []
+    assert learned == {'name': {'string'}, 'address': {'object'}, 'address.city': {'string'}}
+
+def test_added_removed_and_retyped_fields_are_drift():
+    baseline = dict(shapes(customer(address={'city': 'Oslo'})))['customer']
+    drifted = customer(balance='0', tax_exempt='none', address={})
+    del drifted['livemode']
+    drifts, _ = compare(baseline, dict(shapes(drifted))['customer'])
+    assert sorted(drifts) == [('added', 'tax_exempt', 'string'), ('changed', 'balance', 'integer -> string'),
+                              ('removed', 'address.city', 'string'), ('removed', 'livemode', 'boolean')]
+
+def test_book_reports_each_drift_once_and_keeps_compatible_shapes(tmp_path):
+    path = str(tmp_path / 'emulator.json')
+    book = SchemaBook(path)
+    book.check(customer())
+    book.check(customer(email=None)) # learned: email is nullable
+    book.save()
+
+    book = SchemaBook(path)
+    book.check(customer())
+    book.check(customer(email=None))
+    assert (book.observed, book.hits) == (2, 2)
+    for _ in range(3):
+        book.check(customer(balance='0'))
+    assert [(drift.kind, drift.path) for drift in book.drifts] == [('changed', 'balance')]
+
+    rebuilt = SchemaBook(path, update=True)
+    rebuilt.check(customer(balance='0'))
+    assert rebuilt.drifts == []
+    assert rebuilt.snapshots['customer'].fields['balance'] == {'string'}
+
+def test_worker_books_merge_into_the_controller():
+    controller, worker = SchemaBook(), SchemaBook()
+    controller.check(customer())
+    worker.check(customer(email=None))
+    worker.check(customer(balance='0'))
+    controller.absorb(worker.to_json(), [list(drift) for drift in worker.drifts], sorted(worker.new),
+                      worker.observed, worker.hits)
+    assert controller.snapshots['customer'].fields['email'] == {'string', 'null'}
+    assert controller.observed == 3
+    assert [drift.path for drift in controller.drifts] == ['balance']
+
+def test_client_responses_are_checked_against_the_emulator():
+    book = SchemaBook()
+    with StripeEmulator() as emulator, StripeClient(emulator.api_key, emulator.base_url, schemas=book) as client:
+        created = client.post('/customers', data={'email': 'shape@example.com'}).json()
+        client.get(f"/customers/{created['id']}")
+        client.get('/customers/cus_missing')
+        client.delete(f"/customers/{created['id']}")
+    assert {'customer', 'customer.deleted', 'error:invalid_request_error:resource_missing'} <= book.new
+    assert book.hits == 1 # the retrieved customer matched the created one by digest
+    assert book.drifts == []
+
+def finish_session(book):
+    config = SimpleNamespace(stash=pytest.Stash())
+    config.stash[schemas_key] = book
+    session = SimpleNamespace(config=config, exitstatus=pytest.ExitCode.OK)
+    pytest_sessionfinish(session)
+    return session.exitstatus
+
+def test_only_update_runs_write_the_baseline(tmp_path):
+    path = str(tmp_path / 'snapshots' / 'live.json')
+    checking = SchemaBook(path)
+    checking.check(customer())
+    assert finish_session(checking) == pytest.ExitCode.OK
+    assert not os.path.exists(path) # the new 'customer' type is reported, not written
+
+    updating = SchemaBook(path, update=True)
+    updating.check(customer())
+    finish_session(updating)
+    assert set(SchemaBook(path).snapshots) == {'customer'}
+
+    drifted = SchemaBook(path)
+    drifted.check(customer(balance='0', email=None))
+    assert finish_session(drifted) == pytest.ExitCode.TESTS_FAILED
+    assert SchemaBook(path).snapshots['customer'].fields['email'] == {'string'} # learned field not written back
@@ -0,0 +1,29 @@
+# Tests for the session settings profiles
+import pytest
+
+from harness import settings
+from harness.client import DEFAULT_BASE_URL
+from harness.emulator import DEFAULT_API_KEY
+from harness.settings import REPLAY_API_KEY, Settings, load
+
+def test_profiles_fill_in_what_the_environment_leaves_out():
+    assert load('live', environ={}) == Settings('live', None, DEFAULT_BASE_URL)
+    assert load('emulator', environ={'BASE_URL': 'http://127.0.0.1:1/v1'}) == \
+        Settings('emulator', DEFAULT_API_KEY, 'http://127.0.0.1:1/v1')
+    assert load('replay', environ={}).api_key == REPLAY_API_KEY
+    assert load('replay', environ={'STRIPE_API_KEY': 'sk_test_a'}).api_key == 'sk_test_a'
+    with pytest.raises(ValueError, match='Unknown profile'):
+        load('staging', environ={})
+
+def test_settings_are_immutable():
+    config = load('live', environ={'STRIPE_API_KEY': 'sk_test_a', 'BASE_URL': 'https://example.test/v1/'})
+    assert config.url('/customers') == 'https://example.test/v1/customers'
+    assert config.headers['Authorization'] == 'Bearer sk_test_a'
+    with pytest.raises(AttributeError):
+        config.api_key = 'sk_test_b'
+    with pytest.raises(TypeError):
+        config.headers['Authorization'] = 'Bearer sk_test_b'
+
+def test_session_settings_are_shared(pytestconfig, stripe_settings):
+    assert settings.current() is stripe_settings
+    assert stripe_settings.profile == settings.profile_for(pytestconfig)
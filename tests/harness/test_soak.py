@@ -0,0 +1,95 @@
+# Tests for soak-mode resource sampling and leak detection
+import asyncio
+import time
+
+from harness.aio import AsyncStripeClient
+from harness.client import StripeClient
+from harness.emulator import StripeEmulator
+from harness.soak import (
+    SITE_TOLERANCE, Sample, SoakMonitor, allocator_growth, arun_soak, leaks, open_fds, pool_probe, rss_bytes, run_soak,
+)
+
+INTERVAL = 0.15 # well above one sample's full collection, even late in a long test run with a big heap
+
+def samples(values, metric='fds'):
+    return [Sample(float(i), i, {metric: value}) for i, value in enumerate(values)]
+
+def test_growth_through_every_third_is_a_leak():
+    found = leaks(samples([10, 11, 12, 13, 14, 15, 16, 17, 18, 19]))
+    assert [(leak.metric, leak.first, leak.last) for leak in found] == [('fds', 12.5, 18.5)]
+
+def test_warmup_jumps_plateaus_and_noise_are_not_leaks():
+    assert leaks(samples([5, 40, 40, 41, 40, 41, 40, 41, 40, 41])) == [] # pool filled during warm-up
+    assert leaks(samples([10, 10, 11, 10, 11, 11, 10, 11, 11, 11])) == [] # within tolerance
+    assert leaks(samples([10, 11, 12, 13, 14])) == [] # too few samples to tell
+    assert leaks(samples([2**20 * n for n in range(10)], 'rss')) == [] # rising, but under its tolerance
+
+def test_probes_read_live_metrics():
+    assert rss_bytes() > 0
+    assert open_fds() > 0
+    with StripeEmulator() as emulator:
+        with StripeClient(emulator.api_key, emulator.base_url) as client:
+            client.get('/customers')
+            assert pool_probe(client, 'sync')() == {'sync.pools': 1, 'sync.idle': 1}
+
+        async def probe():
+            async with AsyncStripeClient(emulator.api_key, emulator.base_url) as client:
+                await client.get('/customers')
+                return pool_probe(client, 'async')()
+
+        assert asyncio.run(probe()) == {'async.connections': 1}
+
+def test_steady_flow_has_no_leaks():
+    result = run_soak(lambda i: bytearray(2**16), duration=12 * INTERVAL, interval=INTERVAL)
+    assert result.iterations > 0 and len(result.samples) >= 10
+    assert result.leaks == []
+
+def test_retained_memory_is_a_leak_and_its_allocator_is_named():
+    kept = []
+
+    def flow(index):
+        kept.append(bytearray(2**14))
+        time.sleep(0.001) # ~15 MiB/s: plenty of growth, few enough traces to snapshot every sample
+
+    result = run_soak(flow, duration=12 * INTERVAL, interval=INTERVAL)
+    assert 'traced' in [leak.metric for leak in result.leaks]
+    top = result.allocators[0]
+    assert top.steady and top.site.startswith(f'{__file__}:')
+    assert all(sample.allocators is not None for sample in result.samples) # sampled all along, not just at the end
+
+def test_allocator_sites_that_only_grow_late_are_not_steady():
+    kept, start = [], None
+
+    def flow(index):
+        nonlocal start
+        start = start or time.perf_counter()
+        if time.perf_counter() - start > 16 * INTERVAL:
+            kept.append(bytearray(2**14))
+        time.sleep(0.001)
+
+    result = run_soak(flow, duration=20 * INTERVAL, interval=INTERVAL, monitor=SoakMonitor(allocators_every=2))
+    assert [sample.allocators is not None for sample in result.samples[:4]] == [True, False, True, False]
+    late = [site for site in result.allocators if site.site.startswith(f'{__file__}:')]
+    assert late and not late[0].steady and late[0].sizes[-1] > SITE_TOLERANCE
+
+def test_site_growth_follows_each_site_across_samples():
+    tops = [{'a.py:1': 100 * i, 'b.py:2': 500} for i in range(8)] + [{'a.py:1': 800, 'c.py:3': 10**6}] * 2
+    growth = allocator_growth([Sample(i, i, {}, top) for i, top in enumerate(tops)], tolerance=50)
+    assert [(site.site, site.steady) for site in growth] == [('a.py:1', True), ('c.py:3', False), ('b.py:2', False)]
+    assert growth[1].sizes == [0, 0, 0, 0, 0, 0, 10**6, 10**6]
+
+def test_unclosed_files_are_a_leak(tmp_path):
+    opened = []
+
+    async def flow(index):
+        opened.append(open(tmp_path / f'{index % 4}.txt', 'w'))
+        await asyncio.sleep(0.001)
+
+    try:
+        # thousands of open files make each allocator diff slow; only the fd count matters here
+        monitor = SoakMonitor(allocators_every=100)
+        result = asyncio.run(arun_soak(flow, duration=12 * INTERVAL, interval=INTERVAL, monitor=monitor))
+    finally:
+        for file in opened:
+            file.close()
+    assert 'fds' in [leak.metric for leak in result.leaks]
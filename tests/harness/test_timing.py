@@ -0,0 +1,59 @@
+# Tests for per-request phase timing
+import asyncio
+
+import pytest
+
+from harness.aio import AsyncStripeClient
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY
+from harness.timing import PhaseRecorder, endpoint_of, read_timings, summarize
+
+def test_endpoint_of_collapses_object_ids():
+    assert endpoint_of('http://127.0.0.1:1/v1/customers/cus_Abc123/sources/card_9?limit=3') == \
+        '/v1/customers/{id}/sources/{id}'
+    assert endpoint_of('https://api.stripe.com/v1/charges') == '/v1/charges'
+
+def test_sync_client_records_phases(emulator):
+    recorder = PhaseRecorder()
+    recorder.nodeid = 'tests/x.py::test_a'
+    with StripeClient(DEFAULT_API_KEY, emulator.base_url, recorder=recorder) as client:
+        customer = client.post('/customers', data={'email': 'a@example.com'}).json()
+        client.get(f"/customers/{customer['id']}")
+
+    first, second = recorder.timings
+    assert (first.nodeid, first.method, first.endpoint, first.status) == ('tests/x.py::test_a', 'POST', '/v1/customers', 200)
+    assert not first.reused and first.dns >= 0 and first.connect > 0
+    assert first.tls is None # plain HTTP
+    assert first.ttfb > 0 and first.body >= 0 and first.json > 0
+    assert first.total >= first.dns + first.connect + first.ttfb
+    assert second.reused and second.connect is None and second.json is None # never decoded
+
+def test_async_client_records_phases(emulator):
+    recorder = PhaseRecorder()
+
+    async def run():
+        async with AsyncStripeClient(DEFAULT_API_KEY, emulator.base_url, recorder=recorder) as client:
+            for _ in range(2):
+                (await client.get('/customers')).json()
+
+    asyncio.run(run())
+    first, second = recorder.timings
+    assert not first.reused and first.connect > 0 and first.dns is None
+    assert second.reused and second.connect is None
+    assert all(t.ttfb > 0 and t.body >= 0 and t.json > 0 and t.status == 200 for t in recorder.timings)
+
+@pytest.mark.parametrize("name", ['timings.jsonl', 'timings.csv'])
+def test_write_read_and_summarize(emulator, tmp_path, name):
+    recorder = PhaseRecorder()
+    with StripeClient(DEFAULT_API_KEY, emulator.base_url, recorder=recorder) as client:
+        for _ in range(3):
+            client.get('/charges')
+    path = str(tmp_path / name)
+    recorder.write(path)
+
+    rows = read_timings(path)
+    assert [row['reused'] for row in rows] == [False, True, True]
+    summary = summarize(rows)['GET /v1/charges']
+    assert (summary['requests'], summary['new_connections']) == (3, 1)
+    assert summary['tls'] is None and summary['connect'] > 0
+    assert summary['p50'] <= summary['p90']
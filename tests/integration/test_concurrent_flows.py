@@ -0,0 +1,27 @@
+# Integration tests running many Customer -> Card -> Charge flows at once
+import pytest
+
+from harness.aio import customer_card_charge_chain, run_concurrently
+from harness.settings import current
+
+SETTINGS = current() # loaded once per session by conftest
+
+# Skip all tests in this module if API key is not set
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
+
+CONCURRENT_CHAINS = 50 # Independent customer -> card -> charge chains in flight together
+
+
+@pytest.mark.asyncio
+async def test_concurrent_customer_card_charge_flows(async_stripe_client):
+    """Many independent flows on one event loop each charge their own card."""
+    results, elapsed = await run_concurrently(
+        lambda i: customer_card_charge_chain(async_stripe_client, i), CONCURRENT_CHAINS)
+    print(f"\n{CONCURRENT_CHAINS} chains in {elapsed:.2f}s ({CONCURRENT_CHAINS / elapsed:.1f} chains/s)")
+
+    assert len({customer['id'] for customer, _, _ in results}) == CONCURRENT_CHAINS
+    for index, (customer, card, charge) in enumerate(results):
+        assert charge['status'] == 'succeeded'
+        assert charge['customer'] == customer['id']
+        assert charge['source']['id'] == card['id']
+        assert charge['amount'] == 500 + index
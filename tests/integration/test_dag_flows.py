@@ -0,0 +1,44 @@
+# Integration tests for multi-step flows run as a dependency DAG
+import pytest
+
+from harness.flows import customer_flow
+from harness.settings import current
+
+SETTINGS = current() # loaded once per session by conftest
+
+# Skip all tests in this module if API key is not set
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
+
+
+@pytest.mark.asyncio
+async def test_customer_with_two_cards_charges_and_refunds(async_stripe_client, flow_runner):
+    """Charge two cards twice each and refund every charge in part, branches running side by side."""
+    result = await flow_runner.run(customer_flow(cards=2, charges_per_card=2, refund_amount=100),
+                                   async_stripe_client)
+
+    customer = result['customer']
+    for i in range(2):
+        card = result[f'card{i}']
+        for j in range(2):
+            charge, refund = result[f'charge{i}.{j}'], result[f'refund{i}.{j}']
+            assert charge['status'] == 'succeeded'
+            assert charge['customer'] == customer['id']
+            assert charge['source']['id'] == card['id']
+            assert charge['amount'] == 1000 + 100 * i + j
+            assert refund['charge'] == charge['id']
+            assert refund['amount'] == 100
+    # customer -> card -> charge -> refund is the longest chain; the branches overlap around it
+    assert len(result.critical_path) == 4
+    assert result.critical_latency <= result.work
+
+
+@pytest.mark.asyncio
+async def test_full_refund_marks_the_charge_refunded(async_stripe_client, flow_runner):
+    result = await flow_runner.run(customer_flow(cards=1, charges_per_card=1, name='full refund'),
+                                   async_stripe_client)
+
+    response = await async_stripe_client.get(f"/charges/{result['charge0.0']['id']}")
+    assert response.status_code == 200, response.text
+    charge = response.json()
+    assert charge['refunded'] is True
+    assert charge['amount_refunded'] == charge['amount']
@@ -1,21 +1,28 @@
+import pytest
 import requests
-import requests_mock
-import os
 
-def test_mock_charge_failure():
-    with requests_mock.Mocker() as m:
-        base_url = os.getenv("BASE_URL")
-        mocked_url = f"{base_url}/charges"
-        m.post(mocked_url, json={
-            "error": {
-                "type": "card_error",
-                "message": "Your card was declined.",
-                "code": "card_declined"
-            }
-        }, status_code=402)
+from harness.mockspec import ERRORS
 
-        response = requests.post(mocked_url, headers={}, data={})
-        body = response.json()
+def test_mock_charge_failure(stripe_mock):
+    mocked_url = stripe_mock.url('charges.create')
+    stripe_mock.stub('charges.create', error='card_declined')
 
-        assert response.status_code == 402
-        assert body["error"]["code"] == "card_declined"
+    response = requests.post(mocked_url, headers={}, data={})
+    body = response.json()
+
+    assert response.status_code == 402
+    assert body["error"]["code"] == "card_declined"
+
+@pytest.mark.parametrize("route", ['charges.create', 'charges.retrieve', 'charges.list'])
+@pytest.mark.parametrize("error", ['authentication_required', 'rate_limit', 'api_error', 'card_declined'])
+def test_mock_charge_error_variants(stripe_mock, route, error):
+    stripe_mock.stub(route, error=error)
+    method = stripe_mock.table.routes[route].method
+
+    response = requests.request(method, stripe_mock.url(route, charge='ch_mock_test_123'),
+                                headers={'Authorization': 'Bearer sk_test_revoked'})
+
+    status, expected = ERRORS[error]
+    assert response.status_code == status
+    assert response.json()['error']['type'] == expected['type']
+    assert '{' not in response.json()['error']['message'] # every placeholder was filled
@@ -1,36 +1,69 @@
 import pytest
 import requests
 import requests.exceptions
-import os
+
+from harness.client import StripeClient
+from harness.mockspec import MOCK_BASE_URL
+from harness.retry import RetryPolicy
+
+MAX_RETRIES = 2
 
 # Assume this is the function in your application code that makes the Stripe API call
 # You might need to import it from its actual location, e.g.:
 # from your_app_module import make_stripe_charge_request
-def make_stripe_charge_request():
+def make_stripe_charge_request(retry=None):
     # Replace with the actual URL and data used in your application
-    base_url = os.getenv("BASE_URL")
-    charge_url = f"{base_url}/charges"
     data = {"amount": 1000, "currency": "usd", "source": "tok_visa"}
-    # Make the request (this will be intercepted by requests_mock)
-    response = requests.post(charge_url, data=data, timeout=5) # Example timeout
+    # Retries re-send the same Idempotency-Key, so a timed-out charge is never billed twice
+    with StripeClient("sk_test_mock", base_url=MOCK_BASE_URL, retry=retry) as client:
+        response = client.post("/charges", data=data, timeout=5) # Example timeout
     response.raise_for_status()
     return response.json()
 
-def test_mock_charge_timeout(requests_mock):
-    """Test that a charge request handles a timeout."""
-    base_url = os.getenv("BASE_URL")
-    charge_url = f"{base_url}/charges"
+@pytest.fixture
+def retry_policy():
+    # No real sleeping between attempts in mock tests
+    return RetryPolicy(max_attempts=MAX_RETRIES + 1, sleep=lambda seconds: None)
+
+def test_mock_charge_timeout(stripe_mock, requests_mock, retry_policy):
+    """Test that a charge request retries a timeout and raises once retries run out."""
+    charge_url = stripe_mock.url('charges.create')
 
     # Configure the mock to raise a Timeout exception for the charge URL
-    requests_mock.post(charge_url, exc=requests.exceptions.Timeout)
+    stripe_mock.stub('charges.create', exc=requests.exceptions.Timeout)
 
     # Assert that calling the function that makes the request raises a Timeout
     with pytest.raises(requests.exceptions.Timeout):
-        make_stripe_charge_request()
+        make_stripe_charge_request(retry=retry_policy)
 
-    # Verify that the mock was called
-    assert requests_mock.called
-    assert requests_mock.call_count == 1
+    # Verify that every attempt was made with the same idempotency key
+    assert requests_mock.call_count == MAX_RETRIES + 1
     history = requests_mock.request_history
     assert history[0].url == charge_url
     assert history[0].method == 'POST'
+    keys = {request.headers['Idempotency-Key'] for request in history}
+    assert len(keys) == 1
+
+def test_mock_charge_timeout_then_success(stripe_mock, requests_mock, retry_policy):
+    """Test that a charge succeeds after a timeout and a 429, reusing its idempotency key."""
+    stripe_mock.stub('charges.create',
+                     {'exc': requests.exceptions.ConnectTimeout},
+                     {'error': 'rate_limit', 'headers': {'Retry-After': '0'}},
+                     {'body': {'id': 'ch_mock'}})
+
+    charge = make_stripe_charge_request(retry=retry_policy)
+
+    assert charge['id'] == 'ch_mock'
+    assert charge['amount'] == 1000
+    assert stripe_mock.calls == {'charges.create': 3}
+    assert len({request.headers['Idempotency-Key'] for request in requests_mock.request_history}) == 1
+    assert retry_policy.stats() == {'requests': 1, 'retries': 2, 'exhausted': 0}
+
+def test_mock_charge_timeout_without_retries(stripe_mock):
+    """Test that a charge request raises on the first timeout when retries are off."""
+    stripe_mock.stub('charges.create', exc=requests.exceptions.Timeout)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        make_stripe_charge_request()
+
+    assert stripe_mock.calls == {'charges.create': 1}
@@ -0,0 +1,73 @@
+# Client-side overhead of the requests, stripe SDK and async backends on identical calls
+import http.client
+import statistics
+import time
+from urllib.parse import urlencode, urlsplit
+
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY, StripeEmulator
+from harness.resources import BACKENDS, AsyncBackend, RequestsBackend, SdkBackend, StripeApi
+
+ROUNDS = 200 # timed calls per backend and operation
+WARMUP = 20
+MAX_OVERHEAD = 0.05 # seconds per call over the raw baseline; far above any sane client
+
+# operation -> (call on a StripeApi, (method, path, form) for the raw baseline)
+OPERATIONS = {
+    'create customer': (lambda api, ids: api.customers.create(email='overhead@example.com'),
+                        lambda ids: ('POST', '/v1/customers', {'email': 'overhead@example.com'})),
+    'retrieve customer': (lambda api, ids: api.customers.retrieve(ids['customer']),
+                          lambda ids: ('GET', f"/v1/customers/{ids['customer']}", None)),
+    'list customers': (lambda api, ids: api.customers.list(limit=10),
+                       lambda ids: ('GET', '/v1/customers?limit=10', None)),
+}
+
+def time_calls(call):
+    for _ in range(WARMUP):
+        call()
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def raw_baseline(base_url, ids):
+    """Median per operation over one keep-alive http.client connection: bytes in, bytes out, no parsing."""
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port)
+    headers = {'Authorization': f'Bearer {DEFAULT_API_KEY}', 'Content-Type': 'application/x-www-form-urlencoded'}
+
+    def send(method, path, form):
+        connection.request(method, path, body=urlencode(form) if form else None, headers=headers)
+        connection.getresponse().read()
+
+    try:
+        return {name: time_calls(lambda: send(*request(ids))) for name, (_, request) in OPERATIONS.items()}
+    finally:
+        connection.close()
+
+def test_performance_backend_overhead():
+    """Time the same calls through every backend and subtract a raw HTTP baseline."""
+    with StripeEmulator() as emulator:
+        apis = {
+            'requests': StripeApi(RequestsBackend(StripeClient(DEFAULT_API_KEY, emulator.base_url))),
+            'sdk': StripeApi(SdkBackend(DEFAULT_API_KEY, emulator.base_url)),
+            'async': StripeApi(AsyncBackend(DEFAULT_API_KEY, emulator.base_url)),
+        }
+        try:
+            ids = {'customer': apis['requests'].customers.create(email='overhead@example.com')['id']}
+            baseline = raw_baseline(emulator.base_url, ids)
+            medians = {name: {op: time_calls(lambda: call(api, ids)) for op, (call, _) in OPERATIONS.items()}
+                       for name, api in apis.items()}
+        finally:
+            for api in apis.values():
+                api.close()
+
+    print(f"\n{'operation':<20} {'raw http':>9} " + " ".join(f"{name + ' +':>11}" for name in BACKENDS))
+    for op in OPERATIONS:
+        print(f"{op:<20} {baseline[op] * 1e6:>7.0f}us "
+              + " ".join(f"{(medians[name][op] - baseline[op]) * 1e6:>9.0f}us" for name in BACKENDS))
+    for name in BACKENDS:
+        for op in OPERATIONS:
+            assert medians[name][op] - baseline[op] < MAX_OVERHEAD, f"{name} adds over {MAX_OVERHEAD}s to {op}"
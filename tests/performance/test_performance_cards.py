@@ -1,100 +1,66 @@
 # Performance tests for Stripe Card objects
 import pytest
-import requests
-import os
-import time
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from harness.pager import paginate
+from harness.settings import current
 
-# Fetch API key and base URL
-API_KEY = os.getenv('STRIPE_API_KEY')
-BASE_URL = os.getenv('BASE_URL', 'https://api.stripe.com/v1')
-
-# Headers for authenticated requests
-HEADERS = {
-    'Authorization': f'Bearer {API_KEY}',
-    'Content-Type': 'application/x-www-form-urlencoded'
-}
+SETTINGS = current() # loaded once per session by conftest
 
 # Skip all tests in this module if API key is not set
-pytestmark = pytest.mark.skipif(not API_KEY, reason='STRIPE_API_KEY environment variable not set')
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
 
-# Performance thresholds (in seconds)
-CREATE_CARD_THRESHOLD = 1.5 # Example: 1.5 seconds
-LIST_CARDS_THRESHOLD = 1.0 # Example: 1.0 second
+# Performance thresholds on latency percentiles (in seconds), asserted over a whole load run
+CREATE_CARD_P50_THRESHOLD = 0.75 # Example: 750 ms
+CREATE_CARD_P99_THRESHOLD = 1.5 # Example: 1.5 seconds
+LIST_CARDS_P50_THRESHOLD = 0.5 # Example: 500 ms
+LIST_CARDS_P99_THRESHOLD = 1.0 # Example: 1.0 second
+MAX_ERROR_RATE = 0.01 # At most 1% of requests may fail
 
 @pytest.fixture(scope="function")
-def perf_customer_fixture():
-    """Fixture to create a customer for performance tests and delete it afterwards."""
-    customer_url = f'{BASE_URL}/customers'
-    customer_data = {'description': 'Customer for card perf testing'}
-    response = requests.post(customer_url, headers=HEADERS, data=customer_data)
-    assert response.status_code == 200, f"Failed to create customer: {response.text}"
-    customer_id = response.json()['id']
-    print(f"\nCreated customer {customer_id} for perf test")
-    
-    yield customer_id # Provide the customer ID to the test
-    
-    # Teardown: Delete Customer
-    print(f"\nDeleting customer {customer_id} after perf test")
-    delete_response = requests.delete(f"{customer_url}/{customer_id}", headers=HEADERS)
-    assert delete_response.status_code in [200, 404], f"Failed to delete customer: {delete_response.text}"
-    print(f"Deleted customer {customer_id}")
+def perf_customer_fixture(customer_lease):
+    """Fixture that leases a pre-provisioned customer so setup stays out of the timed path."""
+    print(f"\nLeased customer {customer_lease.customer_id} for perf test")
+    yield customer_lease.customer_id
 
-def test_performance_create_card(perf_customer_fixture):
-    """Measure the performance of creating a single card."""
+@pytest.mark.asyncio
+@pytest.mark.mutates_customer
+async def test_performance_create_card(async_stripe_client, load_runner, perf_customer_fixture):
+    """Drive card creation under load and check its latency percentiles."""
     customer_id = perf_customer_fixture
-    card_url = f'{BASE_URL}/customers/{customer_id}/sources'
+    card_url = f'/customers/{customer_id}/sources'
     card_data = {'source': 'tok_visa'}
-    
-    start_time = time.time()
-    response = requests.post(card_url, headers=HEADERS, data=card_data)
-    end_time = time.time()
-    duration = end_time - start_time
-    
-    print(f"\nCreate Card API call took {duration:.4f} seconds")
-    assert response.status_code == 200, f"Create card failed: {response.text}"
-    assert duration < CREATE_CARD_THRESHOLD, f"Card creation took too long ({duration:.4f}s > {CREATE_CARD_THRESHOLD}s)"
-    
-    card_id = response.json()['id']
-    print(f"Card {card_id} created successfully for perf test.")
 
-def test_performance_list_cards(perf_customer_fixture):
-    """Measure the performance of listing cards for a customer (after adding a few)."""
+    result = await load_runner.run('create_card', lambda: async_stripe_client.post(card_url, data=card_data))
+
+    assert result.requests > 0, "Load run sent no requests"
+    assert result.error_rate <= MAX_ERROR_RATE, f"Too many failed card creations: {dict(result.statuses)}"
+    p50, p99 = result.percentile(50), result.percentile(99)
+    assert p50 < CREATE_CARD_P50_THRESHOLD, f"Card creation p50 too slow ({p50:.4f}s > {CREATE_CARD_P50_THRESHOLD}s)"
+    assert p99 < CREATE_CARD_P99_THRESHOLD, f"Card creation p99 too slow ({p99:.4f}s > {CREATE_CARD_P99_THRESHOLD}s)"
+
+@pytest.mark.asyncio
+@pytest.mark.mutates_customer
+async def test_performance_list_cards(stripe_client, async_stripe_client, load_runner, perf_customer_fixture):
+    """Drive card listing under load (after adding a few cards) and check its latency percentiles."""
     customer_id = perf_customer_fixture
-    card_url = f'{BASE_URL}/customers/{customer_id}/sources'
+    card_url = f'/customers/{customer_id}/sources'
     num_cards_to_create = 3 # Create a small number of cards for the list test
-    
+
     print(f"Creating {num_cards_to_create} cards for list performance test...")
-    created_card_ids = []
     for i in range(num_cards_to_create):
-        # Use different test tokens if available/needed, otherwise tok_visa is fine
-        token = 'tok_visa' 
-        card_data = {'source': token, 'metadata[index]': i}
-        response = requests.post(card_url, headers=HEADERS, data=card_data)
+        card_data = {'source': 'tok_visa', 'metadata[index]': i}
+        response = stripe_client.post(card_url, data=card_data)
         assert response.status_code == 200, f"Failed to create card {i+1} for list test: {response.text}"
-        created_card_ids.append(response.json()['id'])
-    print(f"Created cards: {created_card_ids}")
-        
-    # Now measure the list operation
-    list_url = f'{BASE_URL}/customers/{customer_id}/sources'
-    params = {'object': 'card', 'limit': 10} # Requesting cards, limit is optional
-    
-    start_time = time.time()
-    response = requests.get(list_url, headers=HEADERS, params=params)
-    end_time = time.time()
-    duration = end_time - start_time
-    
-    print(f"\nList Cards API call took {duration:.4f} seconds")
-    assert response.status_code == 200, f"List cards failed: {response.text}"
-    assert duration < LIST_CARDS_THRESHOLD, f"Card listing took too long ({duration:.4f}s > {LIST_CARDS_THRESHOLD}s)"
-    
-    # Verify the result (optional but good practice)
-    body = response.json()
-    assert body['object'] == 'list'
-    assert len(body['data']) >= num_cards_to_create
-    print(f"Successfully listed {len(body['data'])} cards.")
 
-# TODO: Add performance tests for card creation and listing - DONE
+    # Verify the whole listing once (every page) before putting the first page under load
+    params = {'object': 'card', 'limit': 10}
+    cards = sum(1 for _ in paginate(stripe_client, card_url, {'object': 'card'}))
+    assert cards >= num_cards_to_create
+
+    result = await load_runner.run('list_cards', lambda: async_stripe_client.get(card_url, params=params))
+
+    assert result.requests > 0, "Load run sent no requests"
+    assert result.error_rate <= MAX_ERROR_RATE, f"Too many failed card listings: {dict(result.statuses)}"
+    p50, p99 = result.percentile(50), result.percentile(99)
+    assert p50 < LIST_CARDS_P50_THRESHOLD, f"Card listing p50 too slow ({p50:.4f}s > {LIST_CARDS_P50_THRESHOLD}s)"
+    assert p99 < LIST_CARDS_P99_THRESHOLD, f"Card listing p99 too slow ({p99:.4f}s > {LIST_CARDS_P99_THRESHOLD}s)"
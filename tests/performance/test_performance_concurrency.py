@@ -0,0 +1,25 @@
+# Throughput tests for concurrent flows on one event loop
+import pytest
+
+from harness.aio import customer_card_charge_chain, run_concurrently
+from harness.settings import current
+
+SETTINGS = current() # loaded once per session by conftest
+
+# Skip all tests in this module if API key is not set
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
+
+CHAINS = 200 # Chains per run; each chain is four API calls
+CONCURRENCY = 50 # Chains in flight at once
+MIN_CHAINS_PER_SECOND = 2.0 # Example floor: well under the ~6 chains/s a 25 req/s budget allows
+
+@pytest.mark.asyncio
+async def test_performance_concurrent_chain_throughput(async_stripe_client):
+    """Measure aggregate chain throughput instead of single-call latency."""
+    results, elapsed = await run_concurrently(
+        lambda i: customer_card_charge_chain(async_stripe_client, i), CHAINS, CONCURRENCY)
+    throughput = CHAINS / elapsed
+    print(f"\n{CHAINS} chains ({CHAINS * 4} requests) at concurrency {CONCURRENCY} "
+          f"took {elapsed:.2f}s: {throughput:.1f} chains/s, {throughput * 4:.1f} req/s")
+    assert len(results) == CHAINS
+    assert throughput >= MIN_CHAINS_PER_SECOND, f"Throughput too low ({throughput:.2f} chains/s)"
@@ -0,0 +1,44 @@
+# End-to-end goodput through a degraded network, by client timeout and retry settings
+import pytest
+
+from harness.aio import AsyncStripeClient
+from harness.emulator import DEFAULT_API_KEY, StripeEmulator
+from harness.faultproxy import Fault, FaultProxy
+from harness.retry import RetryBudget, RetryPolicy
+
+# A WAN with a long latency tail, the odd dropped connection and short bursts of 503s
+DEGRADED = [('GET /v1/customers*', Fault(latency='lognormal:0.02,1.0', reset=0.03, status=503,
+                                         burst=3, burst_every=40))]
+DURATION = 0.75 # seconds per configuration
+CONCURRENCY = 8
+
+CONFIGS = {
+    'no timeout, no retries': (30.0, None),
+    '100ms timeout, no retries': (0.1, None),
+    'no timeout, retries': (30.0, 4),
+    '100ms timeout, retries': (0.1, 4),
+}
+
+@pytest.mark.asyncio
+async def test_performance_timeouts_and_retries_under_faults(load_runner):
+    """Retries should turn injected resets, 503s and timeouts into successes at little cost in throughput."""
+    results = {}
+    with StripeEmulator() as emulator, FaultProxy(emulator.base_url, DEGRADED, seed=7) as proxy:
+        for name, (timeout, retries) in CONFIGS.items():
+            retry = retries and RetryPolicy(max_attempts=retries + 1, base_delay=0.01, max_delay=0.1,
+                                            budget=RetryBudget(ratio=1.0, reserve=100))
+            async with AsyncStripeClient(DEFAULT_API_KEY, proxy.base_url, timeout=timeout, retry=retry) as client:
+                results[name] = await load_runner.run(
+                    name, lambda: client.get('/customers', params={'limit': 10}),
+                    duration=DURATION, concurrency=CONCURRENCY, rate=None)
+        injected = proxy.stats()
+    print(f"\nfaults injected: {injected}")
+    for name, result in results.items():
+        print(f"{name:<28} goodput {result.rps * (1 - result.error_rate):>7.1f} req/s, "
+              f"errors {result.error_rate:>6.1%}, p50 {result.percentile(50) * 1000:>6.1f}ms, "
+              f"p99 {result.percentile(99) * 1000:>6.1f}ms")
+
+    assert injected.get('error') and injected.get('reset'), "The proxy injected no faults"
+    assert results['no timeout, no retries'].error_rate > 0
+    assert results['100ms timeout, retries'].error_rate < results['100ms timeout, no retries'].error_rate
+    assert results['no timeout, retries'].error_rate < results['no timeout, no retries'].error_rate
@@ -0,0 +1,53 @@
+# Parsing overhead of list responses: requests' stdlib json() vs the fast lazy views
+import json
+import timeit
+
+import pytest
+import requests
+
+from harness import models
+from harness.models import StripeResponse
+
+CHARGES_PER_PAGE = 100 # a full list page
+ROUNDS = 200 # decodes per timing
+
+def charge(i):
+    return {
+        'id': f'ch_{i:024d}', 'object': 'charge', 'amount': 500 + i, 'currency': 'usd', 'status': 'succeeded',
+        'paid': True, 'captured': True, 'refunded': False, 'description': f'Charge {i}',
+        'metadata': {'test_run_id': '20260101T000000-abcdef', 'index': str(i)},
+        'outcome': {'network_status': 'approved_by_network', 'risk_level': 'normal', 'risk_score': 42,
+                    'seller_message': 'Payment complete.', 'type': 'authorized'},
+        'source': {'id': f'card_{i:024d}', 'object': 'card', 'brand': 'Visa', 'last4': '4242', 'exp_month': 12,
+                   'exp_year': 2030, 'funding': 'credit', 'country': 'US', 'cvc_check': 'pass', 'metadata': {}},
+    }
+
+BODY = json.dumps({'object': 'list', 'url': '/v1/charges', 'has_more': True,
+                   'data': [charge(i) for i in range(CHARGES_PER_PAGE)]}).encode()
+
+def make_response(cls):
+    response = cls()
+    response.status_code = 200
+    response._content = BODY
+    response.encoding = 'utf-8'
+    return response
+
+def read_like_a_test(body):
+    # What the suites typically touch: a few top-level keys and the first item
+    first = body['data'][0]
+    return body['has_more'], len(body['data']), first['id'], first['source']['last4']
+
+@pytest.mark.parametrize("cls", [requests.Response, StripeResponse], ids=['stdlib', 'fast'])
+def test_performance_parse_list_page(benchmark, cls):
+    """Benchmark decoding a 100-charge page and reading a few fields."""
+    result = benchmark(lambda: read_like_a_test(make_response(cls).json()))
+    assert result == (True, CHARGES_PER_PAGE, f'ch_{0:024d}', '4242')
+
+@pytest.mark.skipif(models.orjson is None, reason='orjson not installed; the stdlib fallback is not faster')
+def test_performance_fast_json_beats_stdlib():
+    """The fast path must cost less than requests' own json() for the same reads."""
+    stdlib = min(timeit.repeat(lambda: read_like_a_test(make_response(requests.Response).json()), number=ROUNDS, repeat=3))
+    fast = min(timeit.repeat(lambda: read_like_a_test(make_response(StripeResponse).json()), number=ROUNDS, repeat=3))
+    print(f"\n{ROUNDS} pages: stdlib {stdlib * 1000:.1f}ms, {models.JSON_BACKEND} + views {fast * 1000:.1f}ms "
+          f"({stdlib / fast:.1f}x)")
+    assert fast < stdlib
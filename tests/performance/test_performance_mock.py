@@ -0,0 +1,40 @@
+# Cost of registering mock scenarios from the compiled spec vs hand-built requests_mock routes
+import time
+
+import requests
+import requests_mock
+
+from harness.mockspec import ERRORS, ROUTES, StripeMock
+
+SCENARIOS = [(route, error) for route in ROUTES for error in [None, *ERRORS]] # every route x every variant
+MAX_STUB_SECONDS = 50e-6 # registering one scenario must stay in the microseconds
+
+def test_performance_register_mock_scenarios(stripe_mock_routes):
+    """Register every route/error scenario many times over and time each registration."""
+    mock = StripeMock(stripe_mock_routes)
+    rounds = 20
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for route, error in SCENARIOS:
+            mock.stub(route, error=error)
+    per_stub = (time.perf_counter() - start) / (rounds * len(SCENARIOS))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with requests_mock.Mocker() as m:
+            for route, error in SCENARIOS:
+                status, body = ERRORS[error] if error else (200, {'id': 'x', 'object': route.split('.')[0]})
+                m.register_uri(ROUTES[route][0], stripe_mock_routes.url(route, customer='c', card='k', charge='h'),
+                               json={'error': dict(body)} if error else dict(body), status_code=status)
+    per_uri = (time.perf_counter() - start) / (rounds * len(SCENARIOS))
+    print(f"\n{len(SCENARIOS)} scenarios: {per_stub * 1e6:.2f}us per spec stub, "
+          f"{per_uri * 1e6:.2f}us per hand-built requests_mock route")
+    assert per_stub < MAX_STUB_SECONDS
+
+def test_performance_serve_mock_scenarios(stripe_mock, benchmark):
+    """Benchmark one stubbed request end to end through the compiled matcher."""
+    url = stripe_mock.url('cards.retrieve', customer='cus_1', card='card_1')
+    stripe_mock.stub('cards.retrieve', error='resource_missing')
+    session = requests.Session()
+    response = benchmark(session.get, url)
+    assert response.status_code == 404
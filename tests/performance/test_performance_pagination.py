@@ -0,0 +1,48 @@
+# Streaming a 10k-object list through the pager against a local Stripe stand-in
+import time
+import tracemalloc
+
+import pytest
+
+from harness.client import StripeClient
+from harness.emulator import DEFAULT_API_KEY, StripeEmulator
+from harness.pager import paginate
+
+LIST_SIZE = 10_000 # customers seeded into the stand-in
+MAX_STREAMING_MEMORY_RATIO = 0.25 # streaming may hold at most a quarter of what materializing the list does
+
+@pytest.fixture(scope="module")
+def large_list_client():
+    """Fixture that serves an emulator holding LIST_SIZE customers and a client pointed at it."""
+    emulator = StripeEmulator()
+    auth = {'Authorization': f'Bearer {DEFAULT_API_KEY}'}
+    for i in range(LIST_SIZE):
+        emulator.handle('POST', '/v1/customers', body=f'email=bulk{i}%40example.com&name=Bulk+{i}', headers=auth)
+    with emulator, StripeClient(DEFAULT_API_KEY, emulator.base_url) as client:
+        yield client
+
+def peak_memory(consume):
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = consume()
+        elapsed = time.perf_counter() - start
+        return result, tracemalloc.get_traced_memory()[1], elapsed
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.parametrize("prefetch", [True, False], ids=['prefetch', 'sequential'])
+def test_performance_paginate_large_list(large_list_client, prefetch):
+    """Walk every customer lazily and check the walk stays in constant memory."""
+    def stream():
+        return sum(1 for _ in paginate(large_list_client, '/customers', prefetch=prefetch))
+
+    count, streaming_peak, elapsed = peak_memory(stream)
+    materialized, materialized_peak, _ = peak_memory(lambda: list(paginate(large_list_client, '/customers')))
+    print(f"\n{count} customers in {elapsed:.2f}s ({count / elapsed:.0f} objects/s, prefetch={prefetch}); "
+          f"peak {streaming_peak / 1e6:.1f} MB streaming vs {materialized_peak / 1e6:.1f} MB materialized")
+
+    assert count == LIST_SIZE
+    assert len(materialized) == LIST_SIZE
+    assert streaming_peak < materialized_peak * MAX_STREAMING_MEMORY_RATIO, \
+        f"Streaming peaked at {streaming_peak / 1e6:.1f} MB, close to the {materialized_peak / 1e6:.1f} MB of the full list"
@@ -0,0 +1,36 @@
+# Goodput of charge creation under rate-limit contention, with and without retries
+import pytest
+
+from harness.aio import AsyncStripeClient, run_concurrently
+from harness.emulator import DEFAULT_API_KEY, StripeEmulator
+from harness.retry import RetryBudget, RetryPolicy
+
+RATE_LIMIT = 100 # requests per second allowed by the local stand-in
+RATE_LIMIT_BURST = 20 # tokens the bucket holds when idle
+CHARGES = 60 # charges attempted per run
+CONCURRENCY = 30 # charges in flight at once
+
+async def create_charges(retry):
+    """Create CHARGES charges on a fresh rate-limited emulator; return successes, charges billed and seconds."""
+    with StripeEmulator(rate_limit=RATE_LIMIT, burst=RATE_LIMIT_BURST) as emulator:
+        async with AsyncStripeClient(DEFAULT_API_KEY, emulator.base_url, retry=retry) as client:
+            responses, elapsed = await run_concurrently(
+                lambda i: client.post('/charges', data={'amount': 1000 + i, 'currency': 'usd', 'source': 'tok_visa'}),
+                CHARGES, CONCURRENCY)
+        billed = len(emulator.charges.page(limit=100)[0])
+    return sum(r.status_code == 200 for r in responses), billed, elapsed
+
+@pytest.mark.asyncio
+async def test_performance_retries_under_contention():
+    """Retries should turn 429s into completed charges without billing any charge twice."""
+    plain_ok, plain_billed, plain_elapsed = await create_charges(retry=None)
+    # Room for every charge to retry; the default budget (10 in reserve) would shed most of them
+    policy = RetryPolicy(max_attempts=6, base_delay=0.05, max_delay=2.0, budget=RetryBudget(ratio=1.0, reserve=CHARGES))
+    retried_ok, retried_billed, retried_elapsed = await create_charges(retry=policy)
+    print(f"\nwithout retries: {plain_ok}/{CHARGES} charges in {plain_elapsed:.2f}s; "
+          f"with retries: {retried_ok}/{CHARGES} in {retried_elapsed:.2f}s ({policy.stats()})")
+
+    assert plain_ok < CHARGES, "The stand-in never throttled; raise CHARGES or lower RATE_LIMIT"
+    assert plain_billed == plain_ok
+    assert retried_ok == CHARGES, f"Only {retried_ok}/{CHARGES} charges succeeded with retries"
+    assert retried_billed == CHARGES, f"{retried_billed} charges billed for {CHARGES} requests"
@@ -0,0 +1,38 @@
+# Soak tests: the customer -> card -> charge flow for --stripe-soak seconds, failing on unbounded resource growth
+import pytest
+
+from harness.aio import customer_card_charge_chain
+from harness.settings import current
+from harness.soak import pool_probe
+
+SETTINGS = current() # loaded once per session by conftest
+
+# Skip all tests in this module if API key is not set
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
+
+def test_soak_sync_flow(soak_runner, stripe_client):
+    """Memory, descriptors and the shared keep-alive pool must level off, however long the flow repeats."""
+    def flow(index):
+        customer = stripe_client.post('/customers', data={'email': f'soak.{index}@example.com'})
+        assert customer.status_code == 200, customer.text
+        customer_id = customer.json()['id']
+        card = stripe_client.post(f'/customers/{customer_id}/sources', data={'source': 'tok_visa'})
+        assert card.status_code == 200, card.text
+        charge = stripe_client.post('/charges', data={'amount': 500 + index % 100, 'currency': 'usd',
+                                                      'customer': customer_id, 'source': card.json()['id']})
+        assert charge.status_code == 200, charge.text
+        assert stripe_client.delete(f'/customers/{customer_id}').status_code == 200
+
+    result = soak_runner.run('sync customer/card/charge', flow, [pool_probe(stripe_client, 'client')])
+    assert result.iterations > 0
+    assert not result.leaks, '; '.join(map(str, result.leaks))
+
+@pytest.mark.asyncio
+async def test_soak_async_flow(soak_runner, async_stripe_client):
+    """The same flow through the asyncio client; its connection pool must not keep growing either."""
+    async def flow(index):
+        await customer_card_charge_chain(async_stripe_client, index)
+
+    result = await soak_runner.arun('async customer/card/charge', flow, [pool_probe(async_stripe_client, 'client')])
+    assert result.iterations > 0
+    assert not result.leaks, '; '.join(map(str, result.leaks))
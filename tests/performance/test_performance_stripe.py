@@ -1,41 +1,38 @@
 import pytest
 import stripe
-import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+from harness.cleanup import RUN_TAG
 
 # Fixture to set up Stripe API key
 @pytest.fixture(scope='module', autouse=True)
-def setup_stripe():
-    api_key = os.getenv('STRIPE_API_KEY')
-    if not api_key:
+def setup_stripe(stripe_settings):
+    if not stripe_settings.api_key:
         pytest.skip('STRIPE_API_KEY environment variable not set')
-    stripe.api_key = api_key
-    # Optional: Set API base if needed, though stripe library often handles this
-    # stripe.api_base = os.getenv('BASE_URL', 'https://api.stripe.com/v1')
+    saved = stripe.api_key, stripe.api_base
+    stripe.api_key = stripe_settings.api_key
+    # Follow the session's base URL (e.g. the local emulator); the SDK wants the host without /v1
+    stripe.api_base = stripe_settings.base_url.removesuffix('/v1')
+    yield
+    # The SDK globals outlive this module; later suites (e.g. the sdk backend) must not inherit them
+    stripe.api_key, stripe.api_base = saved
 
-def test_performance_create_customer(benchmark):
-    """Benchmark creating a Stripe customer."""
-    # Use benchmark() function for the code to be measured
-    result = benchmark(stripe.Customer.create,
-                       email='perf-test@example.com',
-                       description='Performance Test Customer')
+def test_performance_create_customer(api_benchmark, stripe_object_tracker):
+    """Benchmark creating a Stripe customer once latency has settled."""
+    # Each round's customer is deleted outside the timed region; the tag lets the sweeper catch leaks
+    result = api_benchmark.run(stripe.Customer.create, email='perf-test@example.com',
+                               description='Performance Test Customer',
+                               metadata={RUN_TAG: stripe_object_tracker.run_id},
+                               teardown=lambda customer: stripe.Customer.delete(customer.id))
     assert result.id is not None
-    # Clean up the created customer (optional but good practice)
-    try:
-        stripe.Customer.delete(result.id)
-    except Exception as e:
-        print(f"Warning: Could not delete test customer {result.id}: {e}")
 
-def test_performance_create_charge(benchmark):
+def test_performance_create_charge(api_benchmark, stripe_object_tracker):
     """Benchmark creating a Stripe charge using a test token."""
     # Need a source (test token) to create a charge
-    result = benchmark(stripe.Charge.create,
-                       amount=100,  # amount in cents
-                       currency='usd',
-                       source='tok_visa', # Use Stripe's standard test card token
-                       description='Performance Test Charge')
+    result = api_benchmark.run(stripe.Charge.create,
+                               amount=100,  # amount in cents
+                               currency='usd',
+                               source='tok_visa', # Use Stripe's standard test card token
+                               description='Performance Test Charge',
+                               metadata={RUN_TAG: stripe_object_tracker.run_id}) # charges can't be deleted; tag them
     assert result.id.startswith('ch_')
     assert result.status == 'succeeded' # Test charges usually succeed immediately
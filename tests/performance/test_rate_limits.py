@@ -1 +1,62 @@
+# Rate-limit characterization against a locally rate-limited Stripe stand-in
+import os
 
+import pytest
+
+from harness.aio import AsyncStripeClient
+from harness.emulator import DEFAULT_API_KEY, StripeEmulator
+from harness.ratebench import RateLimitHistory, characterize
+
+# Token-bucket budget of the local stand-in; the live API allows about 100 req/s in live mode
+RATE_LIMIT = float(os.getenv('RATE_LIMIT_RPS', 200)) # requests per second
+RATE_LIMIT_BURST = 25 # tokens the bucket holds when idle: absorbs a ~0.1s client stall below the limit
+RAMP = [round(RATE_LIMIT * factor / 10) for factor in range(8, 16)] # 80% .. 150% of the limit
+STEP_DURATION = 1.0 # seconds per ramp step; from 120% of the limit on that's well past the bucket
+THROTTLE_THRESHOLD = 0.01 # the knee is the first step with more than 1% 429s...
+MIN_THROTTLED = 3 # ...and at least this many, so a single early 429 can't set it
+RECOVERY_TOLERANCE = 0.25 # seconds of slack on top of Retry-After
+HISTORY_PATH = os.getenv('RATE_LIMIT_HISTORY', os.path.join('.benchmarks', 'rate_limits.json'))
+
+@pytest.fixture(scope="function")
+def limited_emulator():
+    """Fixture that serves a fresh emulator with a token-bucket rate limit and one seeded customer."""
+    emulator = StripeEmulator(rate_limit=RATE_LIMIT, burst=RATE_LIMIT_BURST)
+    status, customer = emulator.handle('POST', '/v1/customers', body='description=rate+limit+probe',
+                                       headers={'Authorization': f'Bearer {DEFAULT_API_KEY}'})
+    assert status == 200, f"Failed to seed customer: {customer}"
+    emulator.customer_id = customer['id']
+    emulator.start()
+    yield emulator
+    emulator.stop()
+
+@pytest.fixture(scope="module")
+def rate_limit_history():
+    """Fixture that loads the results of previous characterization runs."""
+    return RateLimitHistory(HISTORY_PATH)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("endpoint", ['/customers', '/charges', '/customers/{customer_id}/sources'])
+async def test_rate_limit_characterization(limited_emulator, rate_limit_history, endpoint):
+    """Ramp the request rate until 429s appear and check the knee, Retry-After and recovery."""
+    path = endpoint.format(customer_id=limited_emulator.customer_id)
+
+    async with AsyncStripeClient(DEFAULT_API_KEY, limited_emulator.base_url) as client:
+        result = await characterize(lambda: client.get(path), endpoint, RAMP,
+                                    step_duration=STEP_DURATION, threshold=THROTTLE_THRESHOLD,
+                                    min_throttled=MIN_THROTTLED)
+
+    previous = rate_limit_history.previous(endpoint)
+    rate_limit_history.append(result, limit=RATE_LIMIT, burst=RATE_LIMIT_BURST)
+    print(f"\n{endpoint}: knee at {result.knee} req/s (last clean {result.last_clean_rate} req/s), "
+          f"Retry-After {result.retry_after}, recovered in {result.recovery}s")
+    if previous:
+        print(f"previous run: knee at {previous['knee']} req/s, recovered in {previous['recovery']}s")
+
+    assert result.knee is not None, f"No 429s up to {RAMP[-1]} req/s against a {RATE_LIMIT} req/s limit"
+    assert 0.9 * RATE_LIMIT <= result.knee <= 1.3 * RATE_LIMIT, \
+        f"Throttling started at {result.knee} req/s, expected near {RATE_LIMIT} req/s: {result.steps}"
+    assert result.retry_after, "429 responses carried no Retry-After header"
+    assert all(value >= 1 for value in result.retry_after), f"Unexpected Retry-After values: {result.retry_after}"
+    assert result.recovery is not None, f"Still throttled {max(result.retry_after) * 5:g}s after the load stopped"
+    assert result.recovery <= max(result.retry_after) + RECOVERY_TOLERANCE, \
+        f"Recovery took {result.recovery:.3f}s, longer than Retry-After {max(result.retry_after)}s"
@@ -0,0 +1,43 @@
+# Every known route x method refuses every kind of bad credential, checked concurrently
+import pytest
+import pytest_asyncio
+
+from harness.aio import AsyncStripeClient
+from harness.authmatrix import CREDENTIALS, cases, check, run_matrix
+from harness.schemas import schemas_for
+from harness.settings import current
+
+SETTINGS = current() # loaded once per session by conftest
+
+# Skip all tests in this module if API key is not set
+pytestmark = pytest.mark.skipif(not SETTINGS.api_key, reason='STRIPE_API_KEY environment variable not set')
+
+MATRIX = cases()
+CONCURRENCY = 100 # 401s create nothing and count against no object quota, so nothing needs pacing
+
+
+@pytest_asyncio.fixture
+async def matrix_client(pytestconfig, stripe_settings):
+    """Pooled client without the session throttle; every case replaces its credentials anyway."""
+    async with AsyncStripeClient(stripe_settings.api_key, base_url=stripe_settings.base_url,
+                                 max_connections=CONCURRENCY, schemas=schemas_for(pytestconfig)) as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_auth_matrix(matrix_client):
+    """Missing, malformed, unknown, wrong-mode and JSON-bodied credentials all get a 401 everywhere."""
+    results, elapsed = await run_matrix(matrix_client, MATRIX, CONCURRENCY)
+    print(f"\n{len(MATRIX)} auth cases ({len(CREDENTIALS)} credentials) in {elapsed:.2f}s")
+
+    problems = [problem for problem in map(check, results) if problem]
+    assert not problems, f"{len(problems)} of {len(MATRIX)} cases were not refused properly:\n" + "\n".join(problems)
+
+
+def test_auth_matrix_covers_every_route_and_credential():
+    assert {case.credential for case in MATRIX} == set(CREDENTIALS)
+    assert {(case.method, case.path) for case in MATRIX} >= {
+        ('POST', '/customers/cus_auth_matrix/sources'), ('DELETE', '/customers/cus_auth_matrix/sources/card_auth_matrix'),
+        ('GET', '/charges'), ('GET', '/charges/ch_auth_matrix'),
+    }
+    assert len(MATRIX) >= 100